@@ -0,0 +1,180 @@
+"""
+Análise de Retorno incremental
+Guarda em disco o resultado da última análise (por mensagem) junto com a quantidade de
+vendas já processadas. Nas execuções seguintes só as vendas acrescentadas ao fim da
+planilha e as mensagens novas do histórico são processadas.
+
+Uso:
+    python analise_incremental.py                # atualiza o estado incrementalmente
+    python analise_incremental.py --reconstruir  # refaz a análise completa
+    python analise_incremental.py --verificar    # compara o incremental com a análise completa
+"""
+
+import argparse
+import hashlib
+import json
+import time
+
+import pandas as pd
+
+from analise_retorno import COLUNAS_PLACA, analisar_retorno, montar_analise, montar_envios, resumir_retornos
+from cache_vendas import carregar_vendas_cache, gravar_atomico
+from normalizacao import COLUNA_DATA, COLUNA_VALOR
+from historico import carregar_envios
+from utilitarios import log
+
+ESTADO_FILE = "analise_retorno.state.parquet"
+ESTADO_META_FILE = "analise_retorno.state.json"
+VERSAO_ESTADO = 2  # 2: placas canônicas (padrão antigo = Mercosul) e valores com milhar
+
+# Identifica uma mensagem enviada; se algum desses campos mudar ela é tratada como nova
+CHAVE_ENVIO = ['mes_referencia', 'placa', 'nome', 'telefone', 'data_envio']
+COLUNAS_VENDAS_ANALISE = COLUNAS_PLACA + [COLUNA_DATA, COLUNA_VALOR]
+
+
+def hash_vendas(df_vendas: pd.DataFrame, linhas: int) -> str:
+    """Hash das primeiras `linhas` vendas, nas colunas usadas pela análise"""
+    valores = pd.util.hash_pandas_object(
+        df_vendas[COLUNAS_VENDAS_ANALISE].iloc[:linhas], index=False
+    )
+    return hashlib.sha256(valores.to_numpy().tobytes()).hexdigest()
+
+
+def _chaves(envios: pd.DataFrame) -> pd.DataFrame:
+    """Normaliza os campos da chave para comparar histórico atual e estado gravado"""
+    chaves = envios[CHAVE_ENVIO].astype(str)
+    chaves['data_envio'] = pd.to_datetime(envios['data_envio']).astype('datetime64[ns]')
+    return chaves
+
+
+def carregar_estado(caminho_estado=ESTADO_FILE, caminho_meta=ESTADO_META_FILE):
+    """Lê o estado gravado; retorna (None, {}) se não existir ou for de outra versão"""
+    try:
+        with open(caminho_meta, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('versao') != VERSAO_ESTADO:
+            return None, {}
+        return pd.read_parquet(caminho_estado), meta
+    except Exception:
+        return None, {}
+
+
+def salvar_estado(envios: pd.DataFrame, resumo: pd.DataFrame, meta: dict,
+                  caminho_estado=ESTADO_FILE, caminho_meta=ESTADO_META_FILE):
+    """Grava o estado da análise; falhas de escrita não interrompem o dashboard"""
+    estado = _chaves(envios).reset_index(drop=True)
+    estado['qtd_retornos'] = resumo['qtd_retornos'].to_numpy()
+    estado['valor_gerado'] = resumo['valor_gerado'].to_numpy()
+    estado['primeira_venda'] = pd.to_datetime(resumo['primeira_venda']).to_numpy()
+
+    try:
+        gravar_atomico(caminho_estado, lambda tmp: estado.to_parquet(tmp, index=False))
+        gravar_atomico(
+            caminho_meta,
+            lambda tmp: tmp.write_text(json.dumps(meta, indent=2), encoding='utf-8')
+        )
+    except Exception as e:
+        log(f"⚠️ Não foi possível gravar o estado da análise: {e}")
+
+
+def analisar_retorno_incremental(historico, df_vendas: pd.DataFrame,
+                                 reconstruir: bool = False,
+                                 caminho_estado=ESTADO_FILE,
+                                 caminho_meta=ESTADO_META_FILE,
+                                 indice: dict = None) -> pd.DataFrame:
+    """
+    Mesmo resultado de analisar_retorno, reaproveitando o estado da execução anterior.
+    Mensagens já processadas só são cruzadas com as vendas novas (acrescentadas ao fim da
+    planilha); mensagens novas são cruzadas com todas as vendas. Se a parte já processada
+    da planilha mudou, ou com `reconstruir=True`, a análise é refeita por completo.
+    Vendas novas com datas anteriores às já processadas não pedem reconstrução: cada mensagem
+    soma as vendas posteriores ao envio e guarda a primeira, o que não depende da ordem das linhas.
+    `indice` (de indexar_vendas sobre `df_vendas`) evita normalizar as vendas de novo.
+    """
+    envios = montar_envios(historico)
+    if envios.empty:
+        return pd.DataFrame()
+
+    estado, meta = (None, {}) if reconstruir else carregar_estado(caminho_estado, caminho_meta)
+    linhas_processadas = meta.get('linhas_vendas', 0)
+
+    completo = (
+        estado is None
+        or linhas_processadas > len(df_vendas)
+        or meta.get('hash_vendas') != hash_vendas(df_vendas, linhas_processadas)
+    )
+
+    if completo:
+        resumo = resumir_retornos(envios, df_vendas, indice)
+        mudou = True
+    else:
+        vendas_novas = df_vendas.iloc[linhas_processadas:].reset_index(drop=True)
+
+        # Resultado já conhecido de cada mensagem (NaN para as mensagens novas)
+        resumo = _chaves(envios).merge(
+            estado, on=CHAVE_ENVIO, how='left', indicator=True
+        )
+        conhecidas = (resumo.pop('_merge') == 'both').to_numpy()
+        resumo = resumo[['qtd_retornos', 'valor_gerado', 'primeira_venda']]
+
+        if conhecidas.any() and not vendas_novas.empty:
+            parcial = resumir_retornos(envios[conhecidas].reset_index(drop=True), vendas_novas)
+            antigo = resumo[conhecidas]
+            resumo.loc[conhecidas, 'qtd_retornos'] = antigo['qtd_retornos'].to_numpy() + parcial['qtd_retornos'].to_numpy()
+            resumo.loc[conhecidas, 'valor_gerado'] = antigo['valor_gerado'].to_numpy() + parcial['valor_gerado'].to_numpy()
+            resumo.loc[conhecidas, 'primeira_venda'] = pd.concat(
+                [antigo['primeira_venda'].reset_index(drop=True), parcial['primeira_venda']], axis=1
+            ).min(axis=1).to_numpy()
+
+        if not conhecidas.all():
+            novas = resumir_retornos(envios[~conhecidas].reset_index(drop=True), df_vendas, indice)
+            resumo.loc[~conhecidas, novas.columns] = novas.to_numpy()
+
+        resumo['qtd_retornos'] = resumo['qtd_retornos'].astype(int)
+        resumo['valor_gerado'] = resumo['valor_gerado'].astype(float)
+        resumo['primeira_venda'] = pd.to_datetime(resumo['primeira_venda'])
+
+        mudou = not vendas_novas.empty or not conhecidas.all() or len(estado) != len(envios)
+
+    if mudou:
+        salvar_estado(envios, resumo, {
+            'versao': VERSAO_ESTADO,
+            'linhas_vendas': len(df_vendas),
+            'hash_vendas': hash_vendas(df_vendas, len(df_vendas)),
+            'mensagens': len(envios),
+            'atualizado_em': pd.Timestamp.now().isoformat(timespec='seconds')
+        }, caminho_estado, caminho_meta)
+
+    return montar_analise(envios, resumo)
+
+
+def main():
+    """Atualiza (ou reconstrói) o estado da análise de retorno"""
+    parser = argparse.ArgumentParser(description="Análise de retorno incremental")
+    parser.add_argument("--historico", default="historico_envios.json")
+    parser.add_argument("--vendas", default="Vendas_Lubrimax.xlsx")
+    parser.add_argument("--reconstruir", action="store_true",
+                        help="ignora o estado gravado e refaz a análise completa")
+    parser.add_argument("--verificar", action="store_true",
+                        help="confere o resultado incremental contra a análise completa")
+    args = parser.parse_args()
+
+    historico = carregar_envios(args.historico)
+    df_vendas = carregar_vendas_cache(args.vendas)
+
+    inicio = time.perf_counter()
+    df_analise = analisar_retorno_incremental(historico, df_vendas, reconstruir=args.reconstruir)
+    log(f"✅ Análise atualizada: {len(df_analise):,} mensagens em {time.perf_counter() - inicio:.2f}s")
+
+    if args.verificar:
+        completa = analisar_retorno(historico, df_vendas)
+        try:
+            pd.testing.assert_frame_equal(df_analise, completa, check_dtype=False)
+        except AssertionError as e:
+            log(f"❌ Resultado incremental difere da análise completa: {e}")
+            raise SystemExit(1)
+        log("✅ Resultado incremental idêntico à análise completa")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""
+Análise de Retorno - núcleo de dados do dashboard
+Relaciona as mensagens enviadas (historico_envios.json) com as vendas da Lubrimax,
+sem depender do Streamlit, para ser usado pelo dashboard e pelos scripts de automação.
+"""
+
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+from historico import COLUNAS_ENVIOS, tipar_envios
+from normalizacao import (
+    COLUNAS_PLACA, PADRAO_PLACA, buscar_placa_no_texto, canonizar_placas,
+    data_texto, extrair_placas, normalizar_datas, normalizar_valores, normalizar_vendas, valor_texto
+)
+
+COLUNAS_ANALISE = [
+    'mes_referencia', 'placa', 'nome', 'telefone', 'data_envio', 'retornou',
+    'qtd_retornos', 'valor_gerado', 'dias_ate_retorno'
+]
+
+# Regras de atribuição das vendas às mensagens da mesma placa
+REGRAS_ATRIBUICAO = {
+    'todas': 'Todas as mensagens anteriores',
+    'ultimo_toque': 'Último toque',
+    'primeiro_toque': 'Primeiro toque',
+}
+REGRA_PADRAO = 'todas'
+JANELAS_ATRIBUICAO = [None, 30, 60, 90]  # Dias após o envio; None = sem limite
+
+
+def parse_valor(valor):
+    """Converte um valor (ex: '1654,3', '1.654,30', 35) para float; inválidos viram 0.0"""
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    if isinstance(valor, str):
+        convertido = valor_texto(valor)
+        return 0.0 if convertido is None else convertido
+    return 0.0
+
+
+def parse_data_emissao(emissao):
+    """Converte data de emissão (texto dd/mm/aaaa ou datetime) para datetime; None se inválida"""
+    if isinstance(emissao, datetime):
+        return emissao
+    if isinstance(emissao, str):
+        return data_texto(emissao)
+    return None
+
+
+def parse_valores(valores: pd.Series) -> pd.Series:
+    """
+    Versão vetorizada de parse_valor: converte a coluna inteira de uma vez.
+    Valores vazios ou inválidos viram 0.0; células vazias continuam NaN.
+    """
+    return normalizar_valores(valores)[0]
+
+
+def parse_datas_emissao(emissoes: pd.Series) -> pd.Series:
+    """
+    Versão vetorizada de parse_data_emissao.
+    Aceita textos dd/mm/aaaa e valores já em datetime; o resto vira NaT.
+    """
+    return normalizar_datas(emissoes)[0]
+
+
+def montar_envios(historico) -> pd.DataFrame:
+    """
+    Converte o histórico em uma tabela com uma linha por mensagem enviada.
+    Aceita o dicionário do JSON ou o DataFrame já montado por historico.carregar_envios.
+    Mensagens com data de envio inválida são descartadas.
+    """
+    if isinstance(historico, pd.DataFrame):
+        return historico.reset_index(drop=True)
+    
+    colunas = {coluna: [] for coluna in COLUNAS_ENVIOS}
+    
+    for mes_ano, mensagens in historico.items():
+        for placa, dados in mensagens.items():
+            colunas['mes_referencia'].append(mes_ano)
+            colunas['placa'].append(placa)
+            colunas['nome'].append(dados.get('nome', ''))
+            colunas['telefone'].append(dados.get('fone', ''))
+            colunas['data_envio'].append(dados.get('data_envio', ''))
+    
+    return tipar_envios(colunas)
+
+
+def indexar_placas(df_vendas: pd.DataFrame) -> pd.DataFrame:
+    """
+    Extrai de uma só vez as placas citadas em IDENTIFICAÇÃO e OBSERVAÇÃO.
+    Retorna o índice (placa, linha), onde linha é a posição da venda no DataFrame e a
+    placa está na forma canônica (veja normalizacao.canonizar_placas).
+    """
+    return extrair_placas(df_vendas)
+
+
+def _buscar_placas_fora_do_padrao(placas, df_vendas: pd.DataFrame) -> pd.DataFrame:
+    """Busca no texto as placas que o índice não reconhece (formato fora do padrão)"""
+    textos = [df_vendas[coluna].astype(str).str.upper() for coluna in COLUNAS_PLACA]
+    partes = [pd.DataFrame({'placa': placa, 'linha': buscar_placa_no_texto(placa, textos)}) for placa in placas]
+    return pd.concat(partes, ignore_index=True)
+
+
+def indexar_vendas(df_vendas: pd.DataFrame) -> dict:
+    """
+    Índice das vendas por placa e data de emissão, montado uma vez por versão da planilha.
+    As ocorrências (placa, venda) ficam ordenadas por placa e, dentro da placa, por data;
+    a chave de cada uma é código da placa * quantidade de datas + posição da data.
+    Assim as vendas de uma placa depois de uma data são uma faixa contínua, achada por
+    busca binária. Vendas sem data válida ficam de fora, pois nunca contam como retorno.
+    As colunas são normalizadas uma única vez aqui; `rejeitados` conta o que foi descartado.
+    """
+    normalizadas = normalizar_vendas(df_vendas)
+    data_venda = normalizadas['data_venda']
+    valor = normalizadas['valor']
+    
+    ocorrencias = normalizadas['placas']
+    linhas = ocorrencias['linha'].to_numpy()
+    com_data = ~np.isnat(data_venda[linhas])
+    linhas = linhas[com_data]
+    placas_ocorrencias = ocorrencias['placa'].to_numpy(dtype=object)[com_data]
+    
+    placas, codigo_placa = np.unique(placas_ocorrencias.astype(str), return_inverse=True)
+    datas, posicao_data = np.unique(data_venda[linhas], return_inverse=True)
+    chaves = codigo_placa.astype(np.int64) * len(datas) + posicao_data
+    ordem = np.lexsort((linhas, chaves))
+    
+    return {
+        'placas': placas,
+        'datas': datas,
+        'chaves': chaves[ordem],
+        'linhas': linhas[ordem],
+        'data_venda': data_venda,
+        'valor': valor,
+        'rejeitados': normalizadas['rejeitados'],
+    }
+
+
+def _faixas_apos_envio(indice: dict, placas, datas_envio, janela_dias: int = None) -> tuple:
+    """
+    Para cada (placa, data de envio), a faixa [inicio, fim) de `indice['linhas']` com as
+    vendas da placa feitas depois do envio (e, com `janela_dias`, até o fim da janela).
+    Placas sem venda recebem faixa vazia.
+    """
+    placas = np.asarray(placas, dtype=str)
+    datas_envio = np.asarray(datas_envio, dtype='datetime64[ns]')
+    
+    codigo = np.searchsorted(indice['placas'], placas)
+    existe = codigo < len(indice['placas'])
+    existe[existe] = indice['placas'][codigo[existe]] == placas[existe]
+    
+    # Datas de venda iguais ou anteriores ao envio ficam antes da posição encontrada
+    posicao = np.searchsorted(indice['datas'], datas_envio, side='right')
+    if janela_dias is None:
+        limite = len(indice['datas'])
+    else:
+        limite = np.searchsorted(indice['datas'], datas_envio + np.timedelta64(janela_dias, 'D'), side='right')
+    base = codigo.astype(np.int64) * len(indice['datas'])
+    inicio = np.searchsorted(indice['chaves'], base + posicao, side='left')
+    fim = np.searchsorted(indice['chaves'], base + limite, side='left')
+    return np.where(existe, inicio, 0), np.where(existe, fim, 0)
+
+
+def _pares_apos_envio(envios: pd.DataFrame, indice: dict, janela_dias: int = None) -> pd.DataFrame:
+    """Pares (envio, linha) das vendas da placa feitas depois de cada envio, pelo índice"""
+    inicio, fim = _faixas_apos_envio(
+        indice, envios['placa'].to_numpy(), envios['data_envio'].to_numpy(), janela_dias
+    )
+    quantidades = fim - inicio
+    envio = np.repeat(np.arange(len(envios)), quantidades)
+    deslocamento = np.arange(quantidades.sum()) - np.repeat(np.cumsum(quantidades) - quantidades, quantidades)
+    return pd.DataFrame({'envio': envio, 'linha': indice['linhas'][np.repeat(inicio, quantidades) + deslocamento]})
+
+
+def _vendas_das_placas(envios: pd.DataFrame, df_vendas: pd.DataFrame, indice: dict) -> pd.DataFrame:
+    """Todas as vendas com data (placa, linha, data_venda) das placas que receberam mensagem"""
+    placas = pd.Series(envios['placa'].astype(str).unique(), dtype=object)
+    placas_indice = indice['placas'][indice['chaves'] // max(len(indice['datas']), 1)]
+    recebeu = np.isin(placas_indice, placas.to_numpy(dtype=str))
+    vendas = pd.DataFrame({'placa': placas_indice[recebeu], 'linha': indice['linhas'][recebeu]})
+    
+    # Placas fora do padrão não estão no índice: busca por substring
+    fora_do_padrao = placas[~placas.str.fullmatch(PADRAO_PLACA, na=False)]
+    if not fora_do_padrao.empty:
+        vendas = pd.concat([vendas, _buscar_placas_fora_do_padrao(fora_do_padrao, df_vendas)], ignore_index=True)
+    
+    vendas['placa'] = vendas['placa'].astype(str)
+    vendas['data_venda'] = indice['data_venda'][vendas['linha'].to_numpy()]
+    return vendas.dropna(subset=['data_venda'])
+
+
+def _pares_por_toque(envios: pd.DataFrame, vendas: pd.DataFrame, regra: str, janela_dias: int = None) -> pd.DataFrame:
+    """
+    Atribui cada venda a no máximo uma mensagem da mesma placa enviada antes dela (e, com
+    `janela_dias`, no máximo tantos dias antes): a mais recente (último toque) ou a mais
+    antiga (primeiro toque). Uma junção ordenada por data (merge_asof por placa), sem
+    cruzar cada mensagem com cada venda.
+    """
+    mensagens = pd.DataFrame({
+        'envio': np.arange(len(envios)),
+        'placa': envios['placa'].astype(str).to_numpy(),
+        'data_envio': envios['data_envio'].to_numpy(dtype='datetime64[ns]'),
+    }).sort_values('data_envio', kind='stable')
+    vendas = vendas.sort_values('data_venda', kind='stable')
+    tolerancia = pd.Timedelta(days=janela_dias) if janela_dias is not None else None
+    
+    if regra == 'ultimo_toque':
+        # Última mensagem antes da venda, no máximo `tolerancia` antes dela
+        atribuidas = pd.merge_asof(
+            vendas, mensagens, left_on='data_venda', right_on='data_envio', by='placa',
+            direction='backward', allow_exact_matches=False, tolerance=tolerancia
+        )
+    else:
+        # Primeira mensagem a partir do início da janela; só vale se foi enviada antes da venda
+        if tolerancia is None:
+            inicio_janela = mensagens['data_envio'].min()
+        else:
+            inicio_janela = vendas['data_venda'] - tolerancia
+        atribuidas = pd.merge_asof(
+            vendas.assign(inicio_janela=inicio_janela), mensagens,
+            left_on='inicio_janela', right_on='data_envio', by='placa', direction='forward'
+        )
+        atribuidas = atribuidas[atribuidas['data_envio'] < atribuidas['data_venda']]
+    
+    atribuidas = atribuidas.dropna(subset=['envio'])
+    return pd.DataFrame({
+        'envio': atribuidas['envio'].to_numpy(dtype=np.int64),
+        'linha': atribuidas['linha'].to_numpy(dtype=np.int64),
+    })
+
+
+def resumir_retornos(envios: pd.DataFrame, df_vendas: pd.DataFrame, indice: dict = None,
+                     janela_dias: int = None, regra: str = REGRA_PADRAO) -> pd.DataFrame:
+    """
+    Agrega, para cada mensagem, as vendas da placa atribuídas a ela.
+    Retorna qtd_retornos, valor_gerado e primeira_venda, indexados pela posição em `envios`.
+    `indice` (de indexar_vendas) pode ser reaproveitado entre consultas à mesma planilha;
+    com ele, cada mensagem custa uma busca binária em vez de uma passada pelas vendas.
+    
+    Atribuição: com a regra 'todas', cada mensagem recebe todas as vendas da placa após o
+    envio (uma venda conta para cada mensagem anterior); com 'ultimo_toque' ou
+    'primeiro_toque', cada venda conta para uma única mensagem. `janela_dias` limita as
+    vendas aos dias seguintes ao envio.
+    """
+    if regra not in REGRAS_ATRIBUICAO:
+        raise ValueError(f"Regra de atribuição desconhecida: {regra} (use {', '.join(REGRAS_ATRIBUICAO)})")
+    
+    posicoes = pd.RangeIndex(len(envios))
+    if envios.empty or df_vendas.empty:
+        return pd.DataFrame({
+            'qtd_retornos': pd.Series(0, index=posicoes, dtype=int),
+            'valor_gerado': pd.Series(0.0, index=posicoes),
+            'primeira_venda': pd.Series(pd.NaT, index=posicoes, dtype='datetime64[ns]')
+        })
+    
+    if indice is None:
+        indice = indexar_vendas(df_vendas)
+    
+    # Mensagens e vendas se encontram pela placa canônica (ABC1234 e ABC1C34 são a mesma)
+    envios = envios[['placa', 'data_envio']].assign(placa=canonizar_placas(envios['placa']).to_numpy())
+    
+    if regra == 'todas':
+        pares = _pares_apos_envio(envios, indice, janela_dias)
+        
+        # Placas fora do padrão não estão no índice: busca por substring e filtra pela data
+        placas = pd.Series(envios['placa'].unique(), dtype=object)
+        fora_do_padrao = placas[~placas.str.fullmatch(PADRAO_PLACA, na=False)]
+        if not fora_do_padrao.empty:
+            extras = envios[['placa']].reset_index(drop=True).rename_axis('envio').reset_index().merge(
+                _buscar_placas_fora_do_padrao(fora_do_padrao, df_vendas), on='placa', how='inner'
+            )
+            data_venda = indice['data_venda'][extras['linha'].to_numpy()]
+            data_envio = envios['data_envio'].to_numpy(dtype='datetime64[ns]')[extras['envio'].to_numpy()]
+            apos = data_venda > data_envio
+            if janela_dias is not None:
+                apos &= data_venda <= data_envio + np.timedelta64(janela_dias, 'D')
+            pares = pd.concat([pares, extras.loc[apos, ['envio', 'linha']]], ignore_index=True)
+    else:
+        pares = _pares_por_toque(envios, _vendas_das_placas(envios, df_vendas, indice), regra, janela_dias)
+    
+    # Mesma ordem de soma da relação completa (envio, linha)
+    pares = pares.sort_values(['envio', 'linha'], ignore_index=True)
+    linhas = pares['linha'].to_numpy()
+    pares['data_venda'] = indice['data_venda'][linhas]
+    pares['valor'] = indice['valor'][linhas]
+    
+    resumo = pares.groupby('envio').agg(
+        qtd_retornos=('linha', 'size'),
+        valor_gerado=('valor', 'sum'),
+        primeira_venda=('data_venda', 'min')
+    ).reindex(posicoes)
+    
+    resumo['qtd_retornos'] = resumo['qtd_retornos'].fillna(0).astype(int)
+    resumo['valor_gerado'] = resumo['valor_gerado'].fillna(0.0)
+    return resumo
+
+
+def montar_analise(envios: pd.DataFrame, resumo: pd.DataFrame) -> pd.DataFrame:
+    """Junta as mensagens com o resumo de retornos no formato exibido pelo dashboard"""
+    df_analise = envios.reset_index(drop=True).copy()
+    df_analise['qtd_retornos'] = resumo['qtd_retornos'].to_numpy()
+    df_analise['retornou'] = df_analise['qtd_retornos'] > 0
+    df_analise['valor_gerado'] = resumo['valor_gerado'].to_numpy()
+    df_analise['dias_ate_retorno'] = (
+        pd.to_datetime(resumo['primeira_venda']).to_numpy() - df_analise['data_envio'].to_numpy()
+    ) // pd.Timedelta(days=1)
+    
+    return df_analise[COLUNAS_ANALISE]
+
+
+def analisar_retorno(historico, df_vendas: pd.DataFrame, indice: dict = None,
+                     janela_dias: int = None, regra: str = REGRA_PADRAO) -> pd.DataFrame:
+    """
+    Analisa quais clientes que receberam mensagem voltaram à loja.
+    Considera retorno se houve venda atribuída à mensagem (por padrão, qualquer venda da
+    placa após o envio; veja resumir_retornos para a janela e as regras de toque).
+    Com o `indice` da planilha já montado, analisar só um mês custa o proporcional às
+    mensagens desse mês.
+    """
+    envios = montar_envios(historico)
+    if envios.empty:
+        return pd.DataFrame()
+    
+    return montar_analise(envios, resumir_retornos(envios, df_vendas, indice, janela_dias, regra))
+
+
+def faixas_por_mes(df_analise: pd.DataFrame) -> tuple:
+    """
+    Ordena a análise por mês de referência (mantendo a ordem dentro do mês) e retorna
+    (análise ordenada, {mes: (inicio, fim)}), para ler um mês com iloc[inicio:fim]
+    sem varrer a tabela inteira.
+    """
+    meses = df_analise['mes_referencia'].astype(str).to_numpy()
+    ordem = np.argsort(meses, kind='stable')
+    meses = meses[ordem]
+    unicos = np.unique(meses)
+    inicios = np.searchsorted(meses, unicos, side='left')
+    fins = np.searchsorted(meses, unicos, side='right')
+    faixas = {mes: (int(inicio), int(fim)) for mes, inicio, fim in zip(unicos.tolist(), inicios, fins)}
+    return df_analise.iloc[ordem].reset_index(drop=True), faixas
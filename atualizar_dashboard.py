@@ -1,44 +1,156 @@
 """
 Script de automação para atualizar dados do Dashboard de Retorno
 Copia arquivos atualizados e faz push para o GitHub
+Só publica o que mudou: vendas novas em deltas (vendas/) e mensagens novas em historico/
 """
 
+import json
 import shutil
 import subprocess
 import os
 from datetime import datetime
 from pathlib import Path
 
+from banco import BANCO_FILE, atualizar_banco, banco_ativado
+from cache_vendas import cache_valido, calcular_hash, carregar_vendas_cache, construir_cache
+from historico import DIRETORIO_HISTORICO, importar_historico_json
+from lojas import LOJAS_FILE
+from pontuacao import CANDIDATOS_FILE, MODELO_FILE, gerar_pontuacao
+from relatorio import RELATORIO_FILE, gerar_relatorio
+from utilitarios import log
+from vendas import DIRETORIO_VENDAS, exportar_vendas
+
 # Configurações
 DASHBOARD_DIR = Path(__file__).parent
 PASTA_ORIGEM = DASHBOARD_DIR.parent
 
+# Copiados para a pasta do dashboard, mas fora do Git (.gitignore): publicados como vendas/
 ARQUIVOS_PARA_ATUALIZAR = [
-    "historico_envios.json",
     "Vendas_Lubrimax.xlsx"
 ]
 
-def log(mensagem):
-    """Registra mensagem com timestamp"""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{timestamp}] {mensagem}")
+# O histórico não é mais copiado inteiro: só as mensagens novas entram em historico/
+HISTORICO_ORIGEM = "historico_envios.json"
+
+# Hash das origens já sincronizadas (local, fora do Git): origem sem mudança é pulada
+ESTADO_SINCRONIZACAO = DASHBOARD_DIR / "sincronizacao.json"
+
+# Publicados no Git; a planilha inteira não é mais enviada, só os deltas em vendas/
+CAMINHOS_PUBLICADOS = [DIRETORIO_HISTORICO, DIRETORIO_VENDAS, RELATORIO_FILE, MODELO_FILE]
+
+def ler_estado_sincronizacao():
+    """Hash de cada origem na última sincronização"""
+    try:
+        return json.loads(ESTADO_SINCRONIZACAO.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+def gravar_estado_sincronizacao(estado):
+    """Registra o hash das origens sincronizadas"""
+    ESTADO_SINCRONIZACAO.write_text(json.dumps(estado, indent=2), encoding="utf-8")
 
 def copiar_arquivos():
-    """Copia arquivos atualizados da pasta origem"""
+    """Copia da pasta origem só os arquivos que mudaram (comparando o hash)"""
     log("Iniciando cópia de arquivos...")
     
     for arquivo in ARQUIVOS_PARA_ATUALIZAR:
         origem = PASTA_ORIGEM / arquivo
         destino = DASHBOARD_DIR / arquivo
         
-        if origem.exists():
+        if not origem.exists():
+            log(f"⚠️ {arquivo} não encontrado em {origem}")
+        elif destino.exists() and calcular_hash(origem) == calcular_hash(destino):
+            log(f"ℹ️ {arquivo} não mudou")
+        else:
             shutil.copy2(origem, destino)
             log(f"✅ {arquivo} copiado com sucesso")
-        else:
-            log(f"⚠️ {arquivo} não encontrado em {origem}")
     
     log("Cópia concluída!")
 
+def sincronizar_historico():
+    """Acrescenta ao histórico segmentado as mensagens novas do JSON de origem"""
+    origem = PASTA_ORIGEM / HISTORICO_ORIGEM
+    
+    if not origem.exists():
+        log(f"⚠️ {HISTORICO_ORIGEM} não encontrado em {origem}")
+        return
+    
+    estado = ler_estado_sincronizacao()
+    hash_origem = calcular_hash(origem)
+    if estado.get(HISTORICO_ORIGEM) == hash_origem and (DASHBOARD_DIR / DIRETORIO_HISTORICO).exists():
+        log(f"ℹ️ {HISTORICO_ORIGEM} não mudou")
+        return
+    
+    novas = importar_historico_json(origem, DASHBOARD_DIR / DIRETORIO_HISTORICO)
+    if not novas:
+        log("ℹ️ Nenhuma mensagem nova no histórico")
+    for mes, quantidade in novas.items():
+        log(f"✅ Histórico {mes}: {quantidade} mensagens novas")
+    
+    estado[HISTORICO_ORIGEM] = hash_origem
+    gravar_estado_sincronizacao(estado)
+
+def atualizar_cache_vendas():
+    """Regera o cache Parquet da planilha de vendas se ela mudou"""
+    arquivo = DASHBOARD_DIR / "Vendas_Lubrimax.xlsx"
+    
+    if not arquivo.exists():
+        return
+    
+    if cache_valido(arquivo):
+        log("ℹ️ Cache de vendas já está atualizado")
+        return
+    
+    log("Gerando cache Parquet das vendas...")
+    construir_cache(arquivo)
+    log("✅ Cache de vendas gerado")
+
+def sincronizar_vendas():
+    """Exporta para vendas/ só as linhas novas da planilha (compacta os deltas de tempos em tempos)"""
+    arquivo = DASHBOARD_DIR / "Vendas_Lubrimax.xlsx"
+    
+    if not arquivo.exists():
+        return
+    
+    estado = ler_estado_sincronizacao()
+    hash_planilha = calcular_hash(arquivo)
+    if estado.get(arquivo.name) == hash_planilha and (DASHBOARD_DIR / DIRETORIO_VENDAS).exists():
+        log("ℹ️ Vendas já exportadas")
+        return
+    
+    resultado = exportar_vendas(carregar_vendas_cache(arquivo), DASHBOARD_DIR / DIRETORIO_VENDAS)
+    if resultado['acao'] == 'nenhuma':
+        log("ℹ️ Nenhuma venda nova")
+    elif resultado['acao'] == 'base':
+        log(f"✅ Base de vendas regravada ({resultado['linhas']:,} linhas)")
+    else:
+        log(f"✅ Delta com {resultado['linhas']:,} vendas novas")
+    if resultado['compactado']:
+        log("✅ Deltas de vendas compactados em uma nova base")
+    
+    estado[arquivo.name] = hash_planilha
+    gravar_estado_sincronizacao(estado)
+
+def atualizar_relatorio():
+    """Pré-calcula a análise e os agregados que o dashboard carrega na abertura"""
+    log("Gerando relatório pré-calculado...")
+    gerar_relatorio(DASHBOARD_DIR / LOJAS_FILE, DASHBOARD_DIR / RELATORIO_FILE)
+
+def atualizar_pontuacao():
+    """Treina o modelo de retorno e pontua os candidatos ao próximo lembrete"""
+    log("Treinando modelo de retorno e pontuando candidatos...")
+    gerar_pontuacao(DASHBOARD_DIR / LOJAS_FILE, DASHBOARD_DIR / MODELO_FILE, DASHBOARD_DIR / CANDIDATOS_FILE)
+
+def atualizar_banco_local():
+    """Grava vendas e histórico no banco SQLite local (opcional, fora do Git)"""
+    caminho = DASHBOARD_DIR / BANCO_FILE
+    
+    if not banco_ativado(caminho):
+        return
+    
+    log("Atualizando banco local...")
+    atualizar_banco(caminho, DASHBOARD_DIR / LOJAS_FILE)
+
 def git_commit_push():
     """Faz commit e push das alterações"""
     log("Verificando alterações no Git...")
@@ -58,7 +170,11 @@ def git_commit_push():
     
     # Adiciona arquivos
     log("Adicionando arquivos...")
-    subprocess.run(["git", "add"] + ARQUIVOS_PARA_ATUALIZAR, check=True)
+    caminhos = [
+        caminho for caminho in CAMINHOS_PUBLICADOS
+        if (DASHBOARD_DIR / caminho).exists()
+    ]
+    subprocess.run(["git", "add"] + caminhos, check=True)
     
     # Commit
     mensagem = f"Auto-update: dados atualizados em {datetime.now().strftime('%d/%m/%Y %H:%M')}"
@@ -87,6 +203,12 @@ def main():
     
     try:
         copiar_arquivos()
+        sincronizar_historico()
+        atualizar_cache_vendas()
+        sincronizar_vendas()
+        atualizar_relatorio()
+        atualizar_pontuacao()
+        atualizar_banco_local()
         git_commit_push()
         log("="*60)
         log("✅ ATUALIZAÇÃO CONCLUÍDA COM SUCESSO!")
@@ -0,0 +1,372 @@
+"""
+Banco local das vendas e do histórico (SQLite)
+Backend opcional: a automação grava as mensagens e as vendas (já normalizadas) em um arquivo
+SQLite com índices por placa e data de emissão, e a atribuição das vendas às mensagens (em
+todas as regras e janelas) vira uma consulta indexada. Assim o dashboard não precisa carregar
+a planilha nem o histórico para calcular uma atribuição fora do padrão.
+
+O que o banco não faz: o resultado (uma linha por mensagem) ainda é lido inteiro para o
+pandas, e os filtros, a paginação, os agregados, as coortes e a exportação do dashboard
+continuam sobre esse DataFrame em memória. A memória e o trabalho por interação da página
+são os mesmos dos outros caminhos; o ganho está só em não ler e normalizar vendas e histórico.
+
+Cada loja é regravada apenas quando o hash dos seus arquivos muda. O dashboard só usa o banco
+se ele foi gerado exatamente dos arquivos atuais (mesmas entradas do relatório pré-calculado).
+
+Uso:
+    python banco.py                          # cria ou atualiza lubrimax.db
+    python banco.py --forcar                 # regrava todas as lojas
+    python banco.py --analisar --janela 60 --regra ultimo_toque
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from analise_retorno import REGRA_PADRAO, REGRAS_ATRIBUICAO, montar_analise
+from historico import carregar_envios, carregar_envios_segmentados
+from lojas import LOJAS_FILE, arquivos_loja, carregar_lojas, resumo_por_loja
+from normalizacao import COLUNAS_PLACA, PADRAO_PLACA, buscar_placa_no_texto, canonizar_placas, normalizar_vendas
+from relatorio import entradas_relatorio
+from utilitarios import log
+from vendas import carregar_vendas_loja
+
+BANCO_FILE = "lubrimax.db"
+VERSAO_BANCO = 1
+VARIAVEL_ATIVACAO = "LUBRIMAX_BANCO"  # =1 faz a automação criar o banco; depois ele é mantido sozinho
+
+NS_POR_DIA = 86_400 * 10**9  # datas gravadas como inteiros (nanossegundos desde 1970)
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS metadados (chave TEXT PRIMARY KEY, valor TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS lojas (
+    loja TEXT PRIMARY KEY, ordem INTEGER NOT NULL, entradas TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS envios (
+    loja TEXT NOT NULL, envio INTEGER NOT NULL, mes_referencia TEXT NOT NULL, placa TEXT,
+    placa_canonica TEXT, nome TEXT, telefone TEXT, data_envio INTEGER NOT NULL,
+    PRIMARY KEY (loja, envio)
+);
+CREATE TABLE IF NOT EXISTS vendas (
+    loja TEXT NOT NULL, linha INTEGER NOT NULL, data_venda INTEGER, valor REAL,
+    PRIMARY KEY (loja, linha)
+);
+CREATE TABLE IF NOT EXISTS vendas_placas (
+    loja TEXT NOT NULL, placa TEXT NOT NULL, linha INTEGER NOT NULL, data_venda INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_envios_placa ON envios (loja, placa_canonica, data_envio);
+CREATE INDEX IF NOT EXISTS idx_envios_mes ON envios (loja, mes_referencia);
+CREATE INDEX IF NOT EXISTS idx_vendas_data ON vendas (loja, data_venda);
+CREATE INDEX IF NOT EXISTS idx_vendas_placas ON vendas_placas (loja, placa, data_venda);
+"""
+
+# Vendas de cada mensagem: todas as da placa após o envio (e até o fim da janela)
+CONSULTA_TODAS = """
+SELECT e.envio, COUNT(*), TOTAL(v.valor), MIN(p.data_venda)
+FROM envios e
+JOIN vendas_placas p
+  ON p.loja = e.loja AND p.placa = e.placa_canonica
+ AND p.data_venda > e.data_envio {filtro_janela}
+JOIN vendas v ON v.loja = p.loja AND v.linha = p.linha
+WHERE e.loja = :loja {filtro_meses}
+GROUP BY e.envio
+"""
+
+# Cada venda vai para uma só mensagem da placa enviada antes dela, dentro da janela:
+# a mais recente (último toque) ou a mais antiga (primeiro toque)
+CONSULTA_TOQUE = """
+WITH atribuidas AS (
+    SELECT p.linha, p.data_venda, (
+        SELECT e.envio FROM envios e
+        WHERE e.loja = p.loja AND e.placa_canonica = p.placa
+          AND e.data_envio < p.data_venda {filtro_janela}
+        ORDER BY e.data_envio {ordem}, e.envio {ordem} LIMIT 1
+    ) AS envio
+    FROM vendas_placas p
+    WHERE p.loja = :loja
+)
+SELECT a.envio, COUNT(*), TOTAL(v.valor), MIN(a.data_venda)
+FROM atribuidas a
+JOIN vendas v ON v.loja = :loja AND v.linha = a.linha
+WHERE a.envio IS NOT NULL
+GROUP BY a.envio
+"""
+
+
+def banco_ativado(caminho=BANCO_FILE) -> bool:
+    """Indica se a automação deve manter o banco: ele já existe ou foi ligado pela variável de ambiente"""
+    return Path(caminho).exists() or os.environ.get(VARIAVEL_ATIVACAO, "").strip().lower() in ("1", "true", "sim")
+
+
+def conectar(caminho=BANCO_FILE, somente_leitura: bool = False) -> sqlite3.Connection:
+    """Abre o banco (o dashboard abre só para leitura, sem criar o arquivo)"""
+    if somente_leitura:
+        return sqlite3.connect(f"{Path(caminho).resolve().as_uri()}?mode=ro", uri=True)
+    conexao = sqlite3.connect(caminho)
+    conexao.executescript(ESQUEMA)
+    return conexao
+
+
+def _ler_metadado(conexao, chave, padrao=None):
+    linha = conexao.execute("SELECT valor FROM metadados WHERE chave = ?", (chave,)).fetchone()
+    return json.loads(linha[0]) if linha else padrao
+
+
+def _gravar_metadado(conexao, chave, valor):
+    conexao.execute(
+        "INSERT OR REPLACE INTO metadados (chave, valor) VALUES (?, ?)",
+        (chave, json.dumps(valor, ensure_ascii=False))
+    )
+
+
+def _em_ns(datas) -> np.ndarray:
+    """Datas como inteiros em nanossegundos (NaT vira None ao gravar)"""
+    return np.asarray(datas, dtype='datetime64[ns]').astype(np.int64)
+
+
+def _carregar_envios(loja: dict) -> pd.DataFrame:
+    """Histórico da loja (JSON ou segmentado)"""
+    if Path(loja['historico']).is_dir():
+        return carregar_envios_segmentados(loja['historico'])
+    return carregar_envios(loja['historico'])
+
+
+def _placas_vendas(envios: pd.DataFrame, df_vendas: pd.DataFrame, normalizadas: dict) -> pd.DataFrame:
+    """
+    Ocorrências (placa, linha) das vendas com data. Placas do histórico fora do padrão não
+    são extraídas do texto: são buscadas por substring, como na análise em memória.
+    """
+    placas = [normalizadas['placas'][['placa', 'linha']]]
+    placas_envios = pd.Series(envios['placa_canonica'].unique(), dtype=object)
+    fora_do_padrao = placas_envios[~placas_envios.str.fullmatch(PADRAO_PLACA, na=False)]
+    if not fora_do_padrao.empty:
+        textos = [df_vendas[coluna].astype(str).str.upper() for coluna in COLUNAS_PLACA]
+        placas += [
+            pd.DataFrame({'placa': placa, 'linha': buscar_placa_no_texto(placa, textos)})
+            for placa in fora_do_padrao
+        ]
+    placas = pd.concat(placas, ignore_index=True)
+    data_venda = normalizadas['data_venda'][placas['linha'].to_numpy()]
+    com_data = ~np.isnat(data_venda)
+    return pd.DataFrame({
+        'placa': placas['placa'].astype(str).to_numpy()[com_data],
+        'linha': placas['linha'].to_numpy(dtype=np.int64)[com_data],
+        'data_venda': _em_ns(data_venda[com_data]),
+    })
+
+
+def importar_loja(conexao, loja: dict, ordem: int, entradas: dict):
+    """Regrava as mensagens e as vendas normalizadas da loja (uma transação)"""
+    envios = _carregar_envios(loja)
+    envios = envios.assign(placa_canonica=canonizar_placas(envios['placa']).to_numpy())
+    df_vendas = carregar_vendas_loja(loja['vendas'])
+    normalizadas = normalizar_vendas(df_vendas)
+    placas = _placas_vendas(envios, df_vendas, normalizadas)
+    valor = normalizadas['valor']
+    data_venda = normalizadas['data_venda']
+
+    nome = loja['nome']
+    with conexao:
+        for tabela in ('envios', 'vendas', 'vendas_placas', 'lojas'):
+            conexao.execute(f"DELETE FROM {tabela} WHERE loja = ?", (nome,))
+        conexao.executemany(
+            "INSERT INTO envios VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            zip([nome] * len(envios), range(len(envios)),
+                envios['mes_referencia'].astype(str).tolist(), envios['placa'].astype(str).tolist(),
+                envios['placa_canonica'].astype(str).tolist(), envios['nome'].astype(str).tolist(),
+                envios['telefone'].astype(str).tolist(), _em_ns(envios['data_envio']).tolist())
+        )
+        conexao.executemany(
+            "INSERT INTO vendas VALUES (?, ?, ?, ?)",
+            zip([nome] * len(valor), range(len(valor)),
+                [None if np.isnat(data) else int(ns) for data, ns in zip(data_venda, _em_ns(data_venda))],
+                [None if np.isnan(v) else float(v) for v in valor])
+        )
+        conexao.executemany(
+            "INSERT INTO vendas_placas VALUES (?, ?, ?, ?)",
+            zip([nome] * len(placas), placas['placa'].tolist(), placas['linha'].tolist(),
+                placas['data_venda'].tolist())
+        )
+        conexao.execute(
+            "INSERT INTO lojas VALUES (?, ?, ?)", (nome, ordem, json.dumps(entradas, sort_keys=True))
+        )
+    log(f"✅ {nome}: {len(envios):,} mensagens e {len(valor):,} vendas no banco")
+
+
+def atualizar_banco(caminho=BANCO_FILE, config=LOJAS_FILE, forcar: bool = False) -> bool:
+    """
+    Grava no banco as lojas de `config` (ou a loja única, sem o arquivo) cujos arquivos mudaram
+    e remove as que saíram da lista. Retorna True se algo foi regravado.
+    """
+    base = Path(caminho).parent
+    entradas = entradas_relatorio(config, base)
+    if None in entradas.values():
+        faltando = [arquivo for arquivo, sha in entradas.items() if sha is None]
+        log(f"⚠️ Arquivos não encontrados, banco não atualizado: {', '.join(faltando)}")
+        return False
+
+    lojas = carregar_lojas(config)
+    conexao = conectar(caminho)
+    try:
+        if _ler_metadado(conexao, 'versao') != VERSAO_BANCO:
+            forcar = True
+        gravadas = dict(conexao.execute("SELECT loja, entradas FROM lojas").fetchall())
+
+        alterado = False
+        for ordem, loja in enumerate(lojas):
+            chaves = [Path(os.path.relpath(arquivo, base)).as_posix() for arquivo in arquivos_loja(loja)]
+            entradas_loja = {chave: entradas[chave] for chave in chaves}
+            if not forcar and gravadas.get(loja['nome']) == json.dumps(entradas_loja, sort_keys=True):
+                conexao.execute("UPDATE lojas SET ordem = ? WHERE loja = ?", (ordem, loja['nome']))
+                continue
+            importar_loja(conexao, loja, ordem, entradas_loja)
+            alterado = True
+
+        nomes = {loja['nome'] for loja in lojas}
+        with conexao:
+            for nome in set(gravadas) - nomes:
+                for tabela in ('envios', 'vendas', 'vendas_placas', 'lojas'):
+                    conexao.execute(f"DELETE FROM {tabela} WHERE loja = ?", (nome,))
+                log(f"🗑️ {nome} removida do banco")
+                alterado = True
+            _gravar_metadado(conexao, 'versao', VERSAO_BANCO)
+            _gravar_metadado(conexao, 'entradas', entradas)
+            _gravar_metadado(conexao, 'varias_lojas', Path(config).exists())
+        if alterado:
+            conexao.execute("ANALYZE")
+        else:
+            log(f"ℹ️ {caminho} já está atualizado")
+        return alterado
+    finally:
+        conexao.close()
+
+
+def banco_atualizado(caminho=BANCO_FILE, entradas: dict = None) -> bool:
+    """Indica se o banco existe e foi gerado exatamente das `entradas` (hash dos arquivos)"""
+    if not Path(caminho).exists():
+        return False
+    try:
+        conexao = conectar(caminho, somente_leitura=True)
+        try:
+            if _ler_metadado(conexao, 'versao') != VERSAO_BANCO:
+                return False
+            return entradas is None or _ler_metadado(conexao, 'entradas') == entradas
+        finally:
+            conexao.close()
+    except sqlite3.Error:
+        return False
+
+
+def _resumir_loja(conexao, loja: str, quantidade: int, janela_dias: int, regra: str, meses) -> pd.DataFrame:
+    """qtd_retornos, valor_gerado e primeira_venda de cada mensagem da loja (pela posição)"""
+    parametros = {'loja': loja}
+    filtro_janela = ""
+    if janela_dias is not None:
+        parametros['janela'] = NS_POR_DIA * janela_dias
+        filtro_janela = (
+            "AND p.data_venda <= e.data_envio + :janela" if regra == 'todas'
+            else "AND e.data_envio >= p.data_venda - :janela"
+        )
+
+    if regra == 'todas':
+        filtro_meses = ""
+        if meses is not None:
+            filtro_meses = f"AND e.mes_referencia IN ({', '.join(f':mes{i}' for i in range(len(meses)))})"
+            parametros.update({f'mes{i}': mes for i, mes in enumerate(meses)})
+        consulta = CONSULTA_TODAS.format(filtro_janela=filtro_janela, filtro_meses=filtro_meses)
+    else:
+        consulta = CONSULTA_TOQUE.format(filtro_janela=filtro_janela, ordem='DESC' if regra == 'ultimo_toque' else 'ASC')
+
+    linhas = conexao.execute(consulta, parametros).fetchall()
+    agregado = pd.DataFrame(linhas, columns=['envio', 'qtd_retornos', 'valor_gerado', 'primeira_venda'])
+    resumo = agregado.set_index('envio').reindex(pd.RangeIndex(quantidade))
+    resumo['qtd_retornos'] = resumo['qtd_retornos'].fillna(0).astype(int)
+    resumo['valor_gerado'] = resumo['valor_gerado'].fillna(0.0).astype(float)
+    resumo['primeira_venda'] = pd.to_datetime(resumo['primeira_venda'], unit='ns')
+    return resumo
+
+
+def analisar_banco(caminho=BANCO_FILE, janela_dias: int = None, regra: str = REGRA_PADRAO,
+                   meses=None) -> pd.DataFrame:
+    """
+    Análise de retorno de todas as lojas do banco, no mesmo formato de analisar_retorno
+    (com a coluna `loja` se o banco veio de lojas.json). Com `meses`, só as mensagens
+    desses meses; nas regras de toque a disputa entre mensagens considera todos os meses.
+    Só a atribuição roda em SQL: o resultado completo volta como DataFrame em memória.
+    """
+    if regra not in REGRAS_ATRIBUICAO:
+        raise ValueError(f"Regra de atribuição desconhecida: {regra} (use {', '.join(REGRAS_ATRIBUICAO)})")
+
+    conexao = conectar(caminho, somente_leitura=True)
+    try:
+        varias_lojas = _ler_metadado(conexao, 'varias_lojas', False)
+        lojas = [nome for nome, in conexao.execute("SELECT loja FROM lojas ORDER BY ordem")]
+        resultados = []
+        for loja in lojas:
+            envios = pd.read_sql_query(
+                "SELECT mes_referencia, placa, nome, telefone, data_envio FROM envios "
+                "WHERE loja = ? ORDER BY envio", conexao, params=(loja,)
+            )
+            if envios.empty:
+                continue
+            envios['mes_referencia'] = envios['mes_referencia'].astype('category')
+            envios['data_envio'] = pd.to_datetime(envios['data_envio'], unit='ns')
+            resumo = _resumir_loja(conexao, loja, len(envios), janela_dias, regra, meses)
+            df_analise = montar_analise(envios, resumo)
+            if meses is not None:
+                df_analise = df_analise[df_analise['mes_referencia'].isin(meses)].reset_index(drop=True)
+            if varias_lojas:
+                df_analise.insert(0, 'loja', loja)
+            resultados.append(df_analise)
+    finally:
+        conexao.close()
+
+    resultados = [r for r in resultados if not r.empty]
+    if not resultados:
+        return pd.DataFrame()
+    if not varias_lojas:
+        return resultados[0]
+
+    df_analise = pd.concat(resultados, ignore_index=True)
+    df_analise['loja'] = pd.Categorical(df_analise['loja'], categories=lojas)
+    df_analise['mes_referencia'] = df_analise['mes_referencia'].astype(str).astype('category')
+    return df_analise
+
+
+def main():
+    """Atualiza o banco local e, opcionalmente, mostra a análise consultada nele"""
+    parser = argparse.ArgumentParser(description="Banco SQLite das vendas e do histórico de envios")
+    parser.add_argument("--config", default=LOJAS_FILE,
+                        help="lista de lojas (sem o arquivo, grava a loja única)")
+    parser.add_argument("--banco", default=BANCO_FILE)
+    parser.add_argument("--forcar", action="store_true", help="regrava todas as lojas")
+    parser.add_argument("--analisar", action="store_true", help="mostra o resumo da análise consultada no banco")
+    parser.add_argument("--janela", type=int,
+                        help="só conta vendas até N dias após o envio (padrão: sem limite)")
+    parser.add_argument("--regra", choices=list(REGRAS_ATRIBUICAO), default=REGRA_PADRAO,
+                        help="atribuição de cada venda: a todas as mensagens anteriores ou a um só toque")
+    parser.add_argument("--meses", nargs="+", help="só as mensagens destes meses (ex: 2025-11 2025-12)")
+    args = parser.parse_args()
+
+    atualizar_banco(args.banco, args.config, forcar=args.forcar)
+    if not args.analisar:
+        return
+
+    df_analise = analisar_banco(args.banco, args.janela, args.regra, args.meses)
+    if df_analise.empty:
+        log("⚠️ Nenhum dado para análise")
+        return
+    if 'loja' in df_analise.columns:
+        log("Resumo por loja:\n" + resumo_por_loja(df_analise).to_string(index=False))
+    else:
+        log(f"{len(df_analise):,} mensagens, {int(df_analise['retornou'].sum()):,} retornos, "
+            f"R$ {df_analise['valor_gerado'].sum():,.2f} gerados")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+"""
+Benchmark do caminho de dados do dashboard
+Gera histórico de envios e planilha de vendas sintéticos (mesmos formatos de placa,
+datas em texto e valores com vírgula decimal), mede tempo e memória de cada etapa (pico do
+heap do Python/numpy e memória retida pelo Arrow) e confere se a análise otimizada produz o
+mesmo resultado da implementação original.
+
+Uso:
+    python benchmark.py                          # escalas 10k, 100k e 1m
+    python benchmark.py --escalas 10k --verificar
+    python benchmark.py --escalas 1m --sem-excel # pula gravação/leitura do .xlsx
+"""
+
+import argparse
+import json
+import string
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from analise_incremental import analisar_retorno_incremental
+from analise_retorno import analisar_retorno, indexar_vendas
+from cache_vendas import caminhos_cache, carregar_vendas_cache
+from historico import carregar_envios
+from normalizacao import canonizar_placas
+from utilitarios import log
+
+ESCALAS = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+# Proporções aproximadas da base real: ~1 mensagem para cada 18 vendas
+VENDAS_POR_MENSAGEM = 18
+CLIENTES_POR_MENSAGEM = 4
+
+MODELOS = ['STRADA', 'GOL', 'HR', 'SPIN', 'TORO', 'FOX', 'KWID', 'CRUZE', 'SPRINTER', 'VW']
+NOMES = ['JOSE', 'MARIA', 'ANTONIO', 'ANA', 'CARLOS', 'PAULA', 'MARCOS', 'JULIANA', 'PEDRO']
+SOBRENOMES = ['SILVA', 'SOUZA', 'OLIVEIRA', 'LIMA', 'PEREIRA', 'COSTA', 'RODRIGUES', 'ALVES']
+VENDEDORES = ['ALEXANDRE JUNIOR', 'MATHEUS VINICIUS', 'MEIRE']
+
+
+# ==================== GERADORES ====================
+
+def gerar_placas(quantidade: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Placas únicas, metade no padrão antigo (ABC1234) e metade Mercosul (ABC1D23).
+    Duas placas equivalentes (ABC1234 e ABC1C34) seriam o mesmo carro, então só uma entra.
+    """
+    letras = np.array(list(string.ascii_uppercase))
+    digitos = np.array(list(string.digits))
+    placas = {}
+    while len(placas) < quantidade:
+        faltam = quantidade - len(placas)
+        prefixo = [''.join(l) for l in rng.choice(letras, size=(faltam, 3))]
+        d1 = rng.choice(digitos, size=faltam)
+        meio = np.where(rng.random(faltam) < 0.5, rng.choice(letras, size=faltam), rng.choice(digitos, size=faltam))
+        fim = [''.join(d) for d in rng.choice(digitos, size=(faltam, 2))]
+        novas = pd.Series([p + a + b + c for p, a, b, c in zip(prefixo, d1, meio, fim)])
+        for canonica, placa in zip(canonizar_placas(novas), novas):
+            placas.setdefault(canonica, placa)
+    return np.array(sorted(list(placas.values())[:quantidade]))
+
+
+def _placa_equivalente(placa: str) -> str:
+    """A mesma placa na outra forma: ABC1234 <-> ABC1C34 (o 5º caractere 0-9 <-> A-J)"""
+    quinto = placa[4]
+    if quinto.isdigit():
+        return placa[:4] + "ABCDEFGHIJ"[int(quinto)] + placa[5:]
+    if quinto in "ABCDEFGHIJ":
+        return placa[:4] + str("ABCDEFGHIJ".index(quinto)) + placa[5:]
+    return placa
+
+
+def _nomes(quantidade: int, rng: np.random.Generator) -> np.ndarray:
+    """Nomes de clientes aleatórios"""
+    return np.char.add(
+        np.char.add(rng.choice(NOMES, size=quantidade), ' '),
+        rng.choice(SOBRENOMES, size=quantidade)
+    )
+
+
+def gerar_historico(mensagens: int, placas: np.ndarray, inicio: datetime,
+                    rng: np.random.Generator) -> dict:
+    """
+    Histórico {mes: {placa: dados}} no formato de historico_envios.json.
+    As mensagens são distribuídas entre meses consecutivos a partir de `inicio`.
+    """
+    meses = max(1, min(24, mensagens // 200))
+    # Dentro do mês cada placa recebe uma mensagem; entre meses a mesma placa pode se repetir
+    por_mes = [
+        rng.choice(len(placas), size=len(parte), replace=False)
+        for parte in np.array_split(np.arange(mensagens), meses)
+    ]
+    nomes = _nomes(len(placas), rng)
+    fones = rng.integers(41_900_000_000, 48_999_999_999, size=len(placas)).astype(str)
+
+    historico = {}
+    for i, indices in enumerate(por_mes):
+        base = (pd.Timestamp(inicio) + pd.DateOffset(months=i)).to_pydatetime()
+        segundos = rng.integers(0, 27 * 86400, size=len(indices))
+        envios_mes = {}
+        for indice, segundo in zip(indices, segundos):
+            envios_mes[str(placas[indice])] = {
+                'nome': str(nomes[indice]),
+                'fone': str(fones[indice]),
+                'data_envio': (base + timedelta(seconds=int(segundo))).strftime("%Y-%m-%d %H:%M:%S"),
+                'mensagem_preview': f"Prezado(a) {str(nomes[indice]).title()}, registramos que se completaram seis meses..."
+            }
+        historico[base.strftime("%Y-%m")] = envios_mes
+    return historico
+
+
+def gerar_vendas(vendas: int, placas: np.ndarray, inicio: datetime, dias: int,
+                 rng: np.random.Generator) -> pd.DataFrame:
+    """
+    Planilha de vendas no formato de Vendas_Lubrimax.xlsx (Sheet1), em ordem de emissão.
+    A placa aparece em IDENTIFICAÇÃO e/ou OBSERVAÇÃO com textos variados; parte das
+    vendas não tem placa (CONSUMIDOR).
+    """
+    datas = np.sort(rng.integers(0, dias, size=vendas))
+    emissao = pd.to_datetime(inicio) + pd.to_timedelta(datas, unit='D')
+    placa = rng.choice(placas, size=vendas)
+    # Parte das vendas cita a forma equivalente da placa (antiga <-> Mercosul): é o mesmo carro
+    equivalente = rng.random(vendas) < 0.15
+    placa[equivalente] = [_placa_equivalente(p) for p in placa[equivalente]]
+    modelo = rng.choice(MODELOS, size=vendas)
+    sem_placa = rng.random(vendas) < 0.2
+    formato = rng.integers(0, 4, size=vendas)
+
+    identificacao = np.where(formato % 2 == 0, np.char.add(np.char.add(modelo, ' '), placa), placa).astype(object)
+    observacao = np.where(
+        formato < 2,
+        np.char.add('PLACA: ', placa),
+        np.char.add(np.char.add(np.char.add('PLACA: ', placa), ' KM: '), rng.integers(1000, 300000, size=vendas).astype(str))
+    ).astype(object)
+    identificacao[sem_placa] = np.nan
+    observacao[sem_placa | (formato == 3)] = np.nan
+
+    centavos = rng.integers(2000, 500000, size=vendas)
+    total = np.char.replace((centavos / 100).astype(str), '.', ',')
+    total = np.where(rng.random(vendas) < 0.1, np.char.add('R$ ', total), total)
+
+    return pd.DataFrame({
+        'EMISSÃO': emissao.strftime('%d/%m/%Y'),
+        'SÉRIE': np.where(sem_placa, '65', '55'),
+        'NUMERO VENDA': np.arange(30000, 30000 + vendas),
+        'CLIENTE': np.where(sem_placa, 'CONSUMIDOR', _nomes(vendas, rng)),
+        'TOTAL VENDA': total,
+        'VENDEDOR': rng.choice(VENDEDORES, size=vendas),
+        'IDENTIFICAÇÃO': identificacao,
+        'STATUS': 'AUTORIZADA',
+        'OBSERVAÇÃO': observacao,
+    })
+
+
+def gerar_base(vendas: int, semente: int = 42):
+    """Gera (historico, df_vendas) coerentes entre si para a escala pedida"""
+    rng = np.random.default_rng(semente)
+    mensagens = max(1, vendas // VENDAS_POR_MENSAGEM)
+    placas = gerar_placas(mensagens * CLIENTES_POR_MENSAGEM, rng)
+    inicio_vendas = datetime(2023, 6, 1)
+    inicio_envios = datetime(2025, 6, 1)
+    dias = (inicio_envios - inicio_vendas).days + 30 * max(1, min(24, mensagens // 200)) + 60
+    historico = gerar_historico(mensagens, placas, inicio_envios, rng)
+    df_vendas = gerar_vendas(vendas, placas, inicio_vendas, dias, rng)
+    return historico, df_vendas
+
+
+# ==================== IMPLEMENTAÇÃO ORIGINAL ====================
+# Cópia congelada do dashboard original (parse de valores e datas incluído), para que uma
+# regressão nos conversores compartilhados (normalizacao.py) apareça na verificação.
+# Única mudança intencional: a placa também é procurada na forma equivalente (antiga <->
+# Mercosul), que a análise atual trata como o mesmo carro.
+
+def _parse_valor_original(valor):
+    """Converte string de valor (ex: '1654,3') para float"""
+    try:
+        if isinstance(valor, (int, float)):
+            return float(valor)
+        if isinstance(valor, str):
+            # Remove R$ e espacos, substitui virgula por ponto
+            valor_limpo = valor.replace('R$', '').strip().replace(',', '.')
+            if not valor_limpo:
+                return 0.0
+            return float(valor_limpo)
+    except (TypeError, ValueError):
+        pass
+    return 0.0
+
+
+def _parse_data_emissao_original(emissao):
+    """Converte data de emissão para datetime"""
+    try:
+        if pd.isna(emissao):
+            return None
+        if isinstance(emissao, str):
+            parts = emissao.split('/')
+            if len(parts) == 3:
+                day, month, year = int(parts[0]), int(parts[1]), int(parts[2])
+                return datetime(year, month, day)
+        elif isinstance(emissao, datetime):
+            return emissao
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def analisar_retorno_referencia(historico: dict, df_vendas: pd.DataFrame) -> pd.DataFrame:
+    """Implementação original (busca por substring placa a placa), usada como referência"""
+    resultados = []
+    identificacao = df_vendas['IDENTIFICAÇÃO'].astype(str).str.upper()
+    observacao = df_vendas['OBSERVAÇÃO'].astype(str).str.upper()
+
+    for mes_ano, envios in historico.items():
+        for placa, dados in envios.items():
+            try:
+                data_envio = datetime.strptime(dados.get('data_envio', ''), "%Y-%m-%d %H:%M:%S")
+            except (TypeError, ValueError):
+                continue
+
+            encontrada = pd.Series(False, index=df_vendas.index)
+            for forma in {placa, _placa_equivalente(placa)}:
+                encontrada |= identificacao.str.contains(forma, na=False, regex=False)
+                encontrada |= observacao.str.contains(forma, na=False, regex=False)
+            vendas_placa = df_vendas[encontrada]
+
+            datas, valores = [], []
+            for _, venda in vendas_placa.iterrows():
+                data_venda = _parse_data_emissao_original(venda.get('EMISSÃO'))
+                if data_venda and data_venda > data_envio:
+                    datas.append(data_venda)
+                    valores.append(_parse_valor_original(venda.get('TOTAL VENDA', 0)))
+
+            resultados.append({
+                'mes_referencia': mes_ano,
+                'placa': placa,
+                'nome': dados.get('nome', ''),
+                'telefone': dados.get('fone', ''),
+                'data_envio': data_envio,
+                'retornou': len(datas) > 0,
+                'qtd_retornos': len(datas),
+                'valor_gerado': sum(valores) if valores else 0,
+                'dias_ate_retorno': (min(datas) - data_envio).days if datas else None
+            })
+
+    return pd.DataFrame(resultados)
+
+
+def comparar_analises(obtida: pd.DataFrame, esperada: pd.DataFrame):
+    """Falha com AssertionError se as análises diferirem (tolerância só em ponto flutuante)"""
+    pd.testing.assert_frame_equal(
+        obtida.reset_index(drop=True).astype({'mes_referencia': str}),
+        esperada.reset_index(drop=True).astype({'mes_referencia': str}),
+        check_dtype=False
+    )
+
+
+# ==================== MEDIÇÃO ====================
+
+def _memoria_arrow() -> int:
+    """Bytes alocados no pool de memória do Arrow (0 sem pyarrow)"""
+    try:
+        import pyarrow
+    except ImportError:
+        return 0
+    return pyarrow.total_allocated_bytes()
+
+
+def medir(etapa: str, funcao, *args, preparar=None, memoria: bool = True, **kwargs):
+    """
+    Mede o tempo da função e, com `memoria`, a memória em uma segunda execução (o tracemalloc
+    deixa a execução mais lenta, então não entra na medição de tempo):
+    - pico_heap_mb: pico das alocações do Python e do numpy vistas pelo tracemalloc
+    - arrow_mb: memória do Arrow retida pelo resultado (buffers do pyarrow, como as colunas de
+      texto do pandas e as tabelas lidas do Parquet, que o tracemalloc não enxerga)
+    `preparar` é chamado antes de cada execução para restaurar o estado inicial.
+    Retorna (resultado, medição).
+    """
+    if preparar:
+        preparar()
+    inicio = time.perf_counter()
+    resultado = funcao(*args, **kwargs)
+    segundos = time.perf_counter() - inicio
+
+    pico = arrow = None
+    if memoria:
+        if preparar:
+            preparar()
+        arrow_antes = _memoria_arrow()
+        tracemalloc.start()
+        try:
+            repeticao = funcao(*args, **kwargs)
+            pico = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        finally:
+            tracemalloc.stop()
+        arrow = (_memoria_arrow() - arrow_antes) / 1024 / 1024
+        del repeticao
+
+    return resultado, {'etapa': etapa, 'segundos': segundos, 'pico_heap_mb': pico, 'arrow_mb': arrow}
+
+
+def _ler_json(caminho):
+    """Leitura do histórico como era feita antes (documento inteiro)"""
+    with open(caminho, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _apagar(*caminhos):
+    """Remove arquivos de cache/estado para medir a execução a frio"""
+    for caminho in caminhos:
+        Path(caminho).unlink(missing_ok=True)
+
+
+def executar_escala(nome: str, vendas: int, pasta: Path, com_excel: bool = True,
+                    verificar: bool = False, memoria: bool = True) -> list:
+    """Gera a base na escala pedida e mede cada etapa do caminho de dados"""
+    historico, df_vendas = gerar_base(vendas)
+    medicoes = []
+
+    caminho_historico = pasta / f"historico_{nome}.json"
+    with open(caminho_historico, 'w', encoding='utf-8') as f:
+        json.dump(historico, f, ensure_ascii=False, indent=2)
+
+    _, medicao = medir('carregar_historico (json.load)', _ler_json, caminho_historico, memoria=memoria)
+    medicoes.append(medicao)
+    envios, medicao = medir('carregar_historico (streaming)', carregar_envios, caminho_historico,
+                            memoria=memoria)
+    medicoes.append(medicao)
+
+    if com_excel:
+        caminho_vendas = pasta / f"vendas_{nome}.xlsx"
+        df_vendas.to_excel(caminho_vendas, sheet_name="Sheet1", index=False)
+        _, medicao = medir('carregar_vendas (xlsx + gera cache)', carregar_vendas_cache, caminho_vendas,
+                           preparar=lambda: _apagar(*caminhos_cache(caminho_vendas)), memoria=memoria)
+        medicoes.append(medicao)
+        df_vendas, medicao = medir('carregar_vendas (cache parquet)', carregar_vendas_cache, caminho_vendas,
+                                   memoria=memoria)
+        medicoes.append(medicao)
+
+    df_analise, medicao = medir('analisar_retorno', analisar_retorno, envios, df_vendas, memoria=memoria)
+    medicoes.append(medicao)
+
+    # Consulta de um mês só, com o índice da planilha já montado (como no dashboard)
+    indice, medicao = medir('indexar_vendas', indexar_vendas, df_vendas, memoria=memoria)
+    medicoes.append(medicao)
+    ultimo_mes = envios['mes_referencia'].cat.categories.max()
+    envios_mes = envios[envios['mes_referencia'] == ultimo_mes].reset_index(drop=True)
+    df_mes, medicao = medir(f'analisar_retorno (só {ultimo_mes}, índice pronto)', analisar_retorno,
+                            envios_mes, df_vendas, indice=indice, memoria=memoria)
+    medicoes.append(medicao)
+    comparar_analises(df_mes, df_analise[df_analise['mes_referencia'] == ultimo_mes])
+
+    # Atribuição por último toque com janela: junção ordenada (merge_asof) de mensagens e vendas
+    _, medicao = medir('analisar_retorno (último toque, 90 dias, índice pronto)', analisar_retorno,
+                       envios, df_vendas, indice=indice, janela_dias=90, regra='ultimo_toque',
+                       memoria=memoria)
+    medicoes.append(medicao)
+
+    estado = {'caminho_estado': pasta / f"estado_{nome}.parquet", 'caminho_meta': pasta / f"estado_{nome}.json"}
+    incremental, medicao = medir('analisar_retorno_incremental (frio)', analisar_retorno_incremental,
+                                 envios, df_vendas, preparar=lambda: _apagar(*estado.values()),
+                                 memoria=memoria, **estado)
+    medicoes.append(medicao)
+    comparar_analises(incremental, df_analise)
+    incremental, medicao = medir('analisar_retorno_incremental (sem mudanças)', analisar_retorno_incremental,
+                                 envios, df_vendas, memoria=memoria, **estado)
+    medicoes.append(medicao)
+    comparar_analises(incremental, df_analise)
+
+    if verificar:
+        referencia, medicao = medir('analisar_retorno (implementação original)',
+                                    analisar_retorno_referencia, historico, df_vendas, memoria=False)
+        medicoes.append(medicao)
+        comparar_analises(df_analise, referencia)
+        log(f"✅ {nome}: resultado idêntico à implementação original")
+
+    log(f"✅ {nome}: {len(df_vendas):,} vendas, {len(df_analise):,} mensagens, "
+        f"{int(df_analise['retornou'].sum()):,} retornos")
+    return [{'escala': nome, **m} for m in medicoes]
+
+
+def main():
+    """Executa o benchmark nas escalas pedidas e imprime a tabela de resultados"""
+    parser = argparse.ArgumentParser(description="Benchmark do caminho de dados do dashboard")
+    parser.add_argument("--escalas", nargs="+", choices=list(ESCALAS), default=list(ESCALAS))
+    parser.add_argument("--sem-excel", action="store_true",
+                        help="não grava nem lê .xlsx (a gravação é lenta nas escalas grandes)")
+    parser.add_argument("--sem-memoria", action="store_true",
+                        help="não mede a memória (cada etapa roda uma vez só)")
+    parser.add_argument("--verificar", action="store_true",
+                        help="compara com a implementação original (lenta: placa a placa)")
+    parser.add_argument("--saida", help="grava os resultados em CSV")
+    args = parser.parse_args()
+
+    resultados = []
+    with tempfile.TemporaryDirectory() as pasta:
+        for nome in args.escalas:
+            log(f"Executando escala {nome} ({ESCALAS[nome]:,} vendas)...")
+            resultados += executar_escala(
+                nome, ESCALAS[nome], Path(pasta), com_excel=not args.sem_excel,
+                verificar=args.verificar, memoria=not args.sem_memoria
+            )
+
+    tabela = pd.DataFrame(resultados)
+    exibir = tabela.assign(
+        segundos=tabela['segundos'].map('{:.3f}'.format),
+        pico_heap_mb=tabela['pico_heap_mb'].map(lambda v: 'n/d' if pd.isna(v) else f'{v:.1f}'),
+        arrow_mb=tabela['arrow_mb'].map(lambda v: 'n/d' if pd.isna(v) else f'{v:.1f}')
+    )
+    log("Resultados:\n" + exibir.to_string(index=False))
+    if args.saida:
+        tabela.to_csv(args.saida, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Cache colunar da planilha de vendas
+Converte Vendas_Lubrimax.xlsx para Parquet uma única vez e reaproveita o arquivo
+enquanto a planilha não mudar (tamanho, data de modificação e hash SHA-256).
+
+Uso:
+    python cache_vendas.py                   # gera o cache se estiver desatualizado
+    python cache_vendas.py --forcar          # regera o cache mesmo se estiver válido
+    python cache_vendas.py outra_planilha.xlsx
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from utilitarios import log
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_DISPONIVEL = True
+except ImportError:
+    PARQUET_DISPONIVEL = False
+
+SHEET_VENDAS = "Sheet1"
+VERSAO_CACHE = 1
+
+
+def caminhos_cache(arquivo_excel) -> tuple:
+    """Retorna os caminhos do Parquet e da assinatura ao lado da planilha"""
+    arquivo_excel = Path(arquivo_excel)
+    base = arquivo_excel.with_suffix("")
+    return Path(f"{base}.cache.parquet"), Path(f"{base}.cache.json")
+
+
+def calcular_hash(caminho) -> str:
+    """Calcula o SHA-256 do arquivo em blocos"""
+    sha = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def assinatura_arquivo(caminho, com_hash: bool = True) -> dict:
+    """Tamanho, data de modificação e (opcionalmente) hash do arquivo"""
+    info = os.stat(caminho)
+    assinatura = {
+        "versao": VERSAO_CACHE,
+        "tamanho": info.st_size,
+        "mtime_ns": info.st_mtime_ns,
+    }
+    if com_hash:
+        assinatura["sha256"] = calcular_hash(caminho)
+    return assinatura
+
+
+def ler_assinatura(caminho_assinatura) -> dict:
+    """Lê a assinatura gravada junto do cache (vazia se não existir ou estiver corrompida)"""
+    try:
+        with open(caminho_assinatura, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def gravar_atomico(caminho, escrever):
+    """Grava em arquivo temporário e renomeia, para nunca expor um cache pela metade"""
+    caminho = Path(caminho)
+    temporario = caminho.with_name(f"{caminho.name}.{os.getpid()}.tmp")
+    try:
+        escrever(temporario)
+        os.replace(temporario, caminho)
+    finally:
+        if temporario.exists():
+            temporario.unlink()
+
+
+def cache_valido(arquivo_excel) -> bool:
+    """
+    Verifica se o cache corresponde à planilha atual.
+    Tamanho e mtime iguais bastam; se só o mtime mudou (ex.: git clone),
+    o hash decide e a assinatura é atualizada.
+    """
+    caminho_parquet, caminho_assinatura = caminhos_cache(arquivo_excel)
+    if not caminho_parquet.exists():
+        return False
+
+    gravada = ler_assinatura(caminho_assinatura)
+    if gravada.get("versao") != VERSAO_CACHE:
+        return False
+
+    atual = assinatura_arquivo(arquivo_excel, com_hash=False)
+    if atual["tamanho"] != gravada.get("tamanho"):
+        return False
+    if atual["mtime_ns"] == gravada.get("mtime_ns"):
+        return True
+
+    atual["sha256"] = calcular_hash(arquivo_excel)
+    if atual["sha256"] != gravada.get("sha256"):
+        return False
+
+    gravar_atomico(
+        caminho_assinatura,
+        lambda tmp: tmp.write_text(json.dumps(atual, indent=2), encoding="utf-8")
+    )
+    return True
+
+
+def construir_cache(arquivo_excel, df: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Lê a planilha (se `df` não for informado) e grava o cache Parquet com sua assinatura.
+    Retorna o DataFrame lido. Se a conversão falhar, o cache não é gravado.
+    """
+    assinatura = assinatura_arquivo(arquivo_excel)
+    if df is None:
+        df = pd.read_excel(arquivo_excel, sheet_name=SHEET_VENDAS)
+
+    if not PARQUET_DISPONIVEL:
+        return df
+
+    caminho_parquet, caminho_assinatura = caminhos_cache(arquivo_excel)
+    try:
+        gravar_atomico(caminho_parquet, lambda tmp: df.to_parquet(tmp, index=False))
+    except Exception as e:
+        # Colunas com tipos misturados não são aceitas pelo Parquet: segue sem cache
+        log(f"⚠️ Não foi possível gravar o cache de {arquivo_excel}: {e}")
+        return df
+
+    gravar_atomico(
+        caminho_assinatura,
+        lambda tmp: tmp.write_text(json.dumps(assinatura, indent=2), encoding="utf-8")
+    )
+    return df
+
+
+def carregar_vendas_cache(arquivo_excel) -> pd.DataFrame:
+    """
+    Carrega as vendas do cache Parquet quando ele está válido.
+    Caso contrário lê o Excel e regrava o cache para as próximas leituras.
+    """
+    if PARQUET_DISPONIVEL and cache_valido(arquivo_excel):
+        caminho_parquet, _ = caminhos_cache(arquivo_excel)
+        try:
+            return pd.read_parquet(caminho_parquet)
+        except Exception as e:
+            log(f"⚠️ Cache de vendas ilegível, relendo o Excel: {e}")
+
+    return construir_cache(arquivo_excel)
+
+
+def main():
+    """Gera o cache colunar da planilha de vendas"""
+    parser = argparse.ArgumentParser(description="Gera o cache Parquet da planilha de vendas")
+    parser.add_argument("arquivo", nargs="?", default="Vendas_Lubrimax.xlsx",
+                        help="planilha de vendas (padrão: Vendas_Lubrimax.xlsx)")
+    parser.add_argument("--forcar", action="store_true",
+                        help="regera o cache mesmo que esteja válido")
+    args = parser.parse_args()
+
+    if not PARQUET_DISPONIVEL:
+        log("❌ pyarrow não está instalado; o cache Parquet não pode ser gerado")
+        raise SystemExit(1)
+
+    if not Path(args.arquivo).exists():
+        log(f"❌ {args.arquivo} não encontrado")
+        raise SystemExit(1)
+
+    if not args.forcar and cache_valido(args.arquivo):
+        log(f"ℹ️ Cache de {args.arquivo} já está atualizado")
+        return
+
+    log(f"Convertendo {args.arquivo} para Parquet...")
+    df = construir_cache(args.arquivo)
+    if not cache_valido(args.arquivo):
+        raise SystemExit(1)
+
+    caminho_parquet, _ = caminhos_cache(args.arquivo)
+    log(f"✅ Cache gerado: {caminho_parquet} ({len(df):,} vendas)")
+
+
+if __name__ == "__main__":
+    main()
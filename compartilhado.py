@@ -0,0 +1,285 @@
+"""
+Dados compartilhados entre sessões e processos do dashboard
+Cada sessão do Streamlit roda `main()` por conta própria: logo depois da atualização diária,
+várias pessoas abrindo a página ao mesmo tempo disparariam a mesma leitura e a mesma análise
+em paralelo. Aqui cada carga é feita uma única vez:
+
+- CargaUnica: a primeira requisição de uma chave calcula; as que chegam enquanto o cálculo
+  está em andamento esperam o mesmo Future, e as seguintes recebem o resultado pronto.
+- TabelasCompartilhadas: os DataFrames calculados são publicados como arquivos Arrow (IPC,
+  sem compressão) em DIRETORIO_COMPARTILHADO e lidos por mapeamento em memória. As colunas
+  numéricas e de datas viram visões somente leitura do arquivo e os textos continuam em
+  buffers Arrow: todas as sessões usam as mesmas páginas de memória em vez de uma cópia cada,
+  e outro processo (outro worker do Streamlit na mesma máquina) que peça a mesma chave
+  reaproveita o arquivo em vez de recalcular. O nome do arquivo inclui a versão do código
+  (`versao`, ex.: VERSAO_TABELAS): depois de uma atualização do código que mude o cálculo, os
+  arquivos antigos não são reaproveitados mesmo que os dados de entrada sejam os mesmos.
+
+Os contadores (acertos, cargas, esperas por carga em andamento, falhas, tempo de carga e
+arquivos publicados ou reaproveitados) ficam em `metricas()`.
+
+Uso (fora do Streamlit):
+    python compartilhado.py                  # simula 20 sessões pedindo o relatório ao mesmo tempo
+    python compartilhado.py --sessoes 50
+    python compartilhado.py --limpar         # apaga os arquivos publicados
+"""
+
+import argparse
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from cache_vendas import PARQUET_DISPONIVEL, gravar_atomico
+from utilitarios import log
+
+DIRETORIO_COMPARTILHADO = ".dados_compartilhados"
+MAX_ENTRADAS = 8
+MANTER_ARQUIVOS = 8  # arquivos mais recentes mantidos por nome (os demais são apagados)
+VERSAO_TABELAS = 1   # suba quando mudar o cálculo ou o formato do que é publicado
+
+
+class CargaUnica:
+    """
+    Resultados memorizados por chave (no máximo `max_entradas`, descartando os menos usados),
+    com uma única carga por chave: quem pede uma chave em carregamento espera o mesmo Future.
+    Uma carga que falha não fica guardada; o erro vai para quem estava esperando.
+    """
+
+    def __init__(self, max_entradas: int = MAX_ENTRADAS):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()  # chave -> Future
+        self._trava = threading.Lock()
+        self.acertos = 0
+        self.cargas = 0
+        self.esperas = 0
+        self.falhas = 0
+        self.em_andamento = 0
+        self.max_simultaneas = 0
+        self.tempo_carga = 0.0
+
+    def obter(self, chave, carregar):
+        """Resultado de `carregar()` para a chave, calculado uma única vez"""
+        with self._trava:
+            futuro = self._entradas.get(chave)
+            responsavel = futuro is None
+            if responsavel:
+                futuro = Future()
+                self._entradas[chave] = futuro
+                self.cargas += 1
+                self.em_andamento += 1
+                self.max_simultaneas = max(self.max_simultaneas, self.em_andamento)
+                self._descartar_antigas()
+            else:
+                self._entradas.move_to_end(chave)
+                if futuro.done():
+                    self.acertos += 1
+                else:
+                    self.esperas += 1
+
+        if responsavel:
+            inicio = time.perf_counter()
+            try:
+                futuro.set_result(carregar())
+            except BaseException as e:
+                futuro.set_exception(e)
+                with self._trava:
+                    self.falhas += 1
+                    if self._entradas.get(chave) is futuro:
+                        del self._entradas[chave]
+            finally:
+                with self._trava:
+                    self.em_andamento -= 1
+                    self.tempo_carga += time.perf_counter() - inicio
+        return futuro.result()
+
+    def _descartar_antigas(self):
+        """Descarta os resultados prontos menos usados acima do limite (cargas em andamento ficam)"""
+        excesso = len(self._entradas) - self.max_entradas
+        for chave in [chave for chave, futuro in self._entradas.items() if futuro.done()][:max(excesso, 0)]:
+            del self._entradas[chave]
+
+    def limpar(self):
+        """Descarta os resultados prontos (cargas em andamento terminam normalmente)"""
+        with self._trava:
+            for chave in [chave for chave, futuro in self._entradas.items() if futuro.done()]:
+                del self._entradas[chave]
+
+    def metricas(self) -> dict:
+        """Contadores de uso desde o início do processo"""
+        with self._trava:
+            return {
+                'entradas': len(self._entradas),
+                'acertos': self.acertos,
+                'cargas': self.cargas,
+                'esperas': self.esperas,
+                'falhas': self.falhas,
+                'em_andamento': self.em_andamento,
+                'max_simultaneas': self.max_simultaneas,
+                'tempo_carga_s': round(self.tempo_carga, 3),
+            }
+
+
+# ==================== TABELAS ARROW ====================
+
+def nome_arquivo(nome: str, chave) -> str:
+    """Arquivo da tabela: nome legível mais o hash da chave (igual em todos os processos)"""
+    return f"{nome}-{hashlib.sha256(repr(chave).encode()).hexdigest()[:16]}.arrow"
+
+
+def gravar_tabela(df: pd.DataFrame, caminho):
+    """Grava o DataFrame como arquivo Arrow IPC sem compressão (pronto para mapear na memória)"""
+    import pyarrow as pa
+
+    tabela = pa.Table.from_pandas(df)
+
+    def escrever(destino):
+        with pa.OSFile(str(destino), 'wb') as arquivo, pa.ipc.new_file(arquivo, tabela.schema) as escritor:
+            escritor.write_table(tabela)
+
+    gravar_atomico(caminho, escrever)
+
+
+def abrir_tabela(caminho) -> pd.DataFrame:
+    """
+    DataFrame lido do arquivo Arrow mapeado na memória: colunas numéricas e de datas sem nulos
+    são visões somente leitura das páginas do arquivo, compartilhadas entre processos.
+    """
+    import pyarrow as pa
+
+    with pa.memory_map(str(caminho)) as mapa:
+        tabela = pa.ipc.open_file(mapa).read_all()
+    return tabela.to_pandas(split_blocks=True)
+
+
+class TabelasCompartilhadas:
+    """
+    Cargas únicas por nome (cada nome com o seu limite de entradas). DataFrames são publicados
+    em `diretorio` e devolvidos a partir do arquivo mapeado; outros resultados (ex.: dicionários
+    com vendas indexadas) ficam só na memória do processo. Sem pyarrow ou sem permissão de
+    escrita, os DataFrames também ficam só na memória. `versao` entra no nome de cada arquivo:
+    só processos com a mesma versão do código reaproveitam os arquivos uns dos outros.
+    """
+
+    def __init__(self, diretorio=DIRETORIO_COMPARTILHADO, manter: int = MANTER_ARQUIVOS, versao=VERSAO_TABELAS):
+        self.diretorio = Path(diretorio)
+        self.manter = manter
+        self.versao = versao
+        self._cargas = {}
+        self._trava = threading.Lock()
+        self.publicadas = 0
+        self.reaproveitadas = 0
+
+    def _carga(self, nome: str, max_entradas: int) -> CargaUnica:
+        with self._trava:
+            if nome not in self._cargas:
+                self._cargas[nome] = CargaUnica(max_entradas)
+            return self._cargas[nome]
+
+    def obter(self, nome: str, chave, calcular, max_entradas: int = MAX_ENTRADAS):
+        """
+        Resultado de `calcular()` para (nome, chave): calculado uma vez por processo e, se for
+        um DataFrame, uma vez por máquina (os outros processos leem o arquivo publicado).
+        Compartilhado entre as sessões: não deve ser alterado.
+        """
+        return self._carga(nome, max_entradas).obter(chave, lambda: self._carregar(nome, chave, calcular))
+
+    def _carregar(self, nome: str, chave, calcular):
+        caminho = self.diretorio / nome_arquivo(nome, (self.versao, chave))
+        if PARQUET_DISPONIVEL and caminho.exists():
+            try:
+                df = abrir_tabela(caminho)
+                with self._trava:
+                    self.reaproveitadas += 1
+                return df
+            except Exception as e:  # arquivo corrompido ou de outra versão: recalcula
+                log(f"⚠️ Tabela compartilhada {caminho} ilegível, recalculando: {e}")
+
+        resultado = calcular()
+        if not PARQUET_DISPONIVEL or not isinstance(resultado, pd.DataFrame):
+            return resultado
+        try:
+            self.diretorio.mkdir(exist_ok=True)
+            gravar_tabela(resultado, caminho)
+            compartilhado = abrir_tabela(caminho)
+        except Exception as e:
+            log(f"⚠️ Não foi possível publicar {caminho} (usando a cópia em memória): {e}")
+            return resultado
+        compartilhado.attrs.update(resultado.attrs)
+        with self._trava:
+            self.publicadas += 1
+        self._apagar_antigos(nome)
+        return compartilhado
+
+    def _apagar_antigos(self, nome: str):
+        """Mantém só os `manter` arquivos mais recentes do nome"""
+        arquivos = sorted(self.diretorio.glob(f"{nome}-*.arrow"), key=lambda a: a.stat().st_mtime_ns, reverse=True)
+        for arquivo in arquivos[self.manter:]:
+            try:
+                arquivo.unlink()
+            except OSError:  # ainda mapeado por outro processo (Windows): fica para a próxima
+                pass
+
+    def limpar(self, apagar_arquivos: bool = False):
+        """Descarta os resultados em memória e, com `apagar_arquivos`, os arquivos publicados"""
+        with self._trava:
+            cargas = list(self._cargas.values())
+        for carga in cargas:
+            carga.limpar()
+        if apagar_arquivos and self.diretorio.exists():
+            for arquivo in self.diretorio.glob("*.arrow"):
+                try:
+                    arquivo.unlink()
+                except OSError:
+                    pass
+
+    def metricas(self) -> dict:
+        """Contadores somados de todos os nomes, com o detalhe de cada um em `por_nome`"""
+        with self._trava:
+            por_nome = {nome: carga.metricas() for nome, carga in self._cargas.items()}
+            totais = {'publicadas': self.publicadas, 'reaproveitadas': self.reaproveitadas}
+        for campo in ('entradas', 'acertos', 'cargas', 'esperas', 'falhas', 'em_andamento', 'tempo_carga_s'):
+            totais[campo] = sum(m[campo] for m in por_nome.values())
+        totais['tempo_carga_s'] = round(totais['tempo_carga_s'], 3)
+        totais['por_nome'] = por_nome
+        return totais
+
+
+def main():
+    """Simula várias sessões pedindo o relatório pré-calculado ao mesmo tempo"""
+    from relatorio import RELATORIO_FILE, carregar_relatorio
+
+    parser = argparse.ArgumentParser(description="Carga única e tabelas Arrow compartilhadas")
+    parser.add_argument("--sessoes", type=int, default=20, help="sessões simultâneas simuladas")
+    parser.add_argument("--diretorio", default=DIRETORIO_COMPARTILHADO)
+    parser.add_argument("--limpar", action="store_true", help="apaga os arquivos publicados e sai")
+    args = parser.parse_args()
+
+    tabelas = TabelasCompartilhadas(args.diretorio)
+    if args.limpar:
+        tabelas.limpar(apagar_arquivos=True)
+        log(f"Arquivos de {args.diretorio} apagados")
+        return
+
+    if not Path(RELATORIO_FILE).exists():
+        log(f"❌ {RELATORIO_FILE} não encontrado")
+        raise SystemExit(1)
+
+    def sessao(_):
+        return tabelas.obter('relatorio', RELATORIO_FILE, lambda: carregar_relatorio(RELATORIO_FILE)[0])
+
+    with ThreadPoolExecutor(max_workers=args.sessoes) as executor:
+        resultados = list(executor.map(sessao, range(args.sessoes)))
+
+    metricas = tabelas.metricas()
+    log(f"{args.sessoes} sessões, {len({id(df) for df in resultados})} DataFrame(s) distinto(s)")
+    log(f"Cargas: {metricas['cargas']} · esperas: {metricas['esperas']} · acertos: {metricas['acertos']} · "
+        f"arquivos publicados: {metricas['publicadas']} · reaproveitados: {metricas['reaproveitadas']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Curvas de retorno por coorte
+Agrupa as mensagens pelo mês de envio (coorte) e estima, para cada dia N após o envio, a
+porcentagem da coorte que já voltou à loja (Kaplan-Meier). Mensagens sem retorno contam como
+censuradas na última venda registrada da loja (o fim real da observação): uma mensagem enviada
+10 dias antes dessa venda ainda pode gerar retorno, então só entra no cálculo dos 10 primeiros dias.
+
+Tudo é calculado de uma vez para todas as coortes com NumPy (contagens por coorte e dia com
+bincount e produto acumulado ao longo dos dias), sem laço por coorte ou por mensagem.
+
+Uso:
+    python coortes.py                        # tabela de coortes do relatório pré-calculado
+    python coortes.py --marcos 7 30 60 90 --saida curvas.csv
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from lojas import LOJAS_FILE, carregar_lojas
+from relatorio import RELATORIO_FILE, carregar_relatorio
+from utilitarios import log
+from vendas_compactas import ultima_venda
+
+COORTE_TODAS = "Todas"
+MARCOS_DIAS = (30, 60, 90)
+
+
+def data_corte_analise(df_analise: pd.DataFrame) -> pd.Timestamp:
+    """
+    Estimativa do último dia observado só pela análise: o envio ou o primeiro retorno mais
+    recente. Usada quando a data da última venda registrada não é conhecida (ela é o fim
+    real do acompanhamento; veja data_corte_lojas).
+    """
+    data_envio = pd.to_datetime(df_analise['data_envio'])
+    primeiro_retorno = data_envio + pd.to_timedelta(df_analise['dias_ate_retorno'], unit='D')
+    return max(data_envio.max(), primeiro_retorno.max())
+
+
+def ultimas_vendas_lojas(config=LOJAS_FILE) -> dict:
+    """
+    Última venda registrada de cada loja de `config` (ou da loja única): o fim real do
+    acompanhamento das mensagens. Só a coluna EMISSÃO das vendas é lida.
+    """
+    return {loja['nome']: ultima_venda(loja['vendas']) for loja in carregar_lojas(config)}
+
+
+def data_corte_lojas(df_analise: pd.DataFrame, ultimas_vendas: dict):
+    """
+    Fim do acompanhamento de cada mensagem: a última venda registrada da sua loja
+    (`ultimas_vendas` = {nome da loja: data}). Sem a coluna `loja`, vale a data da loja única.
+    None se faltar a data de alguma loja (aí fica a estimativa de data_corte_analise).
+    """
+    if 'loja' not in df_analise.columns:
+        datas = [data for data in ultimas_vendas.values() if data is not None]
+        return datas[0] if len(ultimas_vendas) == 1 and datas else None
+    cortes = df_analise['loja'].astype(str).map(ultimas_vendas)
+    if cortes.isna().any():
+        return None
+    return pd.to_datetime(cortes).to_numpy(dtype='datetime64[ns]')
+
+
+def duracoes_retorno(df_analise: pd.DataFrame, data_corte=None, horizonte: int = None) -> tuple:
+    """
+    Dias de acompanhamento de cada mensagem e se houve retorno nesse prazo.
+    Com retorno, o prazo é `dias_ate_retorno`; sem retorno, os dias do envio até `data_corte`
+    (censura), uma data única ou uma por mensagem. Sem `data_corte`, usa a estimativa de
+    data_corte_analise. Com `horizonte`, o acompanhamento para nesse dia (por exemplo, a
+    janela de atribuição).
+    """
+    if data_corte is None:
+        data_corte = data_corte_analise(df_analise)
+    data_envio = pd.to_datetime(df_analise['data_envio']).to_numpy(dtype='datetime64[ns]')
+    corte = np.asarray(pd.to_datetime(data_corte), dtype='datetime64[ns]')
+    observados = (corte - data_envio) // np.timedelta64(1, 'D')
+
+    retornou = df_analise['retornou'].to_numpy(dtype=bool)
+    dias = np.where(retornou, df_analise['dias_ate_retorno'].to_numpy(dtype=float, na_value=np.nan), observados)
+    dias = np.clip(np.nan_to_num(dias, nan=0.0), 0, None).astype(np.int64)
+    if horizonte is not None:
+        retornou = retornou & (dias <= horizonte)
+        dias = np.minimum(dias, horizonte)
+    return dias, retornou
+
+
+def curvas_retorno(df_analise: pd.DataFrame, data_corte=None, horizonte: int = None) -> pd.DataFrame:
+    """
+    Curva de retorno acumulado (Kaplan-Meier) de cada coorte mensal e de todas juntas.
+    Uma linha por (coorte, dia) com em_risco (mensagens ainda acompanhadas no dia), retornos
+    e censurados do dia e retorno_acumulado (% estimada da coorte que voltou até o dia).
+    Cada coorte só vai até o último dia em que ainda havia mensagens em acompanhamento.
+    """
+    colunas = ['coorte', 'dia', 'em_risco', 'retornos', 'censurados', 'retorno_acumulado']
+    if df_analise.empty:
+        return pd.DataFrame(columns=colunas)
+
+    dias, retornou = duracoes_retorno(df_analise, data_corte, horizonte)
+    codigo, coortes = pd.factorize(df_analise['mes_referencia'].astype(str), sort=True)
+
+    # A coorte "Todas" é mais uma linha da matriz: cada mensagem entra também nela
+    coortes = np.append(coortes.to_numpy(dtype=object), COORTE_TODAS)
+    codigo = np.concatenate([codigo, np.full(len(codigo), len(coortes) - 1)])
+    dias = np.concatenate([dias, dias])
+    retornou = np.concatenate([retornou, retornou])
+
+    # Contagens por (coorte, dia) em matrizes coortes x dias
+    total_dias = int(dias.max()) + 1
+    posicao = codigo * total_dias + dias
+    tamanho = len(coortes) * total_dias
+    saidas = np.bincount(posicao, minlength=tamanho).reshape(len(coortes), total_dias)
+    retornos = np.bincount(posicao, weights=retornou, minlength=tamanho).reshape(len(coortes), total_dias)
+    censurados = saidas - retornos
+
+    # Em risco no dia d: mensagens acompanhadas por pelo menos d dias
+    em_risco = saidas[:, ::-1].cumsum(axis=1)[:, ::-1]
+    fator = np.ones_like(retornos)
+    np.divide(em_risco - retornos, em_risco, out=fator, where=em_risco > 0)
+    retorno_acumulado = (1 - np.cumprod(fator, axis=1)) * 100
+
+    acompanhado = em_risco > 0
+    linha, dia = np.nonzero(acompanhado)
+    return pd.DataFrame({
+        'coorte': coortes[linha],
+        'dia': dia,
+        'em_risco': em_risco[acompanhado],
+        'retornos': retornos[acompanhado].astype(np.int64),
+        'censurados': censurados[acompanhado].astype(np.int64),
+        'retorno_acumulado': retorno_acumulado[acompanhado],
+    })
+
+
+def tabela_coortes(curvas: pd.DataFrame, marcos=MARCOS_DIAS) -> pd.DataFrame:
+    """
+    Uma linha por coorte: mensagens, retornos observados, dias de acompanhamento e o retorno
+    acumulado em cada marco (NaN se a coorte ainda não foi acompanhada por tantos dias).
+    """
+    grupos = curvas.groupby('coorte', sort=False)
+    tabela = pd.DataFrame({
+        'mensagens': grupos['em_risco'].first(),
+        'retornos': grupos['retornos'].sum(),
+        'dias_acompanhados': grupos['dia'].max(),
+    })
+
+    for marco in marcos:
+        ate_marco = curvas[curvas['dia'] <= marco].groupby('coorte', sort=False)['retorno_acumulado'].last()
+        tabela[f'retorno_{marco}d'] = ate_marco.where(tabela['dias_acompanhados'] >= marco)
+    return tabela.reset_index()
+
+
+def main():
+    """Mostra a tabela de coortes da análise do relatório pré-calculado"""
+    parser = argparse.ArgumentParser(description="Curvas de retorno por coorte mensal (Kaplan-Meier)")
+    parser.add_argument("--relatorio", default=RELATORIO_FILE,
+                        help="relatório pré-calculado de onde vem a análise")
+    parser.add_argument("--config", default=LOJAS_FILE,
+                        help="lojas cujas vendas marcam o fim do acompanhamento")
+    parser.add_argument("--marcos", type=int, nargs="+", default=list(MARCOS_DIAS),
+                        help="dias em que o retorno acumulado é mostrado")
+    parser.add_argument("--saida", help="grava as curvas completas (coorte x dia) em CSV")
+    args = parser.parse_args()
+
+    relatorio = carregar_relatorio(args.relatorio)
+    if relatorio is None:
+        log(f"❌ {args.relatorio} não encontrado ou inválido; gere-o com relatorio.py")
+        raise SystemExit(1)
+
+    df_analise, _ = relatorio
+    data_corte = data_corte_lojas(df_analise, ultimas_vendas_lojas(args.config))
+    curvas = curvas_retorno(df_analise, data_corte=data_corte)
+    log("Retorno acumulado por coorte:\n" + tabela_coortes(curvas, args.marcos).to_string(
+        index=False, float_format='{:.1f}'.format
+    ))
+    if args.saida:
+        curvas.to_csv(args.saida, index=False)
+        log(f"✅ Curvas gravadas em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
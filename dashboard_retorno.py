@@ -5,133 +5,772 @@ Mostra o comparativo entre mensagens enviadas e clientes que retornaram à loja
 
 import streamlit as st
 import pandas as pd
-import json
+import numpy as np
 import os
+import re
 from datetime import datetime, timedelta
 import plotly.express as px
 import plotly.graph_objects as go
+import uuid
+
+from analise_incremental import analisar_retorno_incremental
+from analise_retorno import (
+    JANELAS_ATRIBUICAO, REGRA_PADRAO, REGRAS_ATRIBUICAO, analisar_retorno, faixas_por_mes, indexar_vendas
+)
+from banco import BANCO_FILE, analisar_banco, banco_atualizado
+from compartilhado import VERSAO_TABELAS, TabelasCompartilhadas
+from coortes import (
+    COORTE_TODAS, MARCOS_DIAS, curvas_retorno, data_corte_lojas, tabela_coortes, ultimas_vendas_lojas
+)
+from exportacao import FORMATOS, exportar_relatorio
+from lojas import LOJAS_FILE, analisar_lojas, arquivos_loja, carregar_lojas, resumo_por_loja
+from normalizacao import PADRAO_PLACA, canonizar_placas, resumo_rejeitados
+from observador import ObservadorArquivos
+from perfil import Perfilador, perfil_por_ambiente
+from pontuacao import MODELO_FILE, carregar_modelo
+from relatorio import (
+    RELATORIO_FILE, VERSAO_RELATORIO, atribuicao_relatorio, calcular_agregados, carregar_relatorio, entradas_relatorio,
+    formatar_mes
+)
+from vendas import DIRETORIO_VENDAS, caminho_indice_vendas, carregar_vendas_loja
+from historico import (
+    DIRETORIO_HISTORICO, caminho_indice, carregar_envios, carregar_envios_segmentados, placas_equivalentes
+)
 
 # ==================== CONFIGURAÇÕES ====================
 HISTORICO_FILE = "historico_envios.json"
 VENDAS_FILE = "Vendas_Lubrimax.xlsx"
+TAMANHOS_PAGINA = [50, 100, 250, 500]
 
 # ==================== FUNÇÕES DE DADOS ====================
 
-@st.cache_data(ttl=300)  # Cache por 5 minutos
-def carregar_historico():
-    """Carrega o histórico de envios"""
-    if os.path.exists(HISTORICO_FILE):
-        with open(HISTORICO_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
+def usa_historico_segmentado():
+    """Indica se o histórico segmentado (historico/) já existe e deve ser usado"""
+    return caminho_indice(DIRETORIO_HISTORICO).exists()
+
+
+def usa_vendas_delta():
+    """Indica se as vendas publicadas em base + deltas (vendas/) existem e devem ser usadas"""
+    return caminho_indice_vendas(DIRETORIO_VENDAS).exists()
+
+
+def arquivos_observados():
+    """Arquivos que alimentam a página: relatório, banco, lojas.json e os arquivos de cada loja"""
+    arquivos = [RELATORIO_FILE, BANCO_FILE, MODELO_FILE, LOJAS_FILE]
+    for loja in carregar_lojas(LOJAS_FILE):
+        arquivos += arquivos_loja(loja)
+    return arquivos
+
+
+def carregar_loja_unica():
+    """
+    Histórico, vendas e vendas indexadas (datas, valores e placas canônicas) da loja única.
+    Histórico ou vendas vazios se o arquivo não existir.
+    """
+    if usa_historico_segmentado():
+        historico = carregar_envios_segmentados(DIRETORIO_HISTORICO)
+    else:
+        historico = carregar_envios(HISTORICO_FILE)
+    
+    if usa_vendas_delta():
+        df_vendas = carregar_vendas_loja(DIRETORIO_VENDAS)
+    elif os.path.exists(VENDAS_FILE):
+        df_vendas = carregar_vendas_loja(VENDAS_FILE)
+    else:
+        df_vendas = pd.DataFrame()
+    
+    indice = indexar_vendas(df_vendas) if not df_vendas.empty else None
+    return {'historico': historico, 'df_vendas': df_vendas, 'indice': indice}
+
+
+def chave_analise(versao, origem, janela_dias=None, regra=REGRA_PADRAO):
+    """
+    Chave da análise nas tabelas compartilhadas: versão dos arquivos, origem do cálculo
+    ('relatorio', 'banco', 'lojas' ou 'loja_unica') e atribuição (janela None = padrão)
+    """
+    return (versao, origem, janela_dias, regra)
+
+
+def construir_dados(versao, tabelas: TabelasCompartilhadas):
+    """
+    Análise e agregados da atribuição padrão para a versão atual dos arquivos.
+    Roda na thread do observador, por isso não chama o Streamlit: avisos vão em `aviso`.
+    Usa o relatório pré-calculado quando ele corresponde às entradas; senão consulta o banco
+    local (se gerado dos mesmos arquivos) ou analisa as lojas de lojas.json ou a loja única
+    (cujos dados ficam guardados para as outras atribuições). A análise é publicada nas
+    tabelas compartilhadas: outro processo com os mesmos arquivos reaproveita o resultado.
+    A chave da análise inclui a origem, para que relatório, banco e análise ao vivo (que podem
+    divergir) nunca troquem de lugar.
+    """
+    dados = {'df_analise': None, 'agregados': None, 'loja_unica': None, 'banco': False, 'aviso': None}
+    dados['modelo'] = carregar_modelo(MODELO_FILE)
+    dados['ultimas_vendas'] = ultimas_vendas_lojas(LOJAS_FILE)
+
+    entradas = entradas_relatorio(LOJAS_FILE, '.')
+    relatorio = carregar_relatorio(RELATORIO_FILE, entradas, atribuicao_relatorio())
+    if relatorio is not None:
+        df_relatorio, dados['agregados'] = relatorio
+        dados['df_analise'] = tabelas.obter('analise', chave_analise(versao, 'relatorio'), lambda: df_relatorio)
+        dados['banco'] = banco_atualizado(BANCO_FILE, entradas)
+        return dados
+    
+    if banco_atualizado(BANCO_FILE, entradas):
+        dados['banco'] = True
+        dados['df_analise'] = tabelas.obter('analise', chave_analise(versao, 'banco'), lambda: analisar_banco(
+            BANCO_FILE
+        ))
+        return dados
+    
+    if os.path.exists(LOJAS_FILE):
+        dados['df_analise'] = tabelas.obter('analise', chave_analise(versao, 'lojas'), lambda: analisar_lojas(
+            carregar_lojas(LOJAS_FILE)
+        ))
+        return dados
+    
+    loja_unica = tabelas.obter('loja_unica', versao, carregar_loja_unica, max_entradas=1)
+    if loja_unica['historico'].empty:
+        dados['aviso'] = "⚠️ Nenhum histórico de envios encontrado. Execute a automação primeiro."
+    elif loja_unica['df_vendas'].empty:
+        dados['aviso'] = "⚠️ Não foi possível carregar o arquivo de vendas."
+    else:
+        dados['loja_unica'] = loja_unica
+        chave = chave_analise(versao, 'loja_unica')
+        dados['df_analise'] = tabelas.obter('analise', chave, lambda: analisar_retorno_incremental(
+            loja_unica['historico'], loja_unica['df_vendas'], indice=loja_unica['indice']
+        ))
+    return dados
+
+
+@st.cache_resource
+def tabelas_compartilhadas():
+    """
+    Cargas únicas do processo: a primeira sessão que pede uma análise a calcula, as que chegam
+    durante o cálculo esperam o mesmo resultado, e todas recebem o mesmo DataFrame somente
+    leitura (mapeado de um arquivo Arrow, também visível aos outros processos). Os arquivos
+    levam a versão do código e do relatório: uma atualização do código não reaproveita os antigos.
+    """
+    return TabelasCompartilhadas(versao=(VERSAO_TABELAS, VERSAO_RELATORIO))
+
+
+@st.cache_resource(show_spinner="Carregando os dados...")
+def observador_dados():
+    """
+    Observador único do processo: recarrega e analisa os dados em segundo plano sempre que
+    um arquivo de entrada muda e troca o conjunto pronto de uma vez, para todas as sessões.
+    """
+    tabelas = tabelas_compartilhadas()
+    return ObservadorArquivos(arquivos_observados, lambda versao: construir_dados(versao, tabelas)).iniciar()
+
+
+def dados_loja_unica(versao):
+    """
+    Histórico e vendas indexadas da loja única para as atribuições fora do padrão, quando a
+    versão atual veio do relatório pré-calculado (sem os dados brutos).
+    """
+    with st.spinner("Carregando histórico e vendas..."):
+        return tabelas_compartilhadas().obter('loja_unica', versao, carregar_loja_unica, max_entradas=1)
+
+
+def calcular_analise(versao, janela_dias, regra, loja_unica):
+    """
+    Análise de retorno com janela ou regra de atribuição fora do padrão, calculada uma vez
+    por versão dos arquivos e atribuição; reaproveita as vendas já indexadas.
+    O DataFrame é compartilhado entre as sessões e não deve ser alterado.
+    """
+    with st.spinner("Analisando retornos..."):
+        chave = chave_analise(versao, 'loja_unica', janela_dias, regra)
+        return tabelas_compartilhadas().obter('analise', chave, lambda: analisar_retorno(
+            loja_unica['historico'], loja_unica['df_vendas'], indice=loja_unica['indice'],
+            janela_dias=janela_dias, regra=regra
+        ))
+
+
+def limpar_caches():
+    """
+    Descarta análises (inclusive as publicadas para outros processos) e figuras em cache
+    e pede ao observador que releia os arquivos
+    """
+    tabelas_compartilhadas().limpar(apagar_arquivos=True)
+    preparar_tabela.clear()
+    gerar_exportacao.clear()
+    agregados_pagina.clear()
+    montar_graficos.clear()
+    montar_coortes.clear()
+    montar_previsao.clear()
+    mensagens_placa.clear()
+    observador_dados().solicitar(forcar=True)
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def preparar_tabela(versao, loja, _df_analise):
+    """
+    Análise ordenada por mês, faixa de linhas de cada mês e índice de busca (nome e placa
+    em minúsculas), memorizados pela versão dos dados e pela loja selecionada.
+    Compartilhados entre as sessões: não devem ser alterados.
+    """
+    df_por_mes, faixas = faixas_por_mes(_df_analise)
+    busca = (
+        df_por_mes['nome'].fillna('').astype(str).str.lower() + '\n'
+        + df_por_mes['placa'].fillna('').astype(str).str.lower()
+    )
+    return df_por_mes, faixas, busca
+
+
+def filtrar_clientes(tabela, filtro_mes, filtro_status, busca_nome):
+    """Posições (em ordem) das linhas da análise ordenada por mês que passam nos filtros"""
+    df_por_mes, faixas, busca = tabela
+    inicio, fim = faixas[filtro_mes] if filtro_mes != "Todos" else (0, len(df_por_mes))
+    posicoes = np.arange(inicio, fim)
+    
+    if filtro_status != "Todos":
+        retornou = df_por_mes['retornou'].to_numpy()[inicio:fim]
+        posicoes = posicoes[retornou if filtro_status == "Retornou" else ~retornou]
+    
+    if busca_nome:
+        encontrados = busca.iloc[posicoes].str.contains(busca_nome.lower(), regex=False)
+        posicoes = posicoes[encontrados.to_numpy(dtype=bool)]
+    
+    return posicoes
+
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def gerar_exportacao(versao, loja, filtro_mes, filtro_status, busca_nome, formato, _df_filtrado):
+    """
+    Relatório exportado, memorizado pelo estado dos filtros e pelo formato:
+    downloads repetidos com os mesmos filtros não refazem o arquivo.
+    """
+    return exportar_relatorio(_df_filtrado, formato)
+
+
+def placa_buscada(busca_nome):
+    """Placa canônica digitada na busca (None se o texto não for uma placa inteira)"""
+    placa = canonizar_placas(pd.Series([busca_nome], dtype=object)).iloc[0]
+    return placa if re.fullmatch(PADRAO_PLACA, placa) else None
+
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def mensagens_placa(versao, placa, filtro_mes):
+    """
+    Mensagens enviadas para a placa (nas formas antiga e Mercosul) no mês filtrado, lidas do
+    histórico segmentado só nos meses em que o índice registra a placa.
+    """
+    meses = None if filtro_mes == "Todos" else [filtro_mes]
+    envios = carregar_envios_segmentados(DIRETORIO_HISTORICO, meses=meses, placas=placas_equivalentes(placa))
+    envios = envios.sort_values('data_envio', ascending=False)
+    envios['data_envio'] = envios['data_envio'].dt.strftime('%d/%m/%Y %H:%M')
+    envios.columns = ['Mês', 'Placa', 'Cliente', 'Telefone', 'Data Envio']
+    return envios
+
+
+def formatar_pagina(df_pagina):
+    """Formata só as linhas da página exibida"""
+    df_exibir = df_pagina[[
+        'nome', 'placa', 'telefone', 'data_envio', 'retornou', 
+        'qtd_retornos', 'valor_gerado', 'dias_ate_retorno'
+    ]].copy()
+    
+    df_exibir.columns = [
+        'Cliente', 'Placa', 'Telefone', 'Data Envio', 'Retornou?',
+        'Qtd. Visitas', 'Valor Gerado (R$)', 'Dias até Retorno'
+    ]
+    
+    df_exibir['Retornou?'] = np.where(df_exibir['Retornou?'], '✅ Sim', '❌ Não')
+    df_exibir['Data Envio'] = pd.to_datetime(df_exibir['Data Envio']).dt.strftime('%d/%m/%Y %H:%M')
+    df_exibir['Valor Gerado (R$)'] = [f"R$ {x:,.2f}" for x in df_exibir['Valor Gerado (R$)']]
+    return df_exibir
+
+
+def analise_loja_unica(perfil: Perfilador, versao, dados: dict, janela_dias, regra):
+    """Análise da loja única na atribuição escolhida (None se faltar algum arquivo)"""
+    perfil.etapa('carregar_dados')
+    loja_unica = dados['loja_unica'] or dados_loja_unica(versao)
+    
+    if loja_unica['historico'].empty:
+        st.warning("⚠️ Nenhum histórico de envios encontrado. Execute a automação primeiro.")
+        return None
+    
+    if loja_unica['df_vendas'].empty:
+        st.warning("⚠️ Não foi possível carregar o arquivo de vendas.")
+        return None
+    
+    # Análise de retorno (memorizada por versão dos arquivos e atribuição)
+    perfil.etapa('analisar_retorno')
+    return calcular_analise(versao, janela_dias, regra, loja_unica)
+
+
+def calcular_analise_banco(versao, janela_dias, regra):
+    """
+    Análise com janela ou regra fora do padrão: a atribuição é consultada no banco local
+    (sem carregar vendas e histórico) e o resultado, uma linha por mensagem, vem inteiro para
+    a memória. Calculada uma vez por versão dos arquivos e atribuição.
+    """
+    with st.spinner("Consultando o banco..."):
+        return tabelas_compartilhadas().obter(
+            'analise', chave_analise(versao, 'banco', janela_dias, regra),
+            lambda: analisar_banco(BANCO_FILE, janela_dias, regra)
+        )
 
 
-@st.cache_data(ttl=300)
-def carregar_vendas():
-    """Carrega as vendas do Excel"""
+def calcular_analise_lojas(versao, janela_dias, regra):
+    """
+    Análise consolidada das lojas de lojas.json com janela ou regra fora do padrão,
+    calculada uma vez por versão de todos os arquivos e atribuição.
+    Cada loja é analisada em um processo separado.
+    """
+    with st.spinner("Analisando as lojas..."):
+        chave = chave_analise(versao, 'lojas', janela_dias, regra)
+        return tabelas_compartilhadas().obter('analise', chave, lambda: analisar_lojas(
+            carregar_lojas(LOJAS_FILE), janela_dias=janela_dias, regra=regra
+        ))
+
+
+def analise_varias_lojas(perfil: Perfilador, versao, janela_dias, regra):
+    """Análise consolidada de todas as lojas (coluna `loja` identifica a origem)"""
+    perfil.etapa('analisar_lojas')
     try:
-        df = pd.read_excel(VENDAS_FILE, sheet_name="Sheet1")
-        return df
+        return calcular_analise_lojas(versao, janela_dias, regra)
     except Exception as e:
-        st.error(f"Erro ao carregar vendas: {e}")
-        return pd.DataFrame()
+        st.error(f"Erro ao analisar as lojas: {e}")
+        return None
 
 
-def parse_valor(valor):
-    """Converte string de valor (ex: '1654,3') para float"""
-    try:
-        if isinstance(valor, (int, float)):
-            return float(valor)
-        if isinstance(valor, str):
-            # Remove R$ e espacos, substitui virgula por ponto
-            valor_limpo = valor.replace('R$', '').strip().replace(',', '.')
-            if not valor_limpo:
-                return 0.0
-            return float(valor_limpo)
-    except:
-        pass
-    return 0.0
-
-
-def parse_data_emissao(emissao):
-    """Converte data de emissão para datetime"""
-    try:
-        if pd.isna(emissao):
-            return None
-        if isinstance(emissao, str):
-            parts = emissao.split('/')
-            if len(parts) == 3:
-                day, month, year = int(parts[0]), int(parts[1]), int(parts[2])
-                return datetime(year, month, day)
-        elif isinstance(emissao, datetime):
-            return emissao
-    except:
-        pass
-    return None
-
-
-def analisar_retorno(historico: dict, df_vendas: pd.DataFrame) -> pd.DataFrame:
-    """
-    Analisa quais clientes que receberam mensagem voltaram à loja.
-    Considera retorno se houve venda após a data de envio da mensagem.
-    """
-    resultados = []
-    
-    for mes_ano, envios in historico.items():
-        for placa, dados in envios.items():
-            # Data de envio da mensagem
-            data_envio_str = dados.get('data_envio', '')
-            try:
-                data_envio = datetime.strptime(data_envio_str, "%Y-%m-%d %H:%M:%S")
-            except:
-                continue
-            
-            # Busca vendas desta placa após a data de envio
-            vendas_placa = df_vendas[
-                df_vendas['IDENTIFICAÇÃO'].astype(str).str.upper().str.contains(placa, na=False) |
-                df_vendas['OBSERVAÇÃO'].astype(str).str.upper().str.contains(placa, na=False)
-            ].copy()
-            
-            # Filtra vendas após o envio da mensagem
-            vendas_apos = []
-            valor_total = 0
-            
-            for _, venda in vendas_placa.iterrows():
-                data_venda = parse_data_emissao(venda.get('EMISSÃO'))
-                if data_venda and data_venda > data_envio:
-                    valor_venda = parse_valor(venda.get('TOTAL VENDA', 0))
-                    vendas_apos.append({
-                        'data': data_venda,
-                        'valor': valor_venda,
-                        'cliente': venda.get('CLIENTE', '')
-                    })
-                    valor_total += valor_venda
-            
-            retornou = len(vendas_apos) > 0
-            dias_ate_retorno = None
-            
-            if retornou:
-                primeira_venda = min(v['data'] for v in vendas_apos)
-                dias_ate_retorno = (primeira_venda - data_envio).days
-            
-            resultados.append({
-                'mes_referencia': mes_ano,
-                'placa': placa,
-                'nome': dados.get('nome', ''),
-                'telefone': dados.get('fone', ''),
-                'data_envio': data_envio,
-                'retornou': retornou,
-                'qtd_retornos': len(vendas_apos),
-                'valor_gerado': valor_total,
-                'dias_ate_retorno': dias_ate_retorno
-            })
-    
-    return pd.DataFrame(resultados)
+def dados_atuais(perfil: Perfilador):
+    """
+    Último conjunto de dados pronto do observador, como (versao, dados); None se a carga
+    inicial falhou. Se os arquivos mudaram, avisa que a releitura está em andamento.
+    """
+    perfil.etapa('dados')
+    observador = observador_dados()
+    atual = observador.dados()
+    
+    if atual is None:
+        st.error(f"Erro ao carregar os dados: {observador.ultimo_erro}")
+        return None
+    
+    if observador.reconstruindo or observador.desatualizado():
+        observador.solicitar()
+        st.sidebar.caption("🔄 Arquivos atualizados: recarregando em segundo plano...")
+    elif observador.ultimo_erro is not None:
+        st.sidebar.caption(f"⚠️ Falha ao recarregar (dados anteriores mantidos): {observador.ultimo_erro}")
+    return atual
+
+
+def exibir_resumo_lojas(df_analise: pd.DataFrame):
+    """Tabela com o desempenho de cada loja na visão consolidada"""
+    st.markdown("---")
+    st.subheader("🏪 Desempenho por Loja")
+    
+    df_lojas = resumo_por_loja(df_analise)
+    df_lojas = df_lojas[['loja', 'mensagens', 'retornos', 'taxa_retorno', 'valor_gerado', 'media_dias']]
+    df_lojas.columns = ['Loja', 'Mensagens', 'Retornos', 'Taxa de Retorno', 'Valor Gerado (R$)', 'Média Dias p/ Retorno']
+    df_lojas['Taxa de Retorno'] = df_lojas['Taxa de Retorno'].map(lambda x: f"{x:.1f}%")
+    df_lojas['Valor Gerado (R$)'] = df_lojas['Valor Gerado (R$)'].map(lambda x: f"R$ {x:,.2f}")
+    df_lojas['Média Dias p/ Retorno'] = df_lojas['Média Dias p/ Retorno'].map(
+        lambda x: f"{x:.0f}" if pd.notna(x) else "N/A"
+    )
+    
+    st.dataframe(df_lojas, width='stretch', hide_index=True)
+
+
+# ==================== GRÁFICOS ====================
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def agregados_pagina(versao, loja, _df_analise):
+    """
+    Métricas e agregados dos gráficos, calculados uma vez por versão dos dados e loja
+    (quando não vêm prontos do relatório pré-calculado).
+    """
+    return calcular_agregados(_df_analise)
+
+
+def figura_pizza(metricas):
+    """Rosca de retornos vs não retornos"""
+    total_enviados = metricas['total_enviados']
+    total_retornos = metricas['total_retornos']
+    
+    df_pizza = pd.DataFrame({
+        'Status': ['Retornou ✅', 'Não Retornou ❌'],
+        'Quantidade': [total_retornos, total_enviados - total_retornos]
+    })
+    
+    fig_pizza = px.pie(
+        df_pizza, 
+        values='Quantidade', 
+        names='Status',
+        color='Status',
+        color_discrete_map={'Retornou ✅': '#00b894', 'Não Retornou ❌': '#e17055'},
+        hole=0.5
+    )
+    fig_pizza.update_traces(
+        textposition='inside', 
+        textinfo='percent+value',
+        textfont_size=14,
+        textfont_color='white',
+        marker=dict(
+            line=dict(color='#2d3436', width=3)
+        ),
+        pull=[0.05, 0]
+    )
+    fig_pizza.update_layout(
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white', size=12),
+        legend=dict(
+            bgcolor='rgba(45,52,54,0.8)',
+            bordercolor='#4a4a4a',
+            borderwidth=1,
+            font=dict(color='white')
+        ),
+        margin=dict(t=30, b=30, l=30, r=30),
+        annotations=[dict(
+            text=f'<b>{total_retornos}</b><br>Retornos',
+            x=0.5, y=0.5,
+            font_size=16,
+            font_color='#00b894',
+            showarrow=False
+        )]
+    )
+    return fig_pizza
+
+
+def figura_barras(por_mes):
+    """Barras de valor gerado por mês (None sem meses)"""
+    if not por_mes['mes']:
+        return None
+    
+    df_valor_mes = pd.DataFrame(por_mes)
+    df_valor_mes.columns = ['Mês', 'Mês_Formatado', 'Valor Gerado', 'Retornos']
+    
+    fig_barras = go.Figure()
+    
+    fig_barras.add_trace(go.Bar(
+        x=df_valor_mes['Mês_Formatado'],
+        y=df_valor_mes['Valor Gerado'],
+        text=[f'R$ {v:,.0f}' for v in df_valor_mes['Valor Gerado']],
+        textposition='outside',
+        textfont=dict(color='#00b894', size=14, family='Arial Black'),
+        marker=dict(
+            color=['#0077b6', '#00b4d8', '#00b894', '#48cae4', '#90e0ef'][:len(df_valor_mes)],
+            line=dict(color='#2d3436', width=2)
+        ),
+        hovertemplate='<b>%{x}</b><br>Valor: R$ %{y:,.2f}<br>Retornos: %{customdata}<extra></extra>',
+        customdata=df_valor_mes['Retornos']
+    ))
+    
+    fig_barras.update_layout(
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white', size=12),
+        xaxis=dict(
+            title=dict(text='Mês de Referência', font=dict(color='#a8dadc')),
+            tickfont=dict(color='white', size=14),
+            gridcolor='rgba(255,255,255,0.1)',
+            showgrid=False,
+            type='category'  # Força como categoria/texto
+        ),
+        yaxis=dict(
+            title=dict(text='Valor Gerado (R$)', font=dict(color='#a8dadc')),
+            tickfont=dict(color='white'),
+            gridcolor='rgba(255,255,255,0.1)',
+            tickformat=',.0f'
+        ),
+        margin=dict(t=50, b=50, l=70, r=30),
+        showlegend=False
+    )
+    return fig_barras
+
+
+def figura_histograma(histograma, media):
+    """Histograma de dias até o retorno, a partir das faixas já contadas (None sem retornos)"""
+    histograma = pd.DataFrame(histograma)
+    if histograma.empty:
+        return None
+    
+    fig_hist = go.Figure()
+    
+    # Faixas já contadas no relatório: cada barra cobre [inicio, fim) dias
+    fig_hist.add_trace(go.Bar(
+        x=(histograma['inicio'] + histograma['fim']) / 2,
+        y=histograma['clientes'],
+        width=(histograma['fim'] - histograma['inicio']) * 0.9,
+        customdata=pd.concat([histograma['inicio'], histograma['fim'] - 1], axis=1),
+        marker=dict(
+            color='rgba(0, 180, 216, 0.7)',
+            line=dict(color='#00b4d8', width=2)
+        ),
+        hovertemplate='<b>%{customdata[0]} a %{customdata[1]} dias</b><br>Clientes: %{y}<extra></extra>'
+    ))
+    
+    # Adiciona linha de média
+    fig_hist.add_vline(
+        x=media, 
+        line_dash="dash", 
+        line_color="#e17055",
+        annotation_text=f"Média: {media:.0f} dias",
+        annotation_position="top",
+        annotation_font_color="#e17055"
+    )
+    
+    fig_hist.update_layout(
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white', size=12),
+        xaxis=dict(
+            title=dict(text='Dias após receber a mensagem', font=dict(color='#a8dadc', size=14)),
+            tickfont=dict(color='white'),
+            gridcolor='rgba(255,255,255,0.1)',
+            zeroline=False
+        ),
+        yaxis=dict(
+            title=dict(text='Quantidade de clientes', font=dict(color='#a8dadc', size=14)),
+            tickfont=dict(color='white'),
+            gridcolor='rgba(255,255,255,0.1)',
+            zeroline=False
+        ),
+        bargap=0.1,
+        margin=dict(t=50, b=50, l=50, r=30)
+    )
+    return fig_hist
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def montar_graficos(versao, loja, _agregados):
+    """
+    Figuras Plotly da página, montadas uma vez por versão dos dados e loja.
+    O histograma usa só as faixas contadas, então o tamanho da figura não cresce com o
+    número de clientes. Compartilhadas entre as sessões: não devem ser alteradas.
+    """
+    return {
+        'pizza': figura_pizza(_agregados['metricas']),
+        'barras': figura_barras(_agregados['por_mes']),
+        'histograma': figura_histograma(_agregados['histograma'], _agregados['metricas']['media_dias_retorno']),
+    }
+
+
+def figura_coortes(curvas):
+    """Retorno acumulado (Kaplan-Meier) por dia após o envio, uma linha por coorte (None sem dados)"""
+    if curvas.empty:
+        return None
+    
+    fig_coortes = go.Figure()
+    
+    for coorte, curva in curvas.groupby('coorte', sort=False):
+        todas = coorte == COORTE_TODAS
+        fig_coortes.add_trace(go.Scatter(
+            x=curva['dia'],
+            y=curva['retorno_acumulado'],
+            name=formatar_mes(coorte),
+            mode='lines',
+            line=dict(shape='hv', width=4 if todas else 2, dash='dash' if todas else 'solid'),
+            customdata=curva['em_risco'],
+            hovertemplate=(
+                f'<b>{formatar_mes(coorte)}</b><br>Dia %{{x}}: %{{y:.1f}}% retornaram'
+                '<br>Em acompanhamento: %{customdata:,}<extra></extra>'
+            )
+        ))
+    
+    fig_coortes.update_layout(
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white', size=12),
+        xaxis=dict(
+            title=dict(text='Dias após receber a mensagem', font=dict(color='#a8dadc', size=14)),
+            tickfont=dict(color='white'),
+            gridcolor='rgba(255,255,255,0.1)',
+            zeroline=False
+        ),
+        yaxis=dict(
+            title=dict(text='Retorno acumulado (%)', font=dict(color='#a8dadc', size=14)),
+            tickfont=dict(color='white'),
+            gridcolor='rgba(255,255,255,0.1)',
+            ticksuffix='%',
+            rangemode='tozero'
+        ),
+        legend=dict(
+            bgcolor='rgba(45,52,54,0.8)',
+            bordercolor='#4a4a4a',
+            borderwidth=1,
+            font=dict(color='white')
+        ),
+        margin=dict(t=50, b=50, l=70, r=30)
+    )
+    return fig_coortes
+
+
+def formatar_tabela_coortes(tabela):
+    """Tabela de coortes com meses e porcentagens formatados para exibição"""
+    df_exibir = tabela.copy()
+    df_exibir['coorte'] = df_exibir['coorte'].map(formatar_mes)
+    colunas_marcos = [f'retorno_{marco}d' for marco in MARCOS_DIAS]
+    for coluna in colunas_marcos:
+        df_exibir[coluna] = df_exibir[coluna].map(lambda x: f"{x:.1f}%" if pd.notna(x) else "—")
+    df_exibir.columns = (
+        ['Coorte', 'Mensagens', 'Retornos', 'Dias Acompanhados']
+        + [f'Retorno em {marco} dias' for marco in MARCOS_DIAS]
+    )
+    return df_exibir
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def montar_coortes(versao, loja, horizonte, _df_analise, _ultimas_vendas):
+    """
+    Curvas de retorno por coorte e tabela de marcos, calculadas uma vez por versão dos
+    dados e loja. Mensagens sem retorno são acompanhadas até a última venda registrada da
+    sua loja. Compartilhadas entre as sessões: não devem ser alteradas.
+    """
+    data_corte = data_corte_lojas(_df_analise, _ultimas_vendas)
+    curvas = curvas_retorno(_df_analise, data_corte=data_corte, horizonte=horizonte)
+    if curvas.empty:
+        return None, None
+    return figura_coortes(curvas), formatar_tabela_coortes(tabela_coortes(curvas))
+
+
+AMOSTRAS_PREVISAO = {
+    'treino': 'Treino (dentro da amostra)',
+    'validacao': '✅ Validação (fora do tempo)',
+    'acompanhamento': 'Fora do treino',
+}
+
+
+def figura_previsao(por_mes):
+    """
+    Taxa de retorno real (barras) e prevista pelo modelo (linha) por mês de envio; nos meses de
+    treino o marcador é vazado (previsto dentro da amostra)
+    """
+    meses = [formatar_mes(mes) for mes in por_mes['mes']]
+    completo = por_mes['completo']
+    treino = por_mes['amostra'] == 'treino'
+    
+    fig_previsao = go.Figure()
+    fig_previsao.add_trace(go.Bar(
+        x=meses,
+        y=por_mes['taxa_real'],
+        name='Real',
+        marker=dict(
+            color=np.where(completo, '#00b894', 'rgba(0,184,148,0.35)'),
+            line=dict(color='#2d3436', width=2)
+        ),
+        customdata=np.where(completo, 'completo', 'em acompanhamento'),
+        hovertemplate='<b>%{x}</b><br>Real: %{y:.1f}% (%{customdata})<extra></extra>'
+    ))
+    fig_previsao.add_trace(go.Scatter(
+        x=meses,
+        y=por_mes['taxa_prevista'],
+        name='Previsto',
+        mode='lines+markers',
+        line=dict(color='#fdcb6e', width=3),
+        marker=dict(size=9, symbol=np.where(treino, 'circle-open', 'circle')),
+        customdata=por_mes['amostra'].map(AMOSTRAS_PREVISAO),
+        hovertemplate='<b>%{x}</b><br>Previsto: %{y:.1f}% (%{customdata})<extra></extra>'
+    ))
+    
+    fig_previsao.update_layout(
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white', size=12),
+        xaxis=dict(
+            title=dict(text='Mês de envio', font=dict(color='#a8dadc', size=14)),
+            tickfont=dict(color='white'),
+            gridcolor='rgba(255,255,255,0.1)'
+        ),
+        yaxis=dict(
+            title=dict(text='Taxa de retorno (%)', font=dict(color='#a8dadc', size=14)),
+            tickfont=dict(color='white'),
+            gridcolor='rgba(255,255,255,0.1)',
+            ticksuffix='%',
+            rangemode='tozero'
+        ),
+        legend=dict(
+            bgcolor='rgba(45,52,54,0.8)',
+            bordercolor='#4a4a4a',
+            borderwidth=1,
+            font=dict(color='white')
+        ),
+        margin=dict(t=50, b=50, l=70, r=30)
+    )
+    return fig_previsao
+
+
+def formatar_tabela_previsao(por_mes):
+    """Previsto x real por mês formatado para exibição"""
+    df_exibir = por_mes[[
+        'mes', 'amostra', 'mensagens', 'taxa_prevista', 'taxa_real', 'valor_previsto', 'valor_real', 'completo'
+    ]].copy()
+    df_exibir['amostra'] = df_exibir['amostra'].map(AMOSTRAS_PREVISAO)
+    df_exibir['mes'] = df_exibir['mes'].map(formatar_mes)
+    for coluna in ['taxa_prevista', 'taxa_real']:
+        df_exibir[coluna] = df_exibir[coluna].map(lambda x: f"{x:.1f}%")
+    for coluna in ['valor_previsto', 'valor_real']:
+        df_exibir[coluna] = df_exibir[coluna].map(lambda x: f"R$ {x:,.2f}")
+    df_exibir['completo'] = np.where(df_exibir['completo'], 'Completo', '⏳ Em acompanhamento')
+    df_exibir.columns = [
+        'Mês', 'Amostra', 'Mensagens', 'Retorno Previsto', 'Retorno Real', 'Valor Previsto (R$)',
+        'Valor Real (R$)', 'Acompanhamento'
+    ]
+    return df_exibir
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def montar_previsao(versao, _modelo):
+    """Figura e tabela do previsto x real, uma vez por versão do modelo gravado"""
+    por_mes = pd.DataFrame(_modelo['por_mes'])
+    return figura_previsao(por_mes), formatar_tabela_previsao(por_mes)
+
+
+# ==================== PERFIL DE EXECUÇÃO ====================
+
+def perfil_ativo():
+    """Perfil ligado por LUBRIMAX_PERFIL=1 ou pelo parâmetro ?perfil=1 na URL"""
+    return perfil_por_ambiente() or st.query_params.get("perfil") == "1"
+
+
+def id_sessao():
+    """Identificador da sessão do navegador, para agrupar os registros de perfil"""
+    if 'id_sessao' not in st.session_state:
+        st.session_state['id_sessao'] = uuid.uuid4().hex[:12]
+    return st.session_state['id_sessao']
+
+
+def exibir_perfil(registro: dict):
+    """Mostra o tempo e a memória de cada etapa da requisição em uma seção recolhível"""
+    with st.expander(f"⏱️ Perfil da requisição ({registro['total_ms']:,.0f} ms)"):
+        df_perfil = pd.DataFrame(registro['etapas'])
+        df_perfil.columns = ['Etapa', 'Tempo (ms)', 'Pico de memória (MB)', 'Memória retida (MB)']
+        st.dataframe(df_perfil, width='stretch', hide_index=True)
+        st.caption(f"Requisição {registro['requisicao']} · sessão {registro['sessao']}")
+        exibir_metricas_compartilhadas()
+
+
+def exibir_metricas_compartilhadas():
+    """Acertos, cargas e esperas das cargas únicas do processo e recargas do observador"""
+    metricas = tabelas_compartilhadas().metricas()
+    if metricas['por_nome']:
+        df_metricas = pd.DataFrame.from_dict(metricas['por_nome'], orient='index')
+        df_metricas = df_metricas[['entradas', 'acertos', 'cargas', 'esperas', 'falhas', 'max_simultaneas', 'tempo_carga_s']]
+        df_metricas.columns = ['Em memória', 'Acertos', 'Cargas', 'Esperas', 'Falhas', 'Cargas simultâneas', 'Tempo de carga (s)']
+        st.dataframe(df_metricas, width='stretch')
+    st.caption(
+        f"Dados compartilhados: {metricas['acertos']:,} acerto(s), {metricas['cargas']:,} carga(s), "
+        f"{metricas['esperas']:,} espera(s) por carga em andamento · tabelas Arrow publicadas: "
+        f"{metricas['publicadas']:,}, reaproveitadas de outro processo: {metricas['reaproveitadas']:,} · "
+        f"recargas do observador: {observador_dados().reconstrucoes:,}"
+    )
 
 
 # ==================== INTERFACE STREAMLIT ====================
 
 def main():
+    perfil = Perfilador(perfil_ativo(), sessao=id_sessao())
+    try:
+        exibir_dashboard(perfil)
+    finally:
+        registro = perfil.finalizar()
+    
+    if registro:
+        exibir_perfil(registro)
+
+
+def exibir_dashboard(perfil: Perfilador):
     st.set_page_config(
         page_title="Lubrimax - Dashboard de Retorno",
         page_icon="🚗",
@@ -175,36 +814,88 @@ def main():
     st.title("🚗 Lubrimax - Dashboard de Retorno")
     st.markdown("### 📊 Análise de efetividade das mensagens de lembrete de troca de óleo")
     
-    # Carrega dados
-    historico = carregar_historico()
-    df_vendas = carregar_vendas()
+    if st.sidebar.button("🔄 Recarregar dados"):
+        limpar_caches()
     
-    if not historico:
-        st.warning("⚠️ Nenhum histórico de envios encontrado. Execute a automação primeiro.")
+    # Atribuição das vendas às mensagens (o padrão conta a venda para toda mensagem anterior)
+    janela_dias = st.sidebar.selectbox(
+        "⏳ Janela de atribuição",
+        options=JANELAS_ATRIBUICAO,
+        format_func=lambda dias: "Sem limite" if dias is None else f"{dias} dias"
+    )
+    regra = st.sidebar.selectbox(
+        "🎯 Regra de atribuição",
+        options=list(REGRAS_ATRIBUICAO),
+        format_func=REGRAS_ATRIBUICAO.get,
+        help="Com último ou primeiro toque, cada venda conta para uma única mensagem da placa"
+    )
+    
+    # Dados da atribuição padrão prontos em segundo plano; as demais são calculadas sob demanda
+    atual = dados_atuais(perfil)
+    if atual is None:
         return
+    versao_base, dados = atual
     
-    if df_vendas.empty:
-        st.warning("⚠️ Não foi possível carregar o arquivo de vendas.")
+    if dados['aviso']:
+        st.warning(dados['aviso'])
         return
     
-    # Análise de retorno
-    df_analise = analisar_retorno(historico, df_vendas)
+    agregados = None
+    if janela_dias is None and regra == REGRA_PADRAO:
+        df_analise, agregados = dados['df_analise'], dados['agregados']
+    elif dados['banco']:
+        perfil.etapa('consultar_banco')
+        df_analise = calcular_analise_banco(versao_base, janela_dias, regra)
+    elif os.path.exists(LOJAS_FILE):
+        df_analise = analise_varias_lojas(perfil, versao_base, janela_dias, regra)
+    else:
+        df_analise = analise_loja_unica(perfil, versao_base, dados, janela_dias, regra)
+    
+    # Normalização das colunas de vendas (feita uma vez por versão da planilha)
+    if dados['loja_unica'] is not None:
+        rejeitados = resumo_rejeitados(dados['loja_unica']['indice']['rejeitados'])
+        if rejeitados:
+            st.sidebar.caption(f"ℹ️ Normalização das vendas: {rejeitados}")
+    
+    if df_analise is None:
+        return
     
     if df_analise.empty:
         st.warning("⚠️ Nenhum dado para análise.")
         return
     
+    filtro_loja = None
+    if 'loja' in df_analise.columns and df_analise['loja'].nunique() > 1:
+        lojas_disponiveis = ["Todas"] + df_analise['loja'].cat.categories.tolist()
+        filtro_loja = st.sidebar.selectbox("🏪 Loja", options=lojas_disponiveis)
+        if filtro_loja == "Todas":
+            exibir_resumo_lojas(df_analise)
+        else:
+            df_analise = df_analise[df_analise['loja'] == filtro_loja]
+            agregados = None
+    
+    # Agregados e figuras memorizados pela versão dos dados e pela loja selecionada
+    perfil.etapa('agregados')
+    versao = (versao_base, janela_dias, regra)
+    if agregados is None:
+        agregados = agregados_pagina(versao, filtro_loja, df_analise)
+    metricas = agregados['metricas']
+    graficos = montar_graficos(versao, filtro_loja, agregados)
+    
     # ==================== MÉTRICAS PRINCIPAIS ====================
+    perfil.etapa('metricas')
     st.markdown("---")
     st.subheader("📊 Métricas Principais")
     
     col1, col2, col3, col4, col5 = st.columns(5)
     
-    total_enviados = len(df_analise)
-    total_retornos = df_analise['retornou'].sum()
-    taxa_retorno = (total_retornos / total_enviados * 100) if total_enviados > 0 else 0
-    valor_total_gerado = df_analise['valor_gerado'].sum()
-    media_dias_retorno = df_analise[df_analise['retornou']]['dias_ate_retorno'].mean()
+    total_enviados = metricas['total_enviados']
+    total_retornos = metricas['total_retornos']
+    taxa_retorno = metricas['taxa_retorno']
+    valor_total_gerado = metricas['valor_total_gerado']
+    media_dias_retorno = metricas['media_dias_retorno']
+    if media_dias_retorno is None:
+        media_dias_retorno = float('nan')
     
     with col1:
         st.metric(
@@ -243,164 +934,71 @@ def main():
     col_graf1, col_graf2 = st.columns(2)
     
     with col_graf1:
+        perfil.etapa('grafico_pizza')
         st.subheader("📊 Retorno vs Não Retorno")
         
-        df_pizza = pd.DataFrame({
-            'Status': ['Retornou ✅', 'Não Retornou ❌'],
-            'Quantidade': [total_retornos, total_enviados - total_retornos]
-        })
-        
-        fig_pizza = px.pie(
-            df_pizza, 
-            values='Quantidade', 
-            names='Status',
-            color='Status',
-            color_discrete_map={'Retornou ✅': '#00b894', 'Não Retornou ❌': '#e17055'},
-            hole=0.5
-        )
-        fig_pizza.update_traces(
-            textposition='inside', 
-            textinfo='percent+value',
-            textfont_size=14,
-            textfont_color='white',
-            marker=dict(
-                line=dict(color='#2d3436', width=3)
-            ),
-            pull=[0.05, 0]
-        )
-        fig_pizza.update_layout(
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            font=dict(color='white', size=12),
-            legend=dict(
-                bgcolor='rgba(45,52,54,0.8)',
-                bordercolor='#4a4a4a',
-                borderwidth=1,
-                font=dict(color='white')
-            ),
-            margin=dict(t=30, b=30, l=30, r=30),
-            annotations=[dict(
-                text=f'<b>{total_retornos}</b><br>Retornos',
-                x=0.5, y=0.5,
-                font_size=16,
-                font_color='#00b894',
-                showarrow=False
-            )]
-        )
-        st.plotly_chart(fig_pizza, width='stretch')
+        st.plotly_chart(graficos['pizza'], width='stretch')
     
     with col_graf2:
+        perfil.etapa('grafico_barras')
         st.subheader("💰 Valor Gerado por Mês")
         
-        if 'mes_referencia' in df_analise.columns:
-            df_valor_mes = df_analise.groupby('mes_referencia').agg({
-                'valor_gerado': 'sum',
-                'retornou': 'sum'
-            }).reset_index()
-            df_valor_mes.columns = ['Mês', 'Valor Gerado', 'Retornos']
-            
-            # Formata mês para exibição amigável (2025-12 -> Dez/2025)
-            meses_pt = {
-                '01': 'Jan', '02': 'Fev', '03': 'Mar', '04': 'Abr',
-                '05': 'Mai', '06': 'Jun', '07': 'Jul', '08': 'Ago',
-                '09': 'Set', '10': 'Out', '11': 'Nov', '12': 'Dez'
-            }
-            df_valor_mes['Mês_Formatado'] = df_valor_mes['Mês'].apply(
-                lambda x: f"{meses_pt.get(x.split('-')[1], x.split('-')[1])}/{x.split('-')[0]}" if '-' in str(x) else str(x)
-            )
-            
-            fig_barras = go.Figure()
-            
-            fig_barras.add_trace(go.Bar(
-                x=df_valor_mes['Mês_Formatado'],
-                y=df_valor_mes['Valor Gerado'],
-                text=[f'R$ {v:,.0f}' for v in df_valor_mes['Valor Gerado']],
-                textposition='outside',
-                textfont=dict(color='#00b894', size=14, family='Arial Black'),
-                marker=dict(
-                    color=['#0077b6', '#00b4d8', '#00b894', '#48cae4', '#90e0ef'][:len(df_valor_mes)],
-                    line=dict(color='#2d3436', width=2)
-                ),
-                hovertemplate='<b>%{x}</b><br>Valor: R$ %{y:,.2f}<br>Retornos: %{customdata}<extra></extra>',
-                customdata=df_valor_mes['Retornos']
-            ))
-            
-            fig_barras.update_layout(
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                font=dict(color='white', size=12),
-                xaxis=dict(
-                    title=dict(text='Mês de Referência', font=dict(color='#a8dadc')),
-                    tickfont=dict(color='white', size=14),
-                    gridcolor='rgba(255,255,255,0.1)',
-                    showgrid=False,
-                    type='category'  # Força como categoria/texto
-                ),
-                yaxis=dict(
-                    title=dict(text='Valor Gerado (R$)', font=dict(color='#a8dadc')),
-                    tickfont=dict(color='white'),
-                    gridcolor='rgba(255,255,255,0.1)',
-                    tickformat=',.0f'
-                ),
-                margin=dict(t=50, b=50, l=70, r=30),
-                showlegend=False
-            )
-            st.plotly_chart(fig_barras, width='stretch')
+        if graficos['barras'] is not None:
+            st.plotly_chart(graficos['barras'], width='stretch')
     
     # ==================== DISTRIBUIÇÃO DE DIAS ATÉ RETORNO ====================
+    perfil.etapa('grafico_histograma')
     st.markdown("---")
     st.subheader("⏱️ Distribuição de Dias até o Retorno")
     
-    df_retornos = df_analise[df_analise['retornou'] == True]
-    
-    if not df_retornos.empty:
-        fig_hist = go.Figure()
-        
-        fig_hist.add_trace(go.Histogram(
-            x=df_retornos['dias_ate_retorno'],
-            nbinsx=20,
-            marker=dict(
-                color='rgba(0, 180, 216, 0.7)',
-                line=dict(color='#00b4d8', width=2)
-            ),
-            hovertemplate='<b>%{x} dias</b><br>Clientes: %{y}<extra></extra>'
-        ))
-        
-        # Adiciona linha de média
-        media = df_retornos['dias_ate_retorno'].mean()
-        fig_hist.add_vline(
-            x=media, 
-            line_dash="dash", 
-            line_color="#e17055",
-            annotation_text=f"Média: {media:.0f} dias",
-            annotation_position="top",
-            annotation_font_color="#e17055"
-        )
-        
-        fig_hist.update_layout(
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            font=dict(color='white', size=12),
-            xaxis=dict(
-                title=dict(text='Dias após receber a mensagem', font=dict(color='#a8dadc', size=14)),
-                tickfont=dict(color='white'),
-                gridcolor='rgba(255,255,255,0.1)',
-                zeroline=False
-            ),
-            yaxis=dict(
-                title=dict(text='Quantidade de clientes', font=dict(color='#a8dadc', size=14)),
-                tickfont=dict(color='white'),
-                gridcolor='rgba(255,255,255,0.1)',
-                zeroline=False
-            ),
-            bargap=0.1,
-            margin=dict(t=50, b=50, l=50, r=30)
-        )
-        st.plotly_chart(fig_hist, width='stretch')
+    if graficos['histograma'] is not None:
+        st.plotly_chart(graficos['histograma'], width='stretch')
     else:
         st.info("Ainda não há dados de retorno para exibir o histograma.")
     
+    # ==================== CURVAS DE RETORNO POR COORTE ====================
+    perfil.etapa('curvas_coorte')
+    st.markdown("---")
+    st.subheader("📉 Retorno Acumulado por Coorte")
+    st.caption(
+        "Porcentagem de cada mês de envio que já voltou até o dia N (Kaplan-Meier). "
+        "Mensagens sem retorno só contam até a última venda registrada da loja, então a curva "
+        "de cada mês termina no último dia acompanhado."
+    )
+    
+    fig_coortes, df_coortes = montar_coortes(versao, filtro_loja, janela_dias, df_analise, dados['ultimas_vendas'])
+    if fig_coortes is not None:
+        st.plotly_chart(fig_coortes, width='stretch')
+        st.dataframe(df_coortes, width='stretch', hide_index=True)
+    
+    # ==================== PREVISTO X REAL ====================
+    modelo = dados['modelo']
+    if modelo:
+        perfil.etapa('previsao')
+        st.markdown("---")
+        st.subheader("🔮 Retorno Previsto x Real por Mês")
+        treino, validacao = modelo['treino'], modelo['validacao']
+        if validacao:
+            texto_validacao = (
+                f"Validação fora do tempo em {', '.join(formatar_mes(m) for m in validacao['meses'])}, "
+                f"previsto por um modelo treinado só com os meses anteriores: "
+                f"{validacao['mensagens']:,} mensagens, AUC {validacao['auc']:.2f}."
+            )
+        else:
+            texto_validacao = "Ainda não há mês acompanhado fora do treino para validar o modelo."
+        st.caption(
+            f"Probabilidade de retorno em até {modelo['horizonte_dias']} dias estimada pelo modelo "
+            f"(treinado com {treino['mensagens']:,} mensagens, AUC {treino['auc']:.2f} dentro da amostra), "
+            "para todas as lojas e a atribuição padrão. Nos meses de treino o previsto foi ajustado "
+            f"nas próprias mensagens e não mede acerto. {texto_validacao} Meses em acompanhamento "
+            "ainda não completaram o prazo e o real pode crescer."
+        )
+        fig_previsao, df_previsao = montar_previsao(versao_base, modelo)
+        st.plotly_chart(fig_previsao, width='stretch')
+        st.dataframe(df_previsao, width='stretch', hide_index=True)
+    
     # ==================== TABELA DE CLIENTES ====================
+    perfil.etapa('tabela_clientes')
     st.markdown("---")
     st.subheader("📋 Detalhamento por Cliente")
     
@@ -413,67 +1011,81 @@ def main():
             options=["Todos", "Retornou", "Não Retornou"]
         )
     
+    tabela = preparar_tabela(versao, filtro_loja, df_analise)
+    df_por_mes, faixas_mes, _ = tabela
+    
     with col_filtro2:
-        meses_disponiveis = ["Todos"] + sorted(df_analise['mes_referencia'].unique().tolist())
+        meses_disponiveis = ["Todos"] + sorted(faixas_mes)
         filtro_mes = st.selectbox("Mês de Referência", options=meses_disponiveis)
     
     with col_filtro3:
         busca_nome = st.text_input("🔍 Buscar por Nome/Placa")
     
-    # Aplica filtros
-    df_filtrado = df_analise.copy()
+    # Aplica filtros: o mês é uma faixa contínua da análise ordenada por mês e a busca
+    # usa o índice em minúsculas; nenhuma linha é copiada até a página ser montada
+    posicoes = filtrar_clientes(tabela, filtro_mes, filtro_status, busca_nome)
     
-    if filtro_status == "Retornou":
-        df_filtrado = df_filtrado[df_filtrado['retornou'] == True]
-    elif filtro_status == "Não Retornou":
-        df_filtrado = df_filtrado[df_filtrado['retornou'] == False]
+    # Paginação no servidor: só a página exibida é formatada e enviada ao navegador
+    total_linhas = len(posicoes)
+    col_pagina1, col_pagina2, col_pagina3 = st.columns([1, 1, 2])
     
-    if filtro_mes != "Todos":
-        df_filtrado = df_filtrado[df_filtrado['mes_referencia'] == filtro_mes]
+    with col_pagina1:
+        tamanho_pagina = st.selectbox("Linhas por página", options=TAMANHOS_PAGINA)
     
-    if busca_nome:
-        df_filtrado = df_filtrado[
-            df_filtrado['nome'].str.contains(busca_nome, case=False, na=False) |
-            df_filtrado['placa'].str.contains(busca_nome, case=False, na=False)
-        ]
+    total_paginas = max(1, -(-total_linhas // tamanho_pagina))
+    with col_pagina2:
+        pagina = st.number_input("Página", min_value=1, max_value=total_paginas, value=1, step=1)
     
-    # Formata para exibição
-    df_exibir = df_filtrado[[
-        'nome', 'placa', 'telefone', 'data_envio', 'retornou', 
-        'qtd_retornos', 'valor_gerado', 'dias_ate_retorno'
-    ]].copy()
-    
-    df_exibir.columns = [
-        'Cliente', 'Placa', 'Telefone', 'Data Envio', 'Retornou?',
-        'Qtd. Visitas', 'Valor Gerado (R$)', 'Dias até Retorno'
-    ]
-    
-    df_exibir['Retornou?'] = df_exibir['Retornou?'].apply(lambda x: '✅ Sim' if x else '❌ Não')
-    df_exibir['Data Envio'] = pd.to_datetime(df_exibir['Data Envio']).dt.strftime('%d/%m/%Y %H:%M')
-    df_exibir['Valor Gerado (R$)'] = df_exibir['Valor Gerado (R$)'].apply(lambda x: f"R$ {x:,.2f}")
+    inicio_pagina = (pagina - 1) * tamanho_pagina
+    fim_pagina = min(inicio_pagina + tamanho_pagina, total_linhas)
+    with col_pagina3:
+        st.caption(
+            f"Mostrando {inicio_pagina + 1 if total_linhas else 0:,}–{fim_pagina:,} "
+            f"de {total_linhas:,} clientes · página {pagina} de {total_paginas}"
+        )
     
     st.dataframe(
-        df_exibir,
+        formatar_pagina(df_por_mes.iloc[posicoes[inicio_pagina:fim_pagina]]),
         width='stretch',
         hide_index=True,
         height=400
     )
     
-    # Download
-    st.download_button(
-        label="📥 Baixar Relatório Completo (Excel)",
-        data=df_filtrado.to_csv(index=False).encode('utf-8'),
-        file_name=f"relatorio_retorno_{datetime.now().strftime('%Y%m%d')}.csv",
-        mime="text/csv"
-    )
+    # Mensagens da placa buscada: só os meses do histórico segmentado em que ela aparece
+    placa = placa_buscada(busca_nome) if busca_nome else None
+    if placa and not os.path.exists(LOJAS_FILE) and usa_historico_segmentado():
+        envios_placa = mensagens_placa(versao_base, placa, filtro_mes)
+        with st.expander(f"📜 Mensagens enviadas para {placa} ({len(envios_placa):,})"):
+            st.dataframe(envios_placa, width='stretch', hide_index=True)
+    
+    # Download: o arquivo só é gerado quando o botão é clicado (em outra thread)
+    perfil.etapa('download')
+    col_formato, col_download = st.columns([1, 3])
+    
+    with col_formato:
+        formato = st.selectbox(
+            "Formato do relatório",
+            options=list(FORMATOS),
+            format_func=lambda f: FORMATOS[f]['rotulo']
+        )
+    
+    estado_filtros = (versao, filtro_loja, filtro_mes, filtro_status, busca_nome, formato)
+    with col_download:
+        st.download_button(
+            label=f"📥 Baixar Relatório Completo ({FORMATOS[formato]['rotulo']})",
+            data=lambda: gerar_exportacao(*estado_filtros, df_por_mes.iloc[posicoes]),
+            file_name=f"relatorio_retorno_{datetime.now().strftime('%Y%m%d')}.{formato}",
+            mime=FORMATOS[formato]['mime'],
+            on_click="ignore"
+        )
     
     # ==================== RESUMO EXECUTIVO ====================
+    perfil.etapa('resumo_executivo')
     st.markdown("---")
     st.subheader("📝 Resumo Executivo")
     
-    custo_estimado_por_msg = 0.05  # Custo estimado por mensagem (ajustar conforme necessidade)
-    custo_total = total_enviados * custo_estimado_por_msg
-    roi = ((valor_total_gerado - custo_total) / custo_total * 100) if custo_total > 0 else 0
+    custo_total = agregados['roi']['custo_total']
+    roi = agregados['roi']['roi']
     
     st.markdown(f"""
     ### Análise de Retorno sobre Investimento (ROI)
@@ -0,0 +1,116 @@
+"""
+Exportação do relatório de retorno
+Grava a análise em Excel (.xlsx, openpyxl em modo write-only) ou Parquet, um bloco de linhas
+por vez, sem montar o arquivo inteiro como texto em memória.
+
+Uso:
+    python exportacao.py --formato xlsx --saida relatorio_retorno.xlsx
+    python exportacao.py --formato parquet --saida relatorio.parquet --relatorio relatorio_retorno.parquet
+"""
+
+import argparse
+import io
+
+import numpy as np
+import pandas as pd
+
+from relatorio import RELATORIO_FILE, carregar_relatorio
+from utilitarios import log
+
+TAMANHO_BLOCO = 5000
+
+FORMATOS = {
+    'xlsx': {
+        'rotulo': 'Excel (.xlsx)',
+        'mime': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    },
+    'parquet': {
+        'rotulo': 'Parquet',
+        'mime': 'application/vnd.apache.parquet',
+    },
+}
+
+
+def _blocos(df: pd.DataFrame, tamanho_bloco: int):
+    """Fatias consecutivas de `tamanho_bloco` linhas"""
+    for inicio in range(0, len(df), tamanho_bloco):
+        yield df.iloc[inicio:inicio + tamanho_bloco]
+
+
+def _valores_celulas(bloco: pd.DataFrame) -> list:
+    """Colunas do bloco como listas de valores Python aceitos pelo openpyxl (vazios viram None)"""
+    colunas = []
+    for nome in bloco.columns:
+        coluna = bloco[nome]
+        if pd.api.types.is_datetime64_any_dtype(coluna):
+            valores = np.array(coluna.dt.to_pydatetime(), dtype=object)
+        else:
+            valores = coluna.astype(object).to_numpy(copy=True)
+        valores[pd.isna(coluna).to_numpy()] = None
+        colunas.append(valores.tolist())
+    return colunas
+
+
+def exportar_xlsx(df: pd.DataFrame, destino, tamanho_bloco: int = TAMANHO_BLOCO):
+    """Grava o DataFrame em .xlsx no modo write-only (linhas vão direto para o arquivo)"""
+    from openpyxl import Workbook
+
+    livro = Workbook(write_only=True)
+    planilha = livro.create_sheet("Relatório")
+    planilha.append([str(coluna) for coluna in df.columns])
+    for bloco in _blocos(df, tamanho_bloco):
+        for linha in zip(*_valores_celulas(bloco)):
+            planilha.append(linha)
+    livro.save(destino)
+
+
+def exportar_parquet(df: pd.DataFrame, destino, tamanho_bloco: int = TAMANHO_BLOCO):
+    """Grava o DataFrame em Parquet, um grupo de linhas por bloco"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    esquema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(destino, esquema, compression='zstd') as escritor:
+        for bloco in _blocos(df, tamanho_bloco):
+            escritor.write_table(pa.Table.from_pandas(bloco, schema=esquema, preserve_index=False))
+
+
+def exportar_relatorio(df: pd.DataFrame, formato: str, destino=None, tamanho_bloco: int = TAMANHO_BLOCO):
+    """
+    Exporta no formato pedido ('xlsx' ou 'parquet') para `destino` (caminho ou arquivo aberto).
+    Sem destino, retorna o conteúdo em bytes.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato desconhecido: {formato} (use {', '.join(FORMATOS)})")
+
+    exportar = exportar_xlsx if formato == 'xlsx' else exportar_parquet
+    if destino is not None:
+        exportar(df, destino, tamanho_bloco)
+        return None
+
+    buffer = io.BytesIO()
+    exportar(df, buffer, tamanho_bloco)
+    return buffer.getvalue()
+
+
+def main():
+    """Exporta a análise do relatório pré-calculado para Excel ou Parquet"""
+    parser = argparse.ArgumentParser(description="Exporta o relatório de retorno")
+    parser.add_argument("--formato", choices=list(FORMATOS), default='xlsx')
+    parser.add_argument("--saida", required=True)
+    parser.add_argument("--relatorio", default=RELATORIO_FILE,
+                        help="relatório pré-calculado de onde vem a análise")
+    args = parser.parse_args()
+
+    relatorio = carregar_relatorio(args.relatorio)
+    if relatorio is None:
+        log(f"❌ {args.relatorio} não encontrado ou inválido; gere-o com relatorio.py")
+        raise SystemExit(1)
+
+    df_analise, _ = relatorio
+    exportar_relatorio(df_analise, args.formato, args.saida)
+    log(f"✅ {len(df_analise):,} linhas exportadas para {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""
+Histórico de envios
+Percorre historico_envios.json em blocos, sem montar o documento inteiro em memória,
+e guarda apenas os campos usados pela análise em um DataFrame tipado.
+
+Também mantém o histórico segmentado: arquivos JSON Lines por mês em historico/ (um segmento
+por acréscimo, só com os campos da análise) e um índice (historico/indice.json) com os
+segmentos de cada mês e os meses de cada placa.
+
+Uso:
+    python historico.py                          # importa historico_envios.json para historico/
+    python historico.py origem.json --destino historico
+"""
+
+import argparse
+import json
+import os
+import re
+from pathlib import Path
+
+import pandas as pd
+
+from cache_vendas import gravar_atomico
+from normalizacao import canonizar_placas
+from utilitarios import log
+
+# Campos do histórico usados pela análise (mensagem_preview é descartado)
+CAMPOS_ENVIO = {'nome': 'nome', 'fone': 'telefone', 'data_envio': 'data_envio'}
+COLUNAS_ENVIOS = ['mes_referencia', 'placa', 'nome', 'telefone', 'data_envio']
+FORMATO_DATA_ENVIO = "%Y-%m-%d %H:%M:%S"
+TAMANHO_BLOCO = 64 * 1024
+ESPACOS = re.compile(r'[ \t\r\n]*')
+
+DIRETORIO_HISTORICO = "historico"
+INDICE_HISTORICO = "indice.json"
+VERSAO_INDICE = 2  # 2: lista de segmentos por mês (`arquivos`), em vez de um único `arquivo`
+MAX_SEGMENTOS_MES = 30  # acima disso os segmentos do mês são unidos em um só
+
+
+class _LeitorJson:
+    """Leitor de JSON em blocos: entrega um valor por vez a partir da posição atual"""
+
+    def __init__(self, arquivo, tamanho_bloco=TAMANHO_BLOCO):
+        self.arquivo = arquivo
+        self.tamanho_bloco = tamanho_bloco
+        self.buffer = ''
+        self.pos = 0
+        self.fim = False
+        self.decoder = json.JSONDecoder()
+
+    def _ler_mais(self) -> bool:
+        """Acrescenta um bloco ao buffer, descartando o que já foi consumido"""
+        dados = self.arquivo.read(self.tamanho_bloco)
+        if not dados:
+            self.fim = True
+            return False
+        self.buffer = self.buffer[self.pos:] + dados
+        self.pos = 0
+        return True
+
+    def proximo_caractere(self) -> str:
+        """Pula espaços e retorna o próximo caractere sem consumi-lo ('' no fim do arquivo)"""
+        while True:
+            self.pos = ESPACOS.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._ler_mais():
+                return ''
+
+    def consumir(self, esperado: str):
+        """Consome o caractere esperado ou falha com JSON inválido"""
+        encontrado = self.proximo_caractere()
+        if encontrado != esperado:
+            raise ValueError(
+                f"JSON inválido: esperado '{esperado}', encontrado '{encontrado or 'fim do arquivo'}'"
+            )
+        self.pos += 1
+
+    def ler_valor(self):
+        """Decodifica o próximo valor completo, lendo mais blocos se ele estiver cortado"""
+        self.proximo_caractere()
+        while True:
+            try:
+                valor, fim = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._ler_mais():
+                    raise
+                continue
+            # Um número no fim do buffer pode continuar no próximo bloco
+            if fim == len(self.buffer) and not self.fim and self._ler_mais():
+                continue
+            self.pos = fim
+            return valor
+
+    def chaves_objeto(self):
+        """Percorre um objeto, gerando cada chave; o valor deve ser lido por quem itera"""
+        self.consumir('{')
+        if self.proximo_caractere() == '}':
+            self.pos += 1
+            return
+        while True:
+            chave = self.ler_valor()
+            self.consumir(':')
+            yield chave
+            if self.proximo_caractere() == '}':
+                self.pos += 1
+                return
+            self.consumir(',')
+
+
+def iterar_envios_json(caminho, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Percorre o histórico {mes: {placa: dados}} gerando (mes, placa, dados) por mensagem.
+    `dados` traz só os campos de CAMPOS_ENVIO (o texto da mensagem fica de fora).
+    """
+    with open(caminho, 'r', encoding='utf-8') as f:
+        leitor = _LeitorJson(f, tamanho_bloco)
+        for mes in leitor.chaves_objeto():
+            for placa in leitor.chaves_objeto():
+                dados = leitor.ler_valor()
+                if not isinstance(dados, dict):
+                    continue
+                yield mes, placa, {campo: dados.get(campo, '') for campo in CAMPOS_ENVIO}
+
+
+def tipar_envios(colunas) -> pd.DataFrame:
+    """
+    Monta o DataFrame de envios a partir de listas por coluna (ou de um DataFrame).
+    Mês vira categoria e data_envio é convertida de uma vez; datas inválidas são descartadas.
+    """
+    envios = pd.DataFrame(colunas)[COLUNAS_ENVIOS]
+    envios['data_envio'] = pd.to_datetime(
+        envios['data_envio'].where(envios['data_envio'].map(lambda v: isinstance(v, str))),
+        format=FORMATO_DATA_ENVIO, errors='coerce'
+    )
+    envios = envios.dropna(subset=['data_envio']).reset_index(drop=True)
+    envios['mes_referencia'] = envios['mes_referencia'].astype('category')
+    return envios
+
+
+def carregar_envios(caminho) -> pd.DataFrame:
+    """
+    Carrega o histórico de envios como DataFrame (uma linha por mensagem).
+    Retorna um DataFrame vazio se o arquivo não existir.
+    """
+    colunas = {coluna: [] for coluna in COLUNAS_ENVIOS}
+    if os.path.exists(caminho):
+        for mes, placa, dados in iterar_envios_json(caminho):
+            colunas['mes_referencia'].append(mes)
+            colunas['placa'].append(placa)
+            for campo, coluna in CAMPOS_ENVIO.items():
+                colunas[coluna].append(dados[campo])
+    return tipar_envios(colunas)
+
+
+# ==================== HISTÓRICO SEGMENTADO ====================
+
+def caminho_indice(diretorio=DIRETORIO_HISTORICO) -> Path:
+    """Caminho do índice do histórico segmentado"""
+    return Path(diretorio) / INDICE_HISTORICO
+
+
+def ler_indice(diretorio=DIRETORIO_HISTORICO) -> dict:
+    """
+    Lê o índice {meses: {mes: {arquivos, mensagens}}, placas: {placa: [meses]}}.
+    O índice da versão 1 (um `arquivo` por mês) é convertido ao ler.
+    """
+    try:
+        with open(caminho_indice(diretorio), 'r', encoding='utf-8') as f:
+            indice = json.load(f)
+        if indice.get('versao') == 1:
+            for info in indice['meses'].values():
+                info['arquivos'] = [info.pop('arquivo')]
+            indice['versao'] = VERSAO_INDICE
+        if indice.get('versao') == VERSAO_INDICE:
+            return indice
+    except (OSError, ValueError):
+        pass
+    return {'versao': VERSAO_INDICE, 'meses': {}, 'placas': {}}
+
+
+def _ler_mes(diretorio, info: dict):
+    """Gera os registros de todos os segmentos de um mês, na ordem em que foram acrescentados"""
+    for arquivo in info['arquivos']:
+        yield from _ler_segmento(Path(diretorio) / arquivo)
+
+
+def _ler_segmento(caminho):
+    """Gera os registros de um segmento mensal, ignorando linha final incompleta"""
+    with open(caminho, 'r', encoding='utf-8') as f:
+        for linha in f:
+            try:
+                registro = json.loads(linha)
+            except ValueError:
+                continue
+            if isinstance(registro, dict):
+                yield registro
+
+
+def carregar_envios_segmentados(diretorio=DIRETORIO_HISTORICO, meses=None, placas=None) -> pd.DataFrame:
+    """
+    Carrega do histórico segmentado só os meses pedidos (todos se `meses` for None).
+    Com `placas`, o índice limita a leitura aos meses em que essas placas receberam mensagem.
+    Se a mesma placa aparece mais de uma vez no mês, vale o último registro (do segmento mais
+    recente), como no JSON.
+    """
+    indice = ler_indice(diretorio)
+    selecionados = set(indice['meses']) if meses is None else set(meses) & set(indice['meses'])
+    if placas is not None:
+        placas = set(placas)
+        selecionados &= {mes for placa in placas for mes in indice['placas'].get(placa, [])}
+
+    colunas = {coluna: [] for coluna in COLUNAS_ENVIOS}
+    for mes in sorted(selecionados):
+        for registro in _ler_mes(diretorio, indice['meses'][mes]):
+            placa = registro.get('placa', '')
+            if placas is not None and placa not in placas:
+                continue
+            colunas['mes_referencia'].append(mes)
+            colunas['placa'].append(placa)
+            for campo, coluna in CAMPOS_ENVIO.items():
+                colunas[coluna].append(registro.get(campo, ''))
+
+    envios = pd.DataFrame(colunas).drop_duplicates(['mes_referencia', 'placa'], keep='last')
+    return tipar_envios(envios)
+
+
+def _gravar_indice(indice: dict, diretorio):
+    """Grava o índice de forma atômica: ele é quem decide quais segmentos valem"""
+    gravar_atomico(
+        caminho_indice(diretorio),
+        lambda tmp: tmp.write_text(json.dumps(indice, ensure_ascii=False, indent=1), encoding='utf-8')
+    )
+
+
+def _proximo_segmento(indice: dict, mes: str) -> str:
+    """Nome novo para o segmento do mês; nunca reaproveita um nome já publicado"""
+    indice['sequencia'] = indice.get('sequencia', 0) + 1
+    return f"{mes}_{indice['sequencia']:05d}.jsonl"
+
+
+def _gravar_segmento(caminho, registros: list):
+    """Grava um segmento JSON Lines de forma atômica"""
+    gravar_atomico(caminho, lambda tmp: tmp.write_text(
+        ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in registros), encoding='utf-8'
+    ))
+
+
+def acrescentar_envios(mensagens, diretorio=DIRETORIO_HISTORICO) -> dict:
+    """
+    Acrescenta ao histórico segmentado as mensagens (mes, placa, dados) que ainda não estão lá.
+    Uma mensagem já existe se o mês tem a mesma placa com a mesma data_envio.
+    As mensagens novas de cada mês vão para um segmento novo, só com elas; os segmentos já
+    publicados não são regravados. O segmento só passa a valer quando o índice é gravado: uma
+    interrupção no meio deixa o índice com os segmentos anteriores, completos, e a próxima
+    execução refaz o acréscimo. Um mês com mais de MAX_SEGMENTOS_MES segmentos é unido em um só.
+    Os registros guardam só a placa e os campos de CAMPOS_ENVIO (sem o texto da mensagem).
+    Retorna {mes: quantidade de mensagens novas}.
+    """
+    diretorio = Path(diretorio)
+    diretorio.mkdir(parents=True, exist_ok=True)
+    indice = ler_indice(diretorio)
+
+    # Mensagens agrupadas por mês para ler os segmentos de cada mês uma única vez
+    por_mes = {}
+    for mes, placa, dados in mensagens:
+        por_mes.setdefault(mes, []).append({'placa': placa, **{campo: dados.get(campo, '') for campo in CAMPOS_ENVIO}})
+
+    novas = {}
+    substituidos = []
+    for mes, registros in por_mes.items():
+        info = indice['meses'].get(mes, {'arquivos': [], 'mensagens': 0})
+        info['arquivos'] = [arquivo for arquivo in info['arquivos'] if (diretorio / arquivo).exists()]
+        existentes = {(r.get('placa'), r.get('data_envio')) for r in _ler_mes(diretorio, info)}
+        registros = [r for r in registros if (r['placa'], r.get('data_envio')) not in existentes]
+        if not registros:
+            continue
+
+        if len(info['arquivos']) + 1 > MAX_SEGMENTOS_MES:
+            # Une os segmentos do mês (e as mensagens novas) em um só
+            anteriores = [
+                {'placa': r.get('placa', ''), **{campo: r.get(campo, '') for campo in CAMPOS_ENVIO}}
+                for r in _ler_mes(diretorio, info)
+            ]
+            arquivo = _proximo_segmento(indice, mes)
+            _gravar_segmento(diretorio / arquivo, anteriores + registros)
+            substituidos += info['arquivos']
+            info['arquivos'] = [arquivo]
+        else:
+            arquivo = _proximo_segmento(indice, mes)
+            _gravar_segmento(diretorio / arquivo, registros)
+            info['arquivos'].append(arquivo)
+        info['mensagens'] += len(registros)
+        indice['meses'][mes] = info
+
+        for registro in registros:
+            meses_placa = indice['placas'].setdefault(registro['placa'], [])
+            if mes not in meses_placa:
+                meses_placa.append(mes)
+                meses_placa.sort()
+        novas[mes] = len(registros)
+
+    indice['meses'] = dict(sorted(indice['meses'].items()))
+    if novas or not caminho_indice(diretorio).exists():
+        _gravar_indice(indice, diretorio)
+
+    # Segmentos unidos só são apagados depois que o índice novo está gravado
+    for arquivo in substituidos:
+        (diretorio / arquivo).unlink(missing_ok=True)
+    return novas
+
+
+def placas_equivalentes(placa: str, diretorio=DIRETORIO_HISTORICO) -> list:
+    """Placas do índice com a mesma chave canônica da placa pedida (ex.: ABC1234 e ABC1C34)"""
+    placas = pd.Series(list(ler_indice(diretorio)['placas']), dtype=object)
+    if placas.empty:
+        return []
+    chave = canonizar_placas(pd.Series([placa], dtype=object)).iloc[0]
+    return placas[(canonizar_placas(placas) == chave).to_numpy()].tolist()
+
+
+def importar_historico_json(caminho_json, diretorio=DIRETORIO_HISTORICO) -> dict:
+    """
+    Importa historico_envios.json para o histórico segmentado.
+    Na primeira execução é a migração completa; depois só acrescenta as mensagens novas.
+    """
+    return acrescentar_envios(iterar_envios_json(caminho_json), diretorio)
+
+
+def main():
+    """Importa (ou sincroniza) o histórico JSON para o formato segmentado"""
+    parser = argparse.ArgumentParser(description="Importa o histórico de envios para historico/")
+    parser.add_argument("origem", nargs="?", default="historico_envios.json")
+    parser.add_argument("--destino", default=DIRETORIO_HISTORICO)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.origem):
+        log(f"❌ {args.origem} não encontrado")
+        raise SystemExit(1)
+
+    novas = importar_historico_json(args.origem, args.destino)
+    if not novas:
+        log(f"ℹ️ Nenhuma mensagem nova em {args.origem}")
+    for mes, quantidade in novas.items():
+        log(f"✅ {mes}: {quantidade} mensagens acrescentadas")
+
+
+if __name__ == "__main__":
+    main()
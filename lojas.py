@@ -0,0 +1,222 @@
+"""
+Análise de várias lojas
+Cada unidade Lubrimax tem seu próprio histórico de envios e sua planilha de vendas,
+listados em lojas.json. As lojas (ou os meses de cada loja) são analisados em paralelo,
+um processo por fatia, e os resultados são unidos em uma visão consolidada com a coluna `loja`.
+
+Formato de lojas.json (caminhos relativos à pasta do arquivo):
+    [
+      {"nome": "Matriz", "historico": "historico_envios.json", "vendas": "Vendas_Lubrimax.xlsx"},
+      {"nome": "Filial", "historico": "filial/historico", "vendas": "filial/Vendas.xlsx"}
+    ]
+`historico` pode ser o JSON ou a pasta do histórico segmentado; `vendas`, a planilha ou a
+pasta de vendas em base + deltas.
+
+Uso:
+    python lojas.py                       # analisa as lojas de lojas.json
+    python lojas.py --por-mes --saida consolidado.csv
+    python lojas.py --janela 60 --regra ultimo_toque
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from analise_incremental import analisar_retorno_incremental
+from analise_retorno import REGRA_PADRAO, REGRAS_ATRIBUICAO, analisar_retorno
+from historico import carregar_envios, carregar_envios_segmentados, caminho_indice, ler_indice
+from utilitarios import log
+from vendas import caminho_indice_vendas, carregar_vendas_loja
+
+LOJAS_FILE = "lojas.json"
+LOJA_PADRAO = {"nome": "Lubrimax", "historico": "historico_envios.json", "vendas": "Vendas_Lubrimax.xlsx"}
+
+
+def carregar_lojas(caminho=LOJAS_FILE) -> list:
+    """
+    Lê a lista de lojas, com caminhos resolvidos a partir da pasta do arquivo (`base`, onde
+    também fica o estado da análise incremental de cada loja).
+    Sem lojas.json, retorna só a loja padrão (arquivos na mesma pasta).
+    """
+    caminho = Path(caminho)
+    base = caminho.parent
+    if not caminho.exists():
+        lojas = [LOJA_PADRAO]
+    else:
+        with open(caminho, 'r', encoding='utf-8') as f:
+            lojas = json.load(f)
+
+    resolvidas = []
+    for loja in lojas:
+        historico = base / loja['historico']
+        # Histórico segmentado: usa a pasta historico/ ao lado do JSON quando ela existir
+        if historico.suffix == '.json' and caminho_indice(historico.parent / 'historico').exists():
+            historico = historico.parent / 'historico'
+        vendas = base / loja['vendas']
+        # Vendas em base + deltas: usa a pasta vendas/ ao lado da planilha quando ela existir
+        if vendas.suffix == '.xlsx' and caminho_indice_vendas(vendas.parent / 'vendas').exists():
+            vendas = vendas.parent / 'vendas'
+        resolvidas.append({
+            'nome': loja['nome'],
+            'historico': str(historico),
+            'vendas': str(vendas),
+            'base': str(base),
+        })
+    return resolvidas
+
+
+def arquivos_loja(loja: dict) -> list:
+    """Arquivos cuja mudança altera a análise da loja"""
+    historico = Path(loja['historico'])
+    if historico.is_dir():
+        historico = caminho_indice(historico)
+    vendas = Path(loja['vendas'])
+    if vendas.is_dir():
+        vendas = caminho_indice_vendas(vendas)
+    return [historico, vendas]
+
+
+def _carregar_envios_loja(loja: dict, meses=None) -> pd.DataFrame:
+    """Histórico da loja (JSON ou segmentado), opcionalmente só dos meses pedidos"""
+    if Path(loja['historico']).is_dir():
+        return carregar_envios_segmentados(loja['historico'], meses=meses)
+    envios = carregar_envios(loja['historico'])
+    if meses is not None:
+        envios = envios[envios['mes_referencia'].isin(meses)].reset_index(drop=True)
+    return envios
+
+
+def _meses_loja(loja: dict) -> list:
+    """Meses com mensagens no histórico da loja"""
+    if Path(loja['historico']).is_dir():
+        return sorted(ler_indice(loja['historico'])['meses'])
+    return sorted(carregar_envios(loja['historico'])['mes_referencia'].unique().tolist())
+
+
+def _sufixo_estado(nome: str) -> str:
+    """Nome da loja reduzido a caracteres seguros para nome de arquivo"""
+    return re.sub(r'[^a-z0-9]+', '_', nome.lower()).strip('_') or 'loja'
+
+
+def analisar_fatia(loja: dict, meses=None, janela_dias: int = None, regra: str = REGRA_PADRAO) -> pd.DataFrame:
+    """
+    Analisa uma fatia: a loja inteira (incremental, com estado próprio por loja)
+    ou só os meses pedidos (análise completa desses meses). O estado da loja fica na pasta
+    de lojas.json, não na pasta em que o processo foi iniciado.
+    A análise incremental só guarda a atribuição padrão; com janela ou regra de toque a
+    loja é sempre analisada por completo.
+    Executada nos processos de trabalho, por isso só recebe e devolve dados serializáveis.
+    """
+    envios = _carregar_envios_loja(loja, meses)
+    df_vendas = carregar_vendas_loja(loja['vendas'])
+
+    if meses is None and janela_dias is None and regra == REGRA_PADRAO:
+        sufixo = _sufixo_estado(loja['nome'])
+        base = Path(loja['base'])
+        df_analise = analisar_retorno_incremental(
+            envios, df_vendas,
+            caminho_estado=base / f"analise_retorno.{sufixo}.state.parquet",
+            caminho_meta=base / f"analise_retorno.{sufixo}.state.json"
+        )
+    else:
+        df_analise = analisar_retorno(envios, df_vendas, janela_dias=janela_dias, regra=regra)
+
+    if df_analise.empty:
+        return df_analise
+    df_analise = df_analise.copy()
+    df_analise.insert(0, 'loja', loja['nome'])
+    return df_analise
+
+
+def analisar_lojas(lojas: list, por_mes: bool = False, processos: int = None,
+                   janela_dias: int = None, regra: str = REGRA_PADRAO) -> pd.DataFrame:
+    """
+    Analisa todas as lojas e une os resultados.
+    Cada loja (ou cada mês de cada loja, com `por_mes`) vira uma fatia executada em um
+    processo separado; com uma única fatia tudo roda no processo atual. Os processos são
+    iniciados por `spawn`, não por fork: o dashboard chama esta função da thread do
+    observador, e um fork de um processo com várias threads pode herdar travas presas.
+    Nas regras de toque uma venda disputa mensagens de meses diferentes, então as fatias
+    são sempre por loja.
+    """
+    if por_mes and regra != REGRA_PADRAO:
+        log(f"ℹ️ Regra '{regra}' compara mensagens de todos os meses: analisando uma fatia por loja")
+        por_mes = False
+
+    fatias = []
+    for loja in lojas:
+        if por_mes:
+            fatias += [(loja, [mes]) for mes in _meses_loja(loja)]
+        else:
+            fatias.append((loja, None))
+
+    if len(fatias) <= 1 or processos == 1:
+        resultados = [analisar_fatia(loja, meses, janela_dias, regra) for loja, meses in fatias]
+    else:
+        trabalhadores = min(len(fatias), processos or os.cpu_count() or 1)
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=trabalhadores, mp_context=contexto) as executor:
+            resultados = list(executor.map(
+                analisar_fatia, [loja for loja, _ in fatias], [meses for _, meses in fatias],
+                [janela_dias] * len(fatias), [regra] * len(fatias)
+            ))
+
+    resultados = [r for r in resultados if not r.empty]
+    if not resultados:
+        return pd.DataFrame()
+
+    df_analise = pd.concat(resultados, ignore_index=True)
+    df_analise['loja'] = pd.Categorical(df_analise['loja'], categories=[l['nome'] for l in lojas])
+    df_analise['mes_referencia'] = df_analise['mes_referencia'].astype(str).astype('category')
+    return df_analise
+
+
+def resumo_por_loja(df_analise: pd.DataFrame) -> pd.DataFrame:
+    """Mensagens, retornos, taxa de retorno e valor gerado de cada loja"""
+    resumo = df_analise.groupby('loja', observed=True).agg(
+        mensagens=('placa', 'size'),
+        retornos=('retornou', 'sum'),
+        valor_gerado=('valor_gerado', 'sum'),
+        media_dias=('dias_ate_retorno', 'mean')
+    ).reset_index()
+    resumo['taxa_retorno'] = resumo['retornos'] / resumo['mensagens'] * 100
+    return resumo
+
+
+def main():
+    """Analisa as lojas configuradas e mostra o resumo por loja"""
+    parser = argparse.ArgumentParser(description="Análise de retorno de várias lojas")
+    parser.add_argument("--config", default=LOJAS_FILE)
+    parser.add_argument("--por-mes", action="store_true",
+                        help="uma fatia por mês de cada loja, em vez de uma por loja")
+    parser.add_argument("--processos", type=int, help="número de processos (padrão: núcleos da CPU)")
+    parser.add_argument("--janela", type=int,
+                        help="só conta vendas até N dias após o envio (padrão: sem limite)")
+    parser.add_argument("--regra", choices=list(REGRAS_ATRIBUICAO), default=REGRA_PADRAO,
+                        help="atribuição de cada venda: a todas as mensagens anteriores ou a um só toque")
+    parser.add_argument("--saida", help="grava a análise consolidada em CSV")
+    args = parser.parse_args()
+
+    lojas = carregar_lojas(args.config)
+    log(f"Analisando {len(lojas)} loja(s)...")
+    df_analise = analisar_lojas(lojas, por_mes=args.por_mes, processos=args.processos,
+                                janela_dias=args.janela, regra=args.regra)
+
+    if df_analise.empty:
+        log("⚠️ Nenhum dado para análise")
+        return
+
+    log("Resumo por loja:\n" + resumo_por_loja(df_analise).to_string(index=False))
+    if args.saida:
+        df_analise.to_csv(args.saida, index=False)
+        log(f"✅ Análise consolidada gravada em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Normalização das vendas
+Converte de uma vez, coluna inteira por coluna inteira, os campos usados na análise: placas
+citadas no texto livre de IDENTIFICAÇÃO e OBSERVAÇÃO, datas de emissão e valores em reais.
+Os padrões são compilados uma única vez e os valores que não puderam ser convertidos são
+contados, para que problemas na planilha apareçam em vez de virarem zero em silêncio.
+
+Placas: o padrão antigo (ABC1234) e o Mercosul (ABC1C34) são a mesma placa depois da conversão
+(o 5º caractere 0-9 vira A-J), então as duas formas recebem a mesma chave canônica, a Mercosul.
+No texto livre a placa só é aceita inteira: colada a outras letras ou dígitos (ex.: AWZ84269)
+ela é descartada, exceto quando seguida de "KM", um erro de digitação comum na planilha.
+
+Valores: aceita o formato brasileiro ("1.654,30", "1654,3", "R$ 35") e ponto decimal ("1654.30").
+
+Datas: aceita dd/mm/aaaa (com ou sem horário), aaaa-mm-dd e datas já convertidas pelo Excel.
+
+Uso:
+    python normalizacao.py                   # valores rejeitados em Vendas_Lubrimax.xlsx
+    python normalizacao.py outra.xlsx --exemplos 10
+"""
+
+import argparse
+import re
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cache_vendas import carregar_vendas_cache
+from utilitarios import log
+
+# Placas no padrão antigo (ABC1234) e Mercosul (ABC1D23)
+PADRAO_PLACA = r"[A-Z]{3}[0-9][A-Z0-9][0-9]{2}"
+COLUNAS_PLACA = ["IDENTIFICAÇÃO", "OBSERVAÇÃO"]
+COLUNA_DATA = "EMISSÃO"
+COLUNA_VALOR = "TOTAL VENDA"
+
+_PLACA_NO_TEXTO = re.compile(r"(?<![A-Z0-9])[A-Z]{3}-?[0-9][A-Z0-9][0-9]{2}(?=KM|[^A-Z0-9]|$)")
+_PLACA_ANTIGA = re.compile(r"[A-Z]{3}[0-9]{4}")
+_SEPARADORES = re.compile(r"[^A-Z0-9]")
+_ESPACOS = re.compile(r"\s")
+_VALOR_BRASILEIRO = re.compile(r"-?(?:[0-9]{1,3}(?:\.[0-9]{3})+|[0-9]+)(?:,[0-9]+)?")
+_VALOR_PONTO = re.compile(r"-?[0-9]+\.[0-9]+")
+_DATA_BRASILEIRA = re.compile(r"^([0-9]{1,2}/[0-9]{1,2}/[0-9]{4})(?:\s.*)?$")
+_DATA_ISO = re.compile(r"^([0-9]{4}-[0-9]{2}-[0-9]{2})(?:[T\s].*)?$")
+_MERCOSUL = str.maketrans("0123456789", "ABCDEFGHIJ")
+
+ROTULOS_REJEITADOS = {
+    'datas': 'datas de emissão inválidas',
+    'valores': 'valores de venda inválidos',
+    'sem_placa': 'vendas com identificação sem placa reconhecida',
+}
+
+
+# ==================== PLACAS ====================
+
+def canonizar_placas(placas: pd.Series) -> pd.Series:
+    """
+    Chave canônica de cada placa: maiúsculas, sem separadores e, no padrão antigo, convertida
+    para a forma Mercosul (ABC-1234 -> ABC1C34). Placas fora do padrão só são limpas.
+    """
+    limpas = placas.astype(str).str.upper().str.replace(_SEPARADORES, '', regex=True)
+    antigas = limpas.str.fullmatch(_PLACA_ANTIGA)
+    mercosul = limpas.str[:4] + limpas.str[4].str.translate(_MERCOSUL) + limpas.str[5:]
+    return limpas.where(~antigas, mercosul)
+
+
+def extrair_placas(df_vendas: pd.DataFrame) -> pd.DataFrame:
+    """
+    Placas citadas em IDENTIFICAÇÃO e OBSERVAÇÃO, já canônicas.
+    Retorna o índice (placa, linha), onde linha é a posição da venda no DataFrame.
+    """
+    partes = []
+    for coluna in COLUNAS_PLACA:
+        textos = df_vendas[coluna].astype(str).str.upper().reset_index(drop=True)
+        encontradas = textos.str.findall(_PLACA_NO_TEXTO).explode().dropna()
+        partes.append(pd.DataFrame({
+            'placa': encontradas.to_numpy(dtype=object),
+            'linha': encontradas.index.to_numpy()
+        }))
+
+    indice = pd.concat(partes, ignore_index=True)
+    indice['placa'] = canonizar_placas(indice['placa'])
+    return indice.drop_duplicates().sort_values(['placa', 'linha'], ignore_index=True)
+
+
+def buscar_placa_no_texto(placa: str, textos: list) -> np.ndarray:
+    """Linhas em que a placa (fora do padrão, já canônica) aparece inteira em algum dos textos"""
+    padrao = re.compile(rf"(?<![A-Z0-9]){re.escape(placa)}(?![A-Z0-9])")
+    mascara = np.zeros(len(textos[0]), dtype=bool)
+    for serie in textos:
+        mascara |= serie.str.contains(padrao, na=False).to_numpy(dtype=bool)
+    return mascara.nonzero()[0]
+
+
+# ==================== VALORES ====================
+
+def valor_texto(texto: str):
+    """Valor em reais de um texto; 0.0 se vazio e None se não for um valor"""
+    limpo = _ESPACOS.sub('', texto.replace('R$', ''))
+    if not limpo:
+        return 0.0
+    if _VALOR_BRASILEIRO.fullmatch(limpo):
+        return float(limpo.replace('.', '').replace(',', '.'))
+    if _VALOR_PONTO.fullmatch(limpo):
+        return float(limpo)
+    return None
+
+
+def normalizar_valores(valores: pd.Series) -> tuple:
+    """
+    Valores em reais como float, para a coluna inteira. Células vazias continuam NaN;
+    textos vazios viram 0.0; textos que não são valor viram 0.0 e são contados.
+    Retorna (valores, quantidade de rejeitados).
+    """
+    if pd.api.types.is_numeric_dtype(valores):
+        # float32 da leitura compacta só é usado quando os valores são exatos em centavos
+        if valores.dtype == np.float32:
+            return valores.astype(float).round(2), 0
+        return valores.astype(float), 0
+
+    eh_texto = _mascara_tipo(valores, str)
+    textos = valores.where(eh_texto).astype(object).astype(str)
+    limpos = textos.str.replace('R$', '', regex=False).str.replace(_ESPACOS, '', regex=True)
+
+    brasileiro = limpos.str.fullmatch(_VALOR_BRASILEIRO) & eh_texto
+    ponto = limpos.str.fullmatch(_VALOR_PONTO) & eh_texto & ~brasileiro
+    convertidos = limpos.where(~brasileiro, limpos.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+    numeros = pd.to_numeric(convertidos.where(brasileiro | ponto), errors='coerce')
+
+    # Células que já são números (planilha com tipos misturados)
+    outros = valores.notna() & ~eh_texto
+    numeros = numeros.where(~outros, pd.to_numeric(valores.where(outros), errors='coerce'))
+
+    rejeitados = valores.notna() & numeros.isna() & ~(eh_texto & limpos.eq(''))
+    return numeros.mask(valores.notna() & numeros.isna(), 0.0).astype(float), int(rejeitados.sum())
+
+
+# ==================== DATAS ====================
+
+def data_texto(texto: str):
+    """Data de um texto dd/mm/aaaa ou aaaa-mm-dd (horário ignorado); None se inválida"""
+    texto = texto.strip()
+    for padrao, formato in ((_DATA_BRASILEIRA, '%d/%m/%Y'), (_DATA_ISO, '%Y-%m-%d')):
+        encontrada = padrao.match(texto)
+        if encontrada:
+            try:
+                return datetime.strptime(encontrada.group(1), formato)
+            except ValueError:
+                return None
+    return None
+
+
+def normalizar_datas(emissoes: pd.Series) -> tuple:
+    """
+    Datas de emissão para a coluna inteira: textos dd/mm/aaaa ou aaaa-mm-dd (só o dia) e
+    valores já em datetime. Células vazias viram NaT; o resto que não for data vira NaT e é
+    contado. Retorna (datas, quantidade de rejeitadas).
+    """
+    if pd.api.types.is_datetime64_any_dtype(emissoes):
+        return emissoes, 0
+
+    eh_texto = _mascara_tipo(emissoes, str)
+    textos = emissoes.where(eh_texto).astype(object).astype(str).str.strip()
+    datas = pd.to_datetime(textos, format='%d/%m/%Y', errors='coerce').where(eh_texto)
+
+    # Só os textos fora do formato dd/mm/aaaa passam pelos padrões mais lentos
+    outras = datas.isna() & eh_texto & textos.ne('')
+    if outras.any():
+        restantes = textos[outras]
+        brasileiras = pd.to_datetime(restantes.str.extract(_DATA_BRASILEIRA)[0], format='%d/%m/%Y', errors='coerce')
+        iso = pd.to_datetime(restantes.str.extract(_DATA_ISO)[0], format='%Y-%m-%d', errors='coerce')
+        datas = datas.fillna(brasileiras.fillna(iso))
+    datas = datas.rename(emissoes.name)
+
+    # Células que o Excel já converteu para data (planilha com tipos misturados)
+    if emissoes.dtype == object:
+        eh_data = _mascara_tipo(emissoes, datetime)
+        if eh_data.any():
+            datas = datas.fillna(pd.to_datetime(emissoes.where(eh_data), errors='coerce'))
+
+    rejeitadas = emissoes.notna() & datas.isna() & ~(eh_texto & textos.eq(''))
+    return datas, int(rejeitadas.sum())
+
+
+def _mascara_tipo(valores: pd.Series, tipo) -> pd.Series:
+    """Células do tipo pedido; colunas de texto do pandas não precisam de checagem célula a célula"""
+    if tipo is str and pd.api.types.is_string_dtype(valores) and valores.dtype != object:
+        return valores.notna()
+    return valores.map(lambda v: isinstance(v, tipo)).astype(bool)
+
+
+# ==================== VENDAS ====================
+
+def normalizar_vendas(df_vendas: pd.DataFrame) -> dict:
+    """
+    Colunas normalizadas das vendas, calculadas uma vez por carga da planilha:
+    data_venda e valor (arrays na ordem das linhas), placas (índice placa, linha) e
+    rejeitados (quantidade de datas e valores descartados e de vendas com texto de
+    identificação em que nenhuma placa foi reconhecida).
+    """
+    data_venda, datas_rejeitadas = normalizar_datas(df_vendas[COLUNA_DATA])
+    valor, valores_rejeitados = normalizar_valores(df_vendas[COLUNA_VALOR])
+    placas = extrair_placas(df_vendas)
+
+    com_texto = pd.Series(False, index=df_vendas.index)
+    for coluna in COLUNAS_PLACA:
+        com_texto |= df_vendas[coluna].notna() & df_vendas[coluna].astype(str).str.strip().ne('')
+    sem_placa = int(com_texto.to_numpy().sum() - np.isin(np.flatnonzero(com_texto.to_numpy()), placas['linha']).sum())
+
+    # Na leitura compacta datas e valores já chegam convertidos, com os rejeitados contados
+    ja_rejeitados = df_vendas.attrs.get('rejeitados', {})
+    datas_rejeitadas += ja_rejeitados.get('datas', 0)
+    valores_rejeitados += ja_rejeitados.get('valores', 0)
+
+    return {
+        'data_venda': data_venda.to_numpy(dtype='datetime64[ns]'),
+        'valor': valor.to_numpy(dtype=float),
+        'placas': placas,
+        'rejeitados': {'datas': datas_rejeitadas, 'valores': valores_rejeitados, 'sem_placa': sem_placa},
+    }
+
+
+def resumo_rejeitados(rejeitados: dict) -> str:
+    """Texto curto com as contagens de valores rejeitados (vazio se não houve nenhum)"""
+    return ", ".join(
+        f"{quantidade:,} {ROTULOS_REJEITADOS[chave]}" for chave, quantidade in rejeitados.items() if quantidade
+    )
+
+
+def main():
+    """Mostra quantos valores de cada coluna da planilha foram rejeitados na normalização"""
+    parser = argparse.ArgumentParser(description="Normaliza a planilha de vendas e conta os valores rejeitados")
+    parser.add_argument("arquivo", nargs="?", default="Vendas_Lubrimax.xlsx")
+    parser.add_argument("--exemplos", type=int, default=5, help="exemplos de valores rejeitados por coluna")
+    args = parser.parse_args()
+
+    if not Path(args.arquivo).exists():
+        log(f"❌ {args.arquivo} não encontrado")
+        raise SystemExit(1)
+
+    df_vendas = carregar_vendas_cache(args.arquivo)
+    normalizadas = normalizar_vendas(df_vendas)
+    log(f"✅ {len(df_vendas):,} vendas, {normalizadas['placas']['placa'].nunique():,} placas reconhecidas")
+
+    rejeitados = resumo_rejeitados(normalizadas['rejeitados'])
+    if not rejeitados:
+        log("✅ Nenhum valor rejeitado")
+        return
+    log(f"⚠️ Rejeitados: {rejeitados}")
+
+    for coluna, converter in ((COLUNA_DATA, data_texto), (COLUNA_VALOR, valor_texto)):
+        textos = pd.Series(df_vendas[coluna].dropna().unique())
+        rejeitados = textos[textos.map(lambda v: isinstance(v, str) and v.strip() != '' and converter(v) is None)]
+        if not rejeitados.empty:
+            log(f"   {coluna}: {', '.join(rejeitados.head(args.exemplos))}")
+
+
+if __name__ == "__main__":
+    main()
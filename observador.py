@@ -0,0 +1,177 @@
+"""
+Observador dos arquivos de entrada
+Uma thread em segundo plano confere, a cada poucos segundos, a versão (tamanho e data de
+modificação) dos arquivos que alimentam o dashboard. Quando algum muda, os dados são
+reconstruídos na própria thread e trocados de uma só vez: quem lê recebe sempre um conjunto
+completo (o anterior ou o novo), nunca um pela metade, e nenhuma requisição espera a releitura.
+
+Um arquivo só é relido depois de ficar com a mesma versão em duas verificações seguidas,
+para não pegar uma planilha ou um JSON ainda sendo gravado. Se a reconstrução falhar, os
+dados anteriores continuam valendo e a mesma versão não é tentada de novo.
+
+Uso (fora do Streamlit):
+    python observador.py                  # mostra as mudanças detectadas nos arquivos das lojas
+    python observador.py --intervalo 10
+"""
+
+import argparse
+import os
+import threading
+import time
+
+from cache_vendas import assinatura_arquivo
+from utilitarios import log
+
+INTERVALO_OBSERVACAO = 2.0  # segundos entre verificações
+
+
+def versao_arquivo(caminho):
+    """Tamanho e data de modificação do arquivo, usados como chave dos caches"""
+    if not os.path.exists(caminho):
+        return None
+    assinatura = assinatura_arquivo(caminho, com_hash=False)
+    return assinatura['tamanho'], assinatura['mtime_ns']
+
+
+class ObservadorArquivos:
+    """
+    Mantém os dados montados por `construir(versao)` em dia com os arquivos de `listar_arquivos()`.
+    `dados()` retorna o par (versao, dados) mais recente; a troca é uma única atribuição,
+    então leitores em outras threads nunca veem um conjunto incompleto.
+    """
+
+    def __init__(self, listar_arquivos, construir, intervalo: float = INTERVALO_OBSERVACAO,
+                 nome: str = "observador-arquivos"):
+        self._listar_arquivos = listar_arquivos
+        self._construir = construir
+        self.intervalo = intervalo
+        self._atual = None  # (versao, dados)
+        self._versao_vista = None
+        self._versao_com_erro = None
+        self._forcar = False
+        self._pronto = threading.Event()
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._trava = threading.Lock()  # uma reconstrução por vez
+        self.reconstruindo = False
+        self.ultimo_erro = None
+        self.reconstrucoes = 0
+        self._thread = threading.Thread(target=self._executar, name=nome, daemon=True)
+
+    def versao_atual(self) -> tuple:
+        """Versão dos arquivos observados neste momento"""
+        return tuple((str(arquivo), versao_arquivo(arquivo)) for arquivo in self._listar_arquivos())
+
+    def iniciar(self):
+        """Inicia a thread de observação (a primeira carga começa na hora)"""
+        self._thread.start()
+        return self
+
+    def parar(self, timeout: float = None):
+        """Encerra a thread de observação"""
+        self._parar.set()
+        self._acordar.set()
+        self._thread.join(timeout)
+
+    def solicitar(self, forcar: bool = False):
+        """Pede uma verificação imediata; com `forcar`, reconstrói mesmo sem mudança"""
+        if forcar:
+            self._forcar = True
+        self._acordar.set()
+
+    def _executar(self):
+        while not self._parar.is_set():
+            try:
+                self.atualizar()
+            except Exception as e:  # a thread não pode morrer: a próxima verificação tenta de novo
+                log(f"⚠️ Falha ao verificar os arquivos: {e}")
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+
+    def atualizar(self) -> bool:
+        """
+        Reconstrói os dados se a versão dos arquivos mudou (e já está estável) ou se foi pedida
+        uma reconstrução forçada. Retorna True se os dados foram trocados.
+        """
+        with self._trava:
+            versao = self.versao_atual()
+            forcar, self._forcar = self._forcar, False
+            primeira_carga = self._atual is None and self._versao_com_erro is None
+
+            if not forcar and not primeira_carga:
+                if self._atual is not None and self._atual[0] == versao:
+                    return False
+                if versao == self._versao_com_erro:
+                    return False
+                # Arquivo mudou desde a última verificação: espera ficar estável
+                if versao != self._versao_vista:
+                    self._versao_vista = versao
+                    return False
+
+            self.reconstruindo = True
+            inicio = time.perf_counter()
+            try:
+                dados = self._construir(versao)
+            except Exception as e:
+                self.ultimo_erro = e
+                self._versao_com_erro = versao
+                log(f"❌ Falha ao recarregar os dados (mantidos os anteriores): {e}")
+                return False
+            finally:
+                self.reconstruindo = False
+                self._pronto.set()
+
+            self._atual = (versao, dados)
+            self._versao_vista = versao
+            self._versao_com_erro = None
+            self.ultimo_erro = None
+            self.reconstrucoes += 1
+            log(f"✅ Dados recarregados em {time.perf_counter() - inicio:.1f}s")
+            return True
+
+    def dados(self, timeout: float = None):
+        """
+        Último conjunto completo como (versao, dados). Só a primeira requisição do processo
+        espera a carga inicial; retorna None se ela falhou ou não terminou dentro de `timeout`.
+        """
+        self._pronto.wait(timeout)
+        return self._atual
+
+    def desatualizado(self) -> bool:
+        """Indica se os arquivos mudaram depois da versão dos dados atuais"""
+        atual = self._atual
+        return atual is None or atual[0] != self.versao_atual()
+
+
+def main():
+    """Observa os arquivos das lojas e registra cada mudança detectada"""
+    from lojas import LOJAS_FILE, arquivos_loja, carregar_lojas
+
+    parser = argparse.ArgumentParser(description="Observa os arquivos de entrada do dashboard")
+    parser.add_argument("--config", default=LOJAS_FILE)
+    parser.add_argument("--intervalo", type=float, default=INTERVALO_OBSERVACAO,
+                        help="segundos entre verificações")
+    args = parser.parse_args()
+
+    def listar_arquivos():
+        arquivos = [args.config]
+        for loja in carregar_lojas(args.config):
+            arquivos += arquivos_loja(loja)
+        return arquivos
+
+    def construir(versao):
+        for arquivo, versao_arquivo_atual in versao:
+            log(f"   {arquivo}: {'ausente' if versao_arquivo_atual is None else versao_arquivo_atual}")
+        return versao
+
+    observador = ObservadorArquivos(listar_arquivos, construir, args.intervalo).iniciar()
+    log(f"Observando os arquivos a cada {args.intervalo:g}s (Ctrl+C para sair)...")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        observador.parar(timeout=args.intervalo)
+
+
+if __name__ == "__main__":
+    main()
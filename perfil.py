@@ -0,0 +1,118 @@
+"""
+Perfil de execução do dashboard
+Mede tempo e memória de cada etapa de uma requisição e grava um registro estruturado
+(JSON Lines) por requisição, para agregar entre sessões.
+
+Ativação: variável de ambiente LUBRIMAX_PERFIL=1 ou parâmetro ?perfil=1 na URL.
+Os registros vão para LUBRIMAX_PERFIL_LOG (padrão: perfil_dashboard.jsonl) e para o
+logger "lubrimax.perfil".
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+VARIAVEL_ATIVACAO = "LUBRIMAX_PERFIL"
+VARIAVEL_LOG = "LUBRIMAX_PERFIL_LOG"
+PERFIL_LOG_FILE = "perfil_dashboard.jsonl"
+
+logger = logging.getLogger("lubrimax.perfil")
+
+_trava = threading.Lock()
+_medicoes_ativas = 0
+_tracemalloc_proprio = False
+
+
+def perfil_por_ambiente() -> bool:
+    """Indica se o perfil foi ligado pela variável de ambiente"""
+    return os.environ.get(VARIAVEL_ATIVACAO, "").strip().lower() in ("1", "true", "sim")
+
+
+def _iniciar_memoria():
+    """Liga o tracemalloc (compartilhado entre as sessões que estão medindo)"""
+    global _medicoes_ativas, _tracemalloc_proprio
+    with _trava:
+        if _medicoes_ativas == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracemalloc_proprio = True
+        _medicoes_ativas += 1
+
+
+def _parar_memoria():
+    """Desliga o tracemalloc quando a última sessão medindo termina"""
+    global _medicoes_ativas, _tracemalloc_proprio
+    with _trava:
+        _medicoes_ativas -= 1
+        if _medicoes_ativas == 0 and _tracemalloc_proprio:
+            tracemalloc.stop()
+            _tracemalloc_proprio = False
+
+
+class Perfilador:
+    """
+    Registra as etapas de uma requisição. Cada chamada a etapa() encerra a anterior.
+    Desativado, não mede nada. Com sessões simultâneas o pico de memória é aproximado,
+    pois o tracemalloc é global ao processo.
+    """
+
+    def __init__(self, ativo: bool, sessao: str = None):
+        self.ativo = ativo
+        self.sessao = sessao
+        self.requisicao = uuid.uuid4().hex[:12]
+        self.etapas = []
+        self._atual = None
+        self._inicio_total = time.perf_counter()
+        if ativo:
+            _iniciar_memoria()
+
+    def etapa(self, nome: str):
+        """Encerra a etapa em andamento e começa a medir `nome`"""
+        if not self.ativo:
+            return
+        self._encerrar_etapa()
+        tracemalloc.reset_peak()
+        memoria_inicial, _ = tracemalloc.get_traced_memory()
+        self._atual = (nome, time.perf_counter(), memoria_inicial)
+
+    def _encerrar_etapa(self):
+        """Fecha a etapa em andamento, se houver"""
+        if self._atual is None:
+            return
+        nome, inicio, memoria_inicial = self._atual
+        memoria_final, pico = tracemalloc.get_traced_memory()
+        self.etapas.append({
+            'etapa': nome,
+            'ms': round((time.perf_counter() - inicio) * 1000, 1),
+            'pico_mb': round(max(pico - memoria_inicial, 0) / 1024 / 1024, 2),
+            'delta_mb': round((memoria_final - memoria_inicial) / 1024 / 1024, 2),
+        })
+        self._atual = None
+
+    def finalizar(self) -> dict:
+        """Encerra a medição e grava o registro da requisição; retorna o registro"""
+        if not self.ativo:
+            return {}
+        self._encerrar_etapa()
+        _parar_memoria()
+        self.ativo = False
+
+        registro = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'sessao': self.sessao,
+            'requisicao': self.requisicao,
+            'total_ms': round((time.perf_counter() - self._inicio_total) * 1000, 1),
+            'etapas': self.etapas,
+        }
+        linha = json.dumps(registro, ensure_ascii=False)
+        logger.info(linha)
+        try:
+            with open(os.environ.get(VARIAVEL_LOG, PERFIL_LOG_FILE), 'a', encoding='utf-8') as f:
+                f.write(linha + '\n')
+        except OSError as e:
+            logger.warning(f"Não foi possível gravar o perfil: {e}")
+        return registro
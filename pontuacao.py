@@ -0,0 +1,455 @@
+"""
+Previsão de retorno por cliente
+Estima, para cada placa, a probabilidade de voltar à loja em até HORIZONTE_DIAS dias depois
+de receber o lembrete e o valor esperado desse retorno. O modelo aprende com as mensagens já
+enviadas (analisar_retorno) e com o histórico de vendas de cada placa até a data do envio:
+quantas visitas, há quantos dias foi a última, intervalo médio entre visitas, ticket médio e
+quantos lembretes a placa já recebeu.
+
+Treino e pontuação são feitos em lote, coluna inteira por coluna inteira: as características
+saem de buscas binárias no índice das vendas (indexar_vendas) e o modelo é uma regressão
+logística ajustada pelo método de Newton com NumPy, sem laço por cliente.
+
+Os MESES_VALIDACAO meses acompanhados mais recentes ficam fora do treino para validar o modelo
+fora do tempo: são previstos por um modelo ajustado só com os meses anteriores. Nos meses de
+treino o previsto é ajustado nas próprias mensagens (dentro da amostra) e não mede acerto.
+
+A rotina diária grava o modelo com a comparação previsto x real por mês (modelo_retorno.json,
+publicado pela rotina e lido pelo dashboard) e a lista de candidatos ao próximo lembrete (placas sem visita há
+MESES_SEM_VISITA meses), ordenada pelo valor esperado.
+
+Uso:
+    python pontuacao.py                          # treina, compara por mês e pontua os candidatos
+    python pontuacao.py --horizonte 60 --meses-sem-visita 6 --saida candidatos.csv
+    python pontuacao.py --meses-validacao 2      # valida nos dois meses acompanhados mais recentes
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from analise_retorno import analisar_retorno, indexar_vendas
+from cache_vendas import gravar_atomico
+from historico import carregar_envios, carregar_envios_segmentados
+from lojas import LOJAS_FILE, carregar_lojas
+from normalizacao import canonizar_placas
+from utilitarios import log
+from vendas import carregar_vendas_loja
+
+MODELO_FILE = "modelo_retorno.json"
+CANDIDATOS_FILE = "candidatos_retorno.csv"
+VERSAO_MODELO = 2
+
+HORIZONTE_DIAS = 60   # retorno previsto: alguma venda da placa até N dias após o envio
+MESES_SEM_VISITA = 6  # candidatos: placas sem venda há pelo menos N meses
+MESES_VALIDACAO = 1   # meses acompanhados mais recentes fora do treino (validação fora do tempo)
+REGULARIZACAO = 1.0   # penalidade L2 dos coeficientes (o intercepto não é penalizado)
+ITERACOES = 25
+
+CARACTERISTICAS = [
+    'log_visitas', 'log_dias_sem_visita', 'log_intervalo_medio', 'log_ticket_medio',
+    'log_lembretes', 'sem_historico', 'visita_unica',
+]
+
+
+# ==================== CARACTERÍSTICAS ====================
+
+def historico_placas(indice: dict, placas, datas) -> pd.DataFrame:
+    """
+    Histórico de vendas de cada (placa, data) até a data, inclusive: visitas, primeira e
+    última visita e valor total. Uma busca binária por linha no índice das vendas.
+    """
+    placas = np.asarray(placas, dtype=str)
+    datas = np.asarray(datas, dtype='datetime64[ns]')
+
+    codigo = np.searchsorted(indice['placas'], placas)
+    existe = codigo < len(indice['placas'])
+    existe[existe] = indice['placas'][codigo[existe]] == placas[existe]
+
+    # Ocorrências da placa com data até `datas`: faixa [inicio, corte) de indice['linhas']
+    base = codigo.astype(np.int64) * len(indice['datas'])
+    posicao = np.searchsorted(indice['datas'], datas, side='right')
+    inicio = np.searchsorted(indice['chaves'], base, side='left')
+    corte = np.searchsorted(indice['chaves'], base + posicao, side='left')
+    visitas = np.where(existe, corte - inicio, 0)
+
+    datas_ocorrencias = indice['data_venda'][indice['linhas']]
+    valores = np.nan_to_num(indice['valor'][indice['linhas']])
+    acumulado = np.concatenate([[0.0], np.cumsum(valores)])
+
+    tem_visita = visitas > 0
+    primeira = np.full(len(placas), np.datetime64('NaT'), dtype='datetime64[ns]')
+    ultima = primeira.copy()
+    primeira[tem_visita] = datas_ocorrencias[inicio[tem_visita]]
+    ultima[tem_visita] = datas_ocorrencias[corte[tem_visita] - 1]
+    return pd.DataFrame({
+        'visitas': visitas,
+        'primeira_visita': primeira,
+        'ultima_visita': ultima,
+        'valor_total': np.where(tem_visita, acumulado[corte] - acumulado[inicio], 0.0),
+    })
+
+
+def lembretes_anteriores(envios: pd.DataFrame) -> np.ndarray:
+    """Quantos lembretes a mesma placa (canônica) recebeu antes de cada mensagem"""
+    ordem = np.lexsort((np.arange(len(envios)), envios['data_envio'].to_numpy()))
+    placas = canonizar_placas(envios['placa']).to_numpy(dtype=str)[ordem]
+    anteriores = np.empty(len(envios), dtype=np.int64)
+    anteriores[ordem] = pd.Series(placas).groupby(placas, sort=False).cumcount().to_numpy()
+    return anteriores
+
+
+def montar_caracteristicas(historico: pd.DataFrame, datas, lembretes) -> pd.DataFrame:
+    """Matriz de características (CARACTERISTICAS) a partir do histórico de cada placa"""
+    datas = np.asarray(datas, dtype='datetime64[ns]')
+    visitas = historico['visitas'].to_numpy()
+    um_dia = np.timedelta64(1, 'D')
+
+    dias_sem_visita = (datas - historico['ultima_visita'].to_numpy()) / um_dia
+    periodo = (historico['ultima_visita'].to_numpy() - historico['primeira_visita'].to_numpy()) / um_dia
+    intervalo = np.divide(periodo, visitas - 1, out=np.zeros(len(visitas)), where=visitas > 1)
+    ticket = np.divide(historico['valor_total'].to_numpy(), visitas, out=np.zeros(len(visitas)), where=visitas > 0)
+
+    return pd.DataFrame({
+        'log_visitas': np.log1p(visitas),
+        'log_dias_sem_visita': np.log1p(np.clip(np.nan_to_num(dias_sem_visita), 0, None)),
+        'log_intervalo_medio': np.log1p(np.clip(intervalo, 0, None)),
+        'log_ticket_medio': np.log1p(np.clip(ticket, 0, None)),
+        'log_lembretes': np.log1p(np.asarray(lembretes, dtype=float)),
+        'sem_historico': (visitas == 0).astype(float),
+        'visita_unica': (visitas == 1).astype(float),
+    })
+
+
+# ==================== MODELO ====================
+
+def _sigmoide(z):
+    return 0.5 * (1.0 + np.tanh(0.5 * z))
+
+
+def _com_intercepto(modelo: dict, caracteristicas: pd.DataFrame) -> np.ndarray:
+    """Características padronizadas pela média e desvio do treino, com a coluna do intercepto"""
+    matriz = caracteristicas[CARACTERISTICAS].to_numpy(dtype=float)
+    matriz = (matriz - np.asarray(modelo['media'])) / np.asarray(modelo['desvio'])
+    return np.column_stack([np.ones(len(matriz)), matriz])
+
+
+def ajustar_logistica(matriz: np.ndarray, alvo: np.ndarray, regularizacao: float = REGULARIZACAO,
+                      iteracoes: int = ITERACOES) -> np.ndarray:
+    """Regressão logística com penalidade L2 pelo método de Newton (IRLS), em lote"""
+    penalidade = np.full(matriz.shape[1], regularizacao)
+    penalidade[0] = 0.0
+    pesos = np.zeros(matriz.shape[1])
+    for _ in range(iteracoes):
+        probabilidade = _sigmoide(matriz @ pesos)
+        gradiente = matriz.T @ (probabilidade - alvo) + penalidade * pesos
+        hessiana = (matriz * (probabilidade * (1 - probabilidade))[:, None]).T @ matriz + np.diag(penalidade)
+        passo = np.linalg.solve(hessiana, gradiente)
+        pesos -= passo
+        if np.abs(passo).max() < 1e-8:
+            break
+    return pesos
+
+
+def area_curva_roc(alvo: np.ndarray, probabilidade: np.ndarray) -> float:
+    """AUC pela estatística de Mann-Whitney (postos médios nos empates)"""
+    positivos = int(alvo.sum())
+    negativos = len(alvo) - positivos
+    if positivos == 0 or negativos == 0:
+        return float('nan')
+    postos = pd.Series(probabilidade).rank(method='average').to_numpy()
+    return float((postos[alvo.astype(bool)].sum() - positivos * (positivos + 1) / 2) / (positivos * negativos))
+
+
+def treinar_modelo(caracteristicas: pd.DataFrame, retornou, valor, regularizacao: float = REGULARIZACAO) -> dict:
+    """
+    Ajusta a probabilidade de retorno (logística) e o valor de quem retornou (regressão do
+    log do valor, com o fator de correção de Duan). O modelo só tem tipos do JSON.
+    """
+    matriz = caracteristicas[CARACTERISTICAS].to_numpy(dtype=float)
+    desvio = matriz.std(axis=0)
+    modelo = {
+        'versao': VERSAO_MODELO,
+        'caracteristicas': CARACTERISTICAS,
+        'media': matriz.mean(axis=0).tolist(),
+        'desvio': np.where(desvio > 0, desvio, 1.0).tolist(),
+    }
+    alvo = np.asarray(retornou, dtype=float)
+    valor = np.asarray(valor, dtype=float)
+    matriz = _com_intercepto(modelo, caracteristicas)
+    modelo['coef_retorno'] = ajustar_logistica(matriz, alvo, regularizacao).tolist()
+
+    # Valor de quem retornou: log-linear, penalizado como a logística
+    com_valor = (alvo > 0) & (valor > 0)
+    if com_valor.sum() > matriz.shape[1]:
+        x, y = matriz[com_valor], np.log(valor[com_valor])
+        penalidade = np.full(matriz.shape[1], regularizacao)
+        penalidade[0] = 0.0
+        coef = np.linalg.solve(x.T @ x + np.diag(penalidade), x.T @ y)
+        modelo['coef_valor'] = coef.tolist()
+        modelo['fator_valor'] = float(np.mean(np.exp(y - x @ coef)))
+    else:
+        media = float(valor[com_valor].mean()) if com_valor.any() else 0.0
+        modelo['coef_valor'] = [np.log(media) if media > 0 else 0.0] + [0.0] * len(CARACTERISTICAS)
+        modelo['fator_valor'] = 1.0 if media > 0 else 0.0
+
+    probabilidade = _sigmoide(matriz @ np.asarray(modelo['coef_retorno']))
+    modelo['treino'] = {
+        'mensagens': int(len(alvo)),
+        'retornos': int(alvo.sum()),
+        'auc': area_curva_roc(alvo, probabilidade),
+    }
+    return modelo
+
+
+def pontuar(modelo: dict, caracteristicas: pd.DataFrame) -> tuple:
+    """(probabilidade de retorno, valor esperado) de cada linha, em lote"""
+    matriz = _com_intercepto(modelo, caracteristicas)
+    probabilidade = _sigmoide(matriz @ np.asarray(modelo['coef_retorno']))
+    valor_retorno = np.exp(matriz @ np.asarray(modelo['coef_valor'])) * modelo['fator_valor']
+    return probabilidade, probabilidade * valor_retorno
+
+
+# ==================== PREVISTO X REAL ====================
+
+def previsto_por_mes(mensagens: pd.DataFrame) -> pd.DataFrame:
+    """
+    Retorno previsto e real de cada mês de envio: taxas (%), retornos e valores.
+    `completo` indica se todas as mensagens do mês já foram acompanhadas pelo horizonte inteiro;
+    nos meses incompletos o real ainda pode crescer. `amostra` é o papel do mês no modelo:
+    'treino' (previsto dentro da amostra), 'validacao' (fora do tempo) ou 'acompanhamento'.
+    """
+    grupos = mensagens.groupby(mensagens['mes_referencia'].astype(str), sort=True)
+    por_mes = pd.DataFrame({
+        'amostra': grupos['amostra'].first(),
+        'mensagens': grupos.size(),
+        'retornos_previstos': grupos['probabilidade'].sum(),
+        'retornos_reais': grupos['retornou'].sum().astype(int),
+        'valor_previsto': grupos['valor_esperado'].sum(),
+        'valor_real': grupos['valor_gerado'].sum(),
+        'completo': grupos['acompanhado'].all(),
+    })
+    por_mes['taxa_prevista'] = por_mes['retornos_previstos'] / por_mes['mensagens'] * 100
+    por_mes['taxa_real'] = por_mes['retornos_reais'] / por_mes['mensagens'] * 100
+    return por_mes.rename_axis('mes').reset_index()
+
+
+def separar_validacao(mensagens: pd.DataFrame, meses_validacao: int = MESES_VALIDACAO) -> pd.Series:
+    """
+    Papel de cada mensagem pelo mês de envio: os `meses_validacao` meses mais recentes com
+    mensagens acompanhadas são 'validacao', os anteriores 'treino' e os demais 'acompanhamento'.
+    Sem ao menos um mês de treino antes deles, não há validação.
+    """
+    mes = mensagens['mes_referencia'].astype(str)
+    acompanhados = sorted(mes[mensagens['acompanhado']].unique())
+    validacao = acompanhados[-meses_validacao:] if 0 < meses_validacao < len(acompanhados) else []
+    amostra = np.select(
+        [mes.isin(validacao), mes.isin(acompanhados)], ['validacao', 'treino'], 'acompanhamento'
+    )
+    return pd.Series(amostra, index=mensagens.index)
+
+
+def _sem_data(modelo: dict) -> str:
+    """Modelo serializado sem `gerado_em`, para comparar dois resultados"""
+    return json.dumps({chave: valor for chave, valor in modelo.items() if chave != 'gerado_em'}, sort_keys=True)
+
+
+def carregar_modelo(caminho=MODELO_FILE) -> dict:
+    """Modelo gravado (vazio se não existir, estiver corrompido ou for de outra versão)"""
+    try:
+        with open(caminho, 'r', encoding='utf-8') as f:
+            modelo = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return modelo if modelo.get('versao') == VERSAO_MODELO else {}
+
+
+# ==================== ROTINA DIÁRIA ====================
+
+def _dados_loja(loja: dict, horizonte: int) -> dict:
+    """
+    Mensagens da loja com retorno no horizonte e características na data do envio, e o fim da
+    observação da loja (última venda registrada, com ou sem placa; None sem vendas)
+    """
+    if Path(loja['historico']).is_dir():
+        envios = carregar_envios_segmentados(loja['historico'])
+    else:
+        envios = carregar_envios(loja['historico'])
+    df_vendas = carregar_vendas_loja(loja['vendas'])
+    indice = indexar_vendas(df_vendas)
+
+    datas_venda = indice['data_venda'][~np.isnat(indice['data_venda'])]
+    fim_observacao = pd.Timestamp(datas_venda.max()) if len(datas_venda) else None
+
+    mensagens = analisar_retorno(envios, df_vendas, indice=indice, janela_dias=horizonte)
+    if not mensagens.empty:
+        datas = mensagens['data_envio'].to_numpy(dtype='datetime64[ns]')
+        historico = historico_placas(indice, canonizar_placas(mensagens['placa']).to_numpy(dtype=str), datas)
+        caracteristicas = montar_caracteristicas(historico, datas, lembretes_anteriores(mensagens))
+        mensagens = pd.concat([mensagens.assign(loja=loja['nome']), caracteristicas], axis=1)
+    return {
+        'loja': loja['nome'], 'envios': envios, 'df_vendas': df_vendas, 'indice': indice,
+        'mensagens': mensagens, 'fim_observacao': fim_observacao,
+    }
+
+
+def candidatos_loja(dados: dict, modelo: dict, meses_sem_visita: int) -> pd.DataFrame:
+    """Placas da loja sem venda há `meses_sem_visita` meses, pontuadas na última venda da loja"""
+    indice = dados['indice']
+    placas = indice['placas']
+    data_referencia = dados['fim_observacao']
+    if len(placas) == 0 or data_referencia is None:
+        return pd.DataFrame()
+
+    datas = np.full(len(placas), np.datetime64(data_referencia, 'ns'))
+    historico = historico_placas(indice, placas, datas)
+    limite = pd.Timestamp(data_referencia) - pd.DateOffset(months=meses_sem_visita)
+    elegivel = (historico['visitas'] > 0) & (historico['ultima_visita'] <= limite)
+
+    envios = dados['envios']
+    lembretes = pd.Series(canonizar_placas(envios['placa']).to_numpy(dtype=str)).value_counts()
+    lembretes = lembretes.reindex(placas, fill_value=0).to_numpy()
+
+    caracteristicas = montar_caracteristicas(historico, datas, lembretes)
+    probabilidade, valor_esperado = pontuar(modelo, caracteristicas)
+    candidatos = pd.DataFrame({
+        'loja': dados['loja'],
+        'placa': placas,
+        'visitas': historico['visitas'],
+        'ultima_visita': historico['ultima_visita'],
+        'ticket_medio': np.divide(historico['valor_total'], historico['visitas'].clip(lower=1)),
+        'lembretes': lembretes,
+        'probabilidade': probabilidade,
+        'valor_esperado': valor_esperado,
+    })[elegivel.to_numpy()]
+
+    # Nome do cliente na última venda da placa
+    if 'CLIENTE' in dados['df_vendas'].columns and not candidatos.empty:
+        fim = np.searchsorted(indice['chaves'], (np.flatnonzero(elegivel) + 1) * len(indice['datas'])) - 1
+        candidatos.insert(2, 'cliente', dados['df_vendas']['CLIENTE'].to_numpy()[indice['linhas'][fim]])
+    return candidatos
+
+
+def gerar_pontuacao(config=LOJAS_FILE, saida_modelo=MODELO_FILE, saida_candidatos=CANDIDATOS_FILE,
+                    horizonte: int = HORIZONTE_DIAS, meses_sem_visita: int = MESES_SEM_VISITA,
+                    meses_validacao: int = MESES_VALIDACAO) -> dict:
+    """
+    Treina com as mensagens já acompanhadas pelo horizonte inteiro, valida fora do tempo nos
+    `meses_validacao` meses acompanhados mais recentes, compara previsto x real por mês e grava
+    o modelo e os candidatos ao próximo lembrete. Retorna o modelo (vazio se não houver
+    mensagens acompanhadas o bastante para treinar).
+    """
+    lojas = [_dados_loja(loja, horizonte) for loja in carregar_lojas(config)]
+    mensagens = [dados['mensagens'] for dados in lojas if not dados['mensagens'].empty]
+    if not mensagens:
+        log("⚠️ Nenhuma mensagem para treinar o modelo")
+        return {}
+    mensagens = pd.concat(mensagens, ignore_index=True)
+
+    # Só mensagens observadas por `horizonte` dias até a última venda registrada da própria
+    # loja entram no treino: uma loja com vendas que terminam antes não gera falsos "não voltou"
+    fim_observacao = {d['loja']: d['fim_observacao'] for d in lojas}
+    fim_loja = pd.to_datetime(mensagens['loja'].map(fim_observacao))
+    mensagens['acompanhado'] = mensagens['data_envio'] + pd.Timedelta(days=horizonte) <= fim_loja
+    treino = mensagens[mensagens['acompanhado']]
+    if treino.empty or treino['retornou'].nunique() < 2:
+        log(f"⚠️ Poucas mensagens acompanhadas por {horizonte} dias para treinar o modelo")
+        return {}
+
+    # Modelo final (candidatos e meses em acompanhamento): todas as mensagens acompanhadas
+    modelo = treinar_modelo(treino, treino['retornou'], treino['valor_gerado'])
+    mensagens['probabilidade'], mensagens['valor_esperado'] = pontuar(modelo, mensagens)
+
+    # Validação fora do tempo: os meses mais recentes previstos por um modelo sem eles
+    mensagens['amostra'] = separar_validacao(mensagens, meses_validacao)
+    validar = (mensagens['amostra'] == 'validacao').to_numpy()
+    anteriores = treino[mensagens.loc[treino.index, 'amostra'] == 'treino']
+    validacao = None
+    if validar.any() and anteriores['retornou'].nunique() == 2:
+        modelo_anterior = treinar_modelo(anteriores, anteriores['retornou'], anteriores['valor_gerado'])
+        probabilidade, valor_esperado = pontuar(modelo_anterior, mensagens[validar])
+        mensagens.loc[validar, 'probabilidade'] = probabilidade
+        mensagens.loc[validar, 'valor_esperado'] = valor_esperado
+        avaliadas = mensagens[validar & mensagens['acompanhado'].to_numpy()]
+        validacao = {
+            'meses': sorted(avaliadas['mes_referencia'].astype(str).unique()),
+            'mensagens': int(len(avaliadas)),
+            'retornos': int(avaliadas['retornou'].sum()),
+            'auc': area_curva_roc(avaliadas['retornou'].to_numpy(dtype=float), avaliadas['probabilidade'].to_numpy()),
+        }
+    else:
+        # Sem meses anteriores para treinar à parte, todos os meses acompanhados são treino
+        mensagens['amostra'] = np.where(mensagens['amostra'] == 'validacao', 'treino', mensagens['amostra'])
+        log("ℹ️ Sem meses acompanhados suficientes para validar fora do tempo: "
+            "o previsto dos meses de treino é dentro da amostra")
+    por_mes = previsto_por_mes(mensagens)
+
+    modelo['treino']['meses'] = sorted(por_mes.loc[por_mes['amostra'] == 'treino', 'mes'])
+    modelo.update({
+        'gerado_em': pd.Timestamp.now().isoformat(timespec='seconds'),
+        'horizonte_dias': horizonte,
+        'fim_observacao': {
+            loja: fim.isoformat() for loja, fim in fim_observacao.items() if fim is not None
+        },
+        'validacao': validacao,
+        'por_mes': por_mes.to_dict(orient='list'),
+    })
+    anterior = carregar_modelo(saida_modelo)
+    if _sem_data(anterior) == _sem_data(modelo):
+        # Mesmo resultado: mantém o arquivo (e a data) para a automação não publicar só o horário
+        modelo['gerado_em'] = anterior['gerado_em']
+        situacao = f"igual ao de {saida_modelo}, mantido"
+    else:
+        gravar_atomico(saida_modelo, lambda tmp: Path(tmp).write_text(
+            json.dumps(modelo, ensure_ascii=False, indent=2), encoding='utf-8'
+        ))
+        situacao = f"gravado em {saida_modelo}"
+    treino_info = modelo['treino']
+    log(f"✅ Modelo treinado com {treino_info['mensagens']:,} mensagens "
+        f"({treino_info['retornos']:,} retornos, AUC {treino_info['auc']:.2f}) e {situacao}")
+    if validacao:
+        log(f"   Validação fora do tempo ({', '.join(validacao['meses'])}): {validacao['mensagens']:,} mensagens, "
+            f"{validacao['retornos']:,} retornos, AUC {validacao['auc']:.2f}")
+
+    candidatos = pd.concat(
+        [candidatos_loja(dados, modelo, meses_sem_visita) for dados in lojas],
+        ignore_index=True
+    )
+    if candidatos.empty:
+        log(f"ℹ️ Nenhuma placa sem visita há {meses_sem_visita} meses")
+    else:
+        candidatos = candidatos.sort_values(['valor_esperado', 'probabilidade'], ascending=False, kind='stable')
+        gravar_atomico(saida_candidatos, lambda tmp: candidatos.to_csv(tmp, index=False, float_format='%.4f'))
+        log(f"✅ {len(candidatos):,} candidatos pontuados em {saida_candidatos}")
+    return modelo
+
+
+def main():
+    """Treina o modelo de retorno, compara previsto x real por mês e pontua os candidatos"""
+    parser = argparse.ArgumentParser(description="Probabilidade e valor esperado de retorno por cliente")
+    parser.add_argument("--config", default=LOJAS_FILE,
+                        help="lista de lojas (sem o arquivo, usa a loja única)")
+    parser.add_argument("--horizonte", type=int, default=HORIZONTE_DIAS,
+                        help="dias após o envio em que uma venda conta como retorno")
+    parser.add_argument("--meses-sem-visita", type=int, default=MESES_SEM_VISITA,
+                        help="candidatos: placas sem venda há pelo menos N meses")
+    parser.add_argument("--meses-validacao", type=int, default=MESES_VALIDACAO,
+                        help="meses acompanhados mais recentes fora do treino, para validar o modelo")
+    parser.add_argument("--modelo", default=MODELO_FILE)
+    parser.add_argument("--saida", default=CANDIDATOS_FILE, help="CSV com os candidatos pontuados")
+    args = parser.parse_args()
+
+    modelo = gerar_pontuacao(args.config, args.modelo, args.saida, args.horizonte, args.meses_sem_visita,
+                             args.meses_validacao)
+    if modelo:
+        por_mes = pd.DataFrame(modelo['por_mes'])
+        log("Previsto x real por mês:\n" + por_mes[[
+            'mes', 'amostra', 'mensagens', 'taxa_prevista', 'taxa_real', 'valor_previsto', 'valor_real', 'completo'
+        ]].to_string(index=False, float_format='{:.1f}'.format))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+Relatório pré-calculado do dashboard
+Roda fora do Streamlit (pela automação diária ou pela linha de comando): faz a análise por
+cliente e calcula todos os agregados da página (métricas principais, valor por mês,
+histograma de dias até o retorno e ROI). Tudo vai para um único Parquet, com os agregados
+e o hash dos arquivos de entrada nos metadados. O dashboard só carrega esse arquivo
+enquanto as entradas não mudarem.
+
+Uso:
+    python relatorio.py                 # gera o relatório se as entradas mudaram
+    python relatorio.py --forcar        # regera sempre
+    python relatorio.py --config lojas.json --saida relatorio_retorno.parquet
+    python relatorio.py --janela 60 --regra ultimo_toque
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from analise_incremental import ESTADO_FILE, ESTADO_META_FILE, analisar_retorno_incremental
+from analise_retorno import REGRA_PADRAO, REGRAS_ATRIBUICAO, analisar_retorno
+from cache_vendas import PARQUET_DISPONIVEL, calcular_hash, gravar_atomico
+from historico import carregar_envios, carregar_envios_segmentados
+from lojas import LOJAS_FILE, analisar_lojas, arquivos_loja, carregar_lojas
+from utilitarios import log
+from vendas import carregar_vendas_loja
+
+RELATORIO_FILE = "relatorio_retorno.parquet"
+VERSAO_RELATORIO = 2  # 2: placas canônicas (padrão antigo = Mercosul) e valores com milhar
+CHAVE_METADADOS = b"lubrimax"
+
+CUSTO_POR_MENSAGEM = 0.05  # Custo estimado por mensagem (ajustar conforme necessidade)
+BINS_HISTOGRAMA = 20
+
+MESES_PT = {
+    '01': 'Jan', '02': 'Fev', '03': 'Mar', '04': 'Abr',
+    '05': 'Mai', '06': 'Jun', '07': 'Jul', '08': 'Ago',
+    '09': 'Set', '10': 'Out', '11': 'Nov', '12': 'Dez'
+}
+
+
+def formatar_mes(mes) -> str:
+    """Formata o mês para exibição amigável (2025-12 -> Dez/2025)"""
+    mes = str(mes)
+    if '-' not in mes:
+        return mes
+    ano, numero = mes.split('-')[:2]
+    return f"{MESES_PT.get(numero, numero)}/{ano}"
+
+
+def _histograma_dias(dias: pd.Series) -> dict:
+    """Contagem de clientes por faixa de dias até o retorno (faixas inteiras, até BINS_HISTOGRAMA)"""
+    dias = dias.dropna().to_numpy()
+    if len(dias) == 0:
+        return {'inicio': [], 'fim': [], 'clientes': []}
+
+    minimo, maximo = int(dias.min()), int(dias.max())
+    largura = max(1, -(-(maximo - minimo + 1) // BINS_HISTOGRAMA))
+    faixas = -(-(maximo - minimo + 1) // largura)
+    limites = minimo + largura * np.arange(faixas + 1)
+    clientes, _ = np.histogram(dias, bins=limites)
+    return {
+        'inicio': limites[:-1].tolist(),
+        'fim': limites[1:].tolist(),
+        'clientes': clientes.tolist(),
+    }
+
+
+def calcular_agregados(df_analise: pd.DataFrame, custo_por_mensagem: float = CUSTO_POR_MENSAGEM) -> dict:
+    """
+    Métricas principais, valor por mês, histograma de dias até o retorno e ROI.
+    O resultado só tem tipos do JSON, para ir nos metadados do relatório.
+    """
+    total_enviados = len(df_analise)
+    total_retornos = int(df_analise['retornou'].sum())
+    valor_total_gerado = float(df_analise['valor_gerado'].sum())
+    dias_retorno = df_analise.loc[df_analise['retornou'], 'dias_ate_retorno']
+    media_dias_retorno = dias_retorno.mean()
+    custo_total = total_enviados * custo_por_mensagem
+
+    por_mes = df_analise.groupby('mes_referencia', observed=True).agg(
+        valor_gerado=('valor_gerado', 'sum'),
+        retornos=('retornou', 'sum')
+    ).reset_index()
+
+    return {
+        'metricas': {
+            'total_enviados': total_enviados,
+            'total_retornos': total_retornos,
+            'taxa_retorno': (total_retornos / total_enviados * 100) if total_enviados > 0 else 0,
+            'valor_total_gerado': valor_total_gerado,
+            'media_dias_retorno': None if pd.isna(media_dias_retorno) else float(media_dias_retorno),
+        },
+        'roi': {
+            'custo_por_mensagem': custo_por_mensagem,
+            'custo_total': custo_total,
+            'roi': ((valor_total_gerado - custo_total) / custo_total * 100) if custo_total > 0 else 0,
+        },
+        'por_mes': {
+            'mes': por_mes['mes_referencia'].astype(str).tolist(),
+            'mes_formatado': [formatar_mes(mes) for mes in por_mes['mes_referencia']],
+            'valor_gerado': por_mes['valor_gerado'].astype(float).tolist(),
+            'retornos': por_mes['retornos'].astype(int).tolist(),
+        },
+        'histograma': _histograma_dias(dias_retorno),
+    }
+
+
+def atribuicao_relatorio(janela_dias: int = None, regra: str = REGRA_PADRAO) -> dict:
+    """Configuração de atribuição gravada nos metadados do relatório"""
+    return {'janela_dias': janela_dias, 'regra': regra}
+
+
+def entradas_relatorio(config, base, hash_arquivo=calcular_hash) -> dict:
+    """
+    Hash de cada arquivo de entrada (lojas.json, se existir, e os arquivos de cada loja),
+    pelo caminho relativo à pasta do relatório; None para arquivos que não existem.
+    """
+    arquivos = [Path(config)] if Path(config).exists() else []
+    for loja in carregar_lojas(config):
+        arquivos += arquivos_loja(loja)
+
+    entradas = {}
+    for arquivo in arquivos:
+        chave = Path(os.path.relpath(arquivo, base)).as_posix()
+        entradas[chave] = hash_arquivo(arquivo) if Path(arquivo).exists() else None
+    return entradas
+
+
+def analisar(lojas: list, varias_lojas: bool, base, janela_dias: int = None,
+             regra: str = REGRA_PADRAO) -> pd.DataFrame:
+    """Análise por cliente: consolidada das lojas ou, sem lojas.json, a da loja única"""
+    if varias_lojas:
+        return analisar_lojas(lojas, janela_dias=janela_dias, regra=regra)
+
+    loja = lojas[0]
+    if Path(loja['historico']).is_dir():
+        envios = carregar_envios_segmentados(loja['historico'])
+    else:
+        envios = carregar_envios(loja['historico'])
+    df_vendas = carregar_vendas_loja(loja['vendas'])
+    if janela_dias is not None or regra != REGRA_PADRAO:
+        return analisar_retorno(envios, df_vendas, janela_dias=janela_dias, regra=regra)
+    return analisar_retorno_incremental(
+        envios, df_vendas,
+        caminho_estado=Path(base) / ESTADO_FILE,
+        caminho_meta=Path(base) / ESTADO_META_FILE
+    )
+
+
+def gravar_relatorio(caminho, df_analise: pd.DataFrame, agregados: dict, entradas: dict,
+                     atribuicao: dict = None):
+    """Grava a análise em Parquet com agregados, entradas e atribuição nos metadados do arquivo"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    tabela = pa.Table.from_pandas(df_analise, preserve_index=False)
+    metadados = {
+        'versao': VERSAO_RELATORIO,
+        'gerado_em': pd.Timestamp.now().isoformat(timespec='seconds'),
+        'entradas': entradas,
+        'atribuicao': atribuicao or atribuicao_relatorio(),
+        'agregados': agregados,
+    }
+    tabela = tabela.replace_schema_metadata({
+        **(tabela.schema.metadata or {}),
+        CHAVE_METADADOS: json.dumps(metadados, ensure_ascii=False).encode('utf-8'),
+    })
+    gravar_atomico(caminho, lambda tmp: pq.write_table(tabela, tmp, compression='zstd'))
+
+
+def ler_metadados(caminho) -> dict:
+    """Metadados do relatório (vazio se não existir, estiver corrompido ou for de outra versão)"""
+    if not PARQUET_DISPONIVEL:
+        return {}
+    import pyarrow.parquet as pq
+    try:
+        bruto = (pq.read_schema(caminho).metadata or {}).get(CHAVE_METADADOS)
+        metadados = json.loads(bruto) if bruto else {}
+    except (OSError, ValueError):
+        return {}
+    return metadados if metadados.get('versao') == VERSAO_RELATORIO else {}
+
+
+def carregar_relatorio(caminho=RELATORIO_FILE, entradas: dict = None, atribuicao: dict = None):
+    """
+    Retorna (df_analise, agregados) do relatório gravado, ou None se não houver relatório
+    válido. Com `entradas`, o relatório só vale se foi gerado exatamente desses arquivos;
+    com `atribuicao`, só se foi gerado com essa janela e regra.
+    """
+    metadados = ler_metadados(caminho)
+    if not metadados:
+        return None
+    if entradas is not None and metadados['entradas'] != entradas:
+        return None
+    if atribuicao is not None and metadados.get('atribuicao', atribuicao_relatorio()) != atribuicao:
+        return None
+    try:
+        df_analise = pd.read_parquet(caminho)
+    except (OSError, ValueError) as e:
+        log(f"⚠️ Relatório ilegível: {e}")
+        return None
+    return df_analise, metadados['agregados']
+
+
+def gerar_relatorio(config=LOJAS_FILE, saida=RELATORIO_FILE, forcar: bool = False,
+                    janela_dias: int = None, regra: str = REGRA_PADRAO) -> bool:
+    """
+    Gera o relatório das lojas de `config` (ou da loja única, sem o arquivo).
+    Não faz nada se o relatório gravado já corresponde às entradas e à atribuição atuais.
+    Retorna True se o relatório foi gravado.
+    """
+    base = Path(saida).parent
+    varias_lojas = Path(config).exists()
+    entradas = entradas_relatorio(config, base)
+
+    if None in entradas.values():
+        faltando = [arquivo for arquivo, sha in entradas.items() if sha is None]
+        log(f"⚠️ Arquivos não encontrados, relatório não gerado: {', '.join(faltando)}")
+        return False
+
+    atribuicao = atribuicao_relatorio(janela_dias, regra)
+    metadados = ler_metadados(saida)
+    if (not forcar and metadados.get('entradas') == entradas
+            and metadados.get('atribuicao', atribuicao_relatorio()) == atribuicao):
+        log(f"ℹ️ {saida} já está atualizado")
+        return False
+
+    df_analise = analisar(carregar_lojas(config), varias_lojas, base, janela_dias, regra)
+    if df_analise.empty:
+        log("⚠️ Nenhum dado para análise, relatório não gerado")
+        return False
+
+    agregados = calcular_agregados(df_analise)
+    gravar_relatorio(saida, df_analise, agregados, entradas, atribuicao)
+    log(f"✅ Relatório gravado em {saida} ({len(df_analise):,} mensagens)")
+    return True
+
+
+def main():
+    """Gera o relatório pré-calculado do dashboard"""
+    parser = argparse.ArgumentParser(description="Pré-calcula a análise e os agregados do dashboard")
+    parser.add_argument("--config", default=LOJAS_FILE,
+                        help="lista de lojas (sem o arquivo, analisa a loja única)")
+    parser.add_argument("--saida", default=RELATORIO_FILE)
+    parser.add_argument("--forcar", action="store_true",
+                        help="regera o relatório mesmo que as entradas não tenham mudado")
+    parser.add_argument("--janela", type=int,
+                        help="só conta vendas até N dias após o envio (padrão: sem limite)")
+    parser.add_argument("--regra", choices=list(REGRAS_ATRIBUICAO), default=REGRA_PADRAO,
+                        help="atribuição de cada venda: a todas as mensagens anteriores ou a um só toque")
+    args = parser.parse_args()
+
+    if not PARQUET_DISPONIVEL:
+        log("❌ pyarrow não está instalado; o relatório não pode ser gerado")
+        raise SystemExit(1)
+
+    gerar_relatorio(args.config, args.saida, forcar=args.forcar, janela_dias=args.janela, regra=args.regra)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+"""
+Utilitários comuns aos módulos do dashboard e às rotinas de linha de comando
+"""
+
+from datetime import datetime
+
+
+def log(mensagem):
+    """Registra mensagem com timestamp"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] {mensagem}")
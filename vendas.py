@@ -0,0 +1,194 @@
+"""
+Vendas em base + deltas
+Em vez de publicar a planilha inteira a cada atualização, as vendas ficam em vendas/:
+uma base Parquet e arquivos delta só com as linhas acrescentadas desde a última
+sincronização. Quando os deltas se acumulam eles são compactados de volta em uma nova base.
+
+O índice (vendas/indice.json) lista a base e os deltas, a quantidade de linhas já exportadas
+e o hash dessas linhas, para perceber quando a planilha mudou no meio e a base precisa ser refeita.
+
+Uso:
+    python vendas.py                          # exporta as vendas novas de Vendas_Lubrimax.xlsx
+    python vendas.py outra.xlsx --destino vendas
+    python vendas.py --compactar              # junta os deltas em uma nova base
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from cache_vendas import PARQUET_DISPONIVEL, carregar_vendas_cache, gravar_atomico
+from utilitarios import log
+
+DIRETORIO_VENDAS = "vendas"
+INDICE_VENDAS = "indice.json"
+VERSAO_INDICE = 1
+MAX_DELTAS = 30  # Com a sincronização diária, compacta cerca de uma vez por mês
+
+
+def caminho_indice_vendas(diretorio=DIRETORIO_VENDAS) -> Path:
+    """Caminho do índice das vendas em base + deltas"""
+    return Path(diretorio) / INDICE_VENDAS
+
+
+def ler_indice_vendas(diretorio=DIRETORIO_VENDAS) -> dict:
+    """Lê o índice {base, deltas, colunas, linhas, hash_linhas, sequencia}"""
+    try:
+        with open(caminho_indice_vendas(diretorio), 'r', encoding='utf-8') as f:
+            indice = json.load(f)
+        if indice.get('versao') == VERSAO_INDICE:
+            return indice
+    except (OSError, ValueError):
+        pass
+    return {'versao': VERSAO_INDICE, 'base': None, 'deltas': [], 'colunas': [],
+            'linhas': 0, 'hash_linhas': None, 'sequencia': 0}
+
+
+def _gravar_indice(indice: dict, diretorio):
+    """Grava o índice de forma atômica: ele é quem decide quais arquivos valem"""
+    gravar_atomico(
+        caminho_indice_vendas(diretorio),
+        lambda tmp: tmp.write_text(json.dumps(indice, ensure_ascii=False, indent=1), encoding='utf-8')
+    )
+
+
+def hash_linhas(df_vendas: pd.DataFrame, linhas: int) -> str:
+    """Hash das primeiras `linhas` vendas, em todas as colunas"""
+    valores = pd.util.hash_pandas_object(df_vendas.iloc[:linhas], index=False)
+    return hashlib.sha256(valores.to_numpy().tobytes()).hexdigest()
+
+
+def carregar_vendas_delta(diretorio=DIRETORIO_VENDAS) -> pd.DataFrame:
+    """Une a base e os deltas na ordem da planilha (DataFrame vazio se não houver base)"""
+    indice = ler_indice_vendas(diretorio)
+    if indice['base'] is None:
+        return pd.DataFrame()
+    partes = [pd.read_parquet(Path(diretorio) / arquivo) for arquivo in [indice['base']] + indice['deltas']]
+    return pd.concat(partes, ignore_index=True) if len(partes) > 1 else partes[0]
+
+
+def carregar_vendas_loja(caminho) -> pd.DataFrame:
+    """
+    Vendas de uma loja: da pasta base + deltas ou da planilha (via cache Parquet).
+    Com LUBRIMAX_VENDAS_COMPACTAS=1, só as colunas da análise, em tipos compactos.
+    """
+    # Importado aqui: vendas_compactas usa o índice das vendas deste módulo
+    from vendas_compactas import carregar_vendas_compactas, leitura_compacta_ativada
+    if leitura_compacta_ativada():
+        return carregar_vendas_compactas(caminho)
+    if Path(caminho).is_dir():
+        return carregar_vendas_delta(caminho)
+    return carregar_vendas_cache(caminho)
+
+
+def _proximo_arquivo(indice: dict, prefixo: str) -> str:
+    """Nome novo para base ou delta; nunca reaproveita um nome já publicado"""
+    indice['sequencia'] += 1
+    return f"{prefixo}_{indice['sequencia']:05d}.parquet"
+
+
+def _substituir_base(df_vendas: pd.DataFrame, indice: dict, diretorio):
+    """
+    Grava uma nova base com todas as vendas e descarta a base e os deltas anteriores.
+    Os arquivos antigos só são apagados depois que o índice aponta para a nova base.
+    """
+    antigos = ([indice['base']] if indice['base'] else []) + indice['deltas']
+    indice['base'] = _proximo_arquivo(indice, 'base')
+    indice['deltas'] = []
+    gravar_atomico(Path(diretorio) / indice['base'], lambda tmp: df_vendas.to_parquet(tmp, index=False))
+    _gravar_indice(indice, diretorio)
+
+    for arquivo in antigos:
+        (Path(diretorio) / arquivo).unlink(missing_ok=True)
+
+
+def compactar_vendas(diretorio=DIRETORIO_VENDAS) -> bool:
+    """Junta base e deltas em uma nova base; retorna False se não havia deltas"""
+    indice = ler_indice_vendas(diretorio)
+    if not indice['deltas']:
+        return False
+    _substituir_base(carregar_vendas_delta(diretorio), indice, diretorio)
+    return True
+
+
+def exportar_vendas(df_vendas: pd.DataFrame, diretorio=DIRETORIO_VENDAS, max_deltas: int = MAX_DELTAS) -> dict:
+    """
+    Exporta para a pasta só as vendas acrescentadas desde a última exportação.
+    Se as linhas já exportadas mudaram (ou as colunas), grava uma base nova com tudo.
+    Retorna {'acao': 'base' | 'delta' | 'nenhuma', 'linhas': linhas gravadas, 'compactado': bool}.
+    """
+    diretorio = Path(diretorio)
+    diretorio.mkdir(parents=True, exist_ok=True)
+    indice = ler_indice_vendas(diretorio)
+    exportadas = indice['linhas']
+    colunas = [str(coluna) for coluna in df_vendas.columns]
+
+    refazer = (
+        indice['base'] is None
+        or indice['colunas'] != colunas
+        or exportadas > len(df_vendas)
+        or indice['hash_linhas'] != hash_linhas(df_vendas, exportadas)
+    )
+    if not refazer and exportadas == len(df_vendas):
+        return {'acao': 'nenhuma', 'linhas': 0, 'compactado': False}
+
+    indice['colunas'] = colunas
+    indice['linhas'] = len(df_vendas)
+    indice['hash_linhas'] = hash_linhas(df_vendas, len(df_vendas))
+
+    if refazer:
+        _substituir_base(df_vendas, indice, diretorio)
+        return {'acao': 'base', 'linhas': len(df_vendas), 'compactado': False}
+
+    # As linhas novas herdam os tipos das colunas da planilha inteira, iguais aos da base
+    novas = df_vendas.iloc[exportadas:]
+    delta = _proximo_arquivo(indice, 'delta')
+    gravar_atomico(diretorio / delta, lambda tmp: novas.to_parquet(tmp, index=False))
+    indice['deltas'].append(delta)
+    _gravar_indice(indice, diretorio)
+
+    compactado = len(indice['deltas']) >= max_deltas and compactar_vendas(diretorio)
+    return {'acao': 'delta', 'linhas': len(novas), 'compactado': compactado}
+
+
+def main():
+    """Exporta as vendas novas da planilha para a pasta base + deltas"""
+    parser = argparse.ArgumentParser(description="Exporta as vendas para vendas/ (base + deltas)")
+    parser.add_argument("origem", nargs="?", default="Vendas_Lubrimax.xlsx")
+    parser.add_argument("--destino", default=DIRETORIO_VENDAS)
+    parser.add_argument("--compactar", action="store_true",
+                        help="junta os deltas existentes em uma nova base, sem ler a planilha")
+    args = parser.parse_args()
+
+    if not PARQUET_DISPONIVEL:
+        log("❌ pyarrow não está instalado; as vendas não podem ser exportadas")
+        raise SystemExit(1)
+
+    if args.compactar:
+        if compactar_vendas(args.destino):
+            log(f"✅ Deltas de {args.destino} compactados em uma nova base")
+        else:
+            log(f"ℹ️ Nenhum delta para compactar em {args.destino}")
+        return
+
+    if not os.path.exists(args.origem):
+        log(f"❌ {args.origem} não encontrado")
+        raise SystemExit(1)
+
+    resultado = exportar_vendas(carregar_vendas_cache(args.origem), args.destino)
+    if resultado['acao'] == 'nenhuma':
+        log(f"ℹ️ Nenhuma venda nova em {args.origem}")
+    elif resultado['acao'] == 'base':
+        log(f"✅ Base de vendas regravada ({resultado['linhas']:,} linhas)")
+    else:
+        log(f"✅ Delta com {resultado['linhas']:,} vendas novas")
+    if resultado['compactado']:
+        log("✅ Deltas compactados em uma nova base")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Leitura compacta das vendas
+Modo de leitura para ambientes com pouca memória (ex.: Streamlit Cloud): só as colunas usadas
+na análise (EMISSÃO, TOTAL VENDA, CLIENTE, IDENTIFICAÇÃO e OBSERVAÇÃO) são lidas, em blocos
+de TAMANHO_BLOCO linhas, e cada bloco já sai com tipos compactos:
+
+- EMISSÃO: datetime64 (já normalizada; as datas rejeitadas ficam contadas em `attrs`)
+- TOTAL VENDA: float32 quando todos os valores cabem exatos em centavos; senão float64
+- CLIENTE, IDENTIFICAÇÃO, OBSERVAÇÃO: categorias quando se repetem; senão texto do pandas
+
+A planilha é percorrida com o openpyxl em modo read-only (linha a linha, sem montar a planilha
+inteira); o cache Parquet e as vendas em base + deltas são lidos por lotes só dessas colunas.
+Os textos de cada bloco viram códigos inteiros (int32) de um dicionário de valores distintos que
+cresce bloco a bloco, sem guardar os textos repetidos. O pico de memória acompanha o tamanho
+final compacto (mais os códigos, os valores distintos e um bloco), não o texto de todas as
+linhas; em texto quase todo distinto (ex.: OBSERVAÇÃO livre) o dicionário tem o tamanho da
+própria coluna.
+
+Ativação: variável de ambiente LUBRIMAX_VENDAS_COMPACTAS=1 (dashboard e análise por loja).
+
+Uso:
+    python vendas_compactas.py                       # compara a memória das duas leituras
+    python vendas_compactas.py outra.xlsx --bloco 20000
+"""
+
+import argparse
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cache_vendas import PARQUET_DISPONIVEL, SHEET_VENDAS, cache_valido, caminhos_cache
+from normalizacao import COLUNA_DATA, COLUNA_VALOR, COLUNAS_PLACA, normalizar_datas, normalizar_valores
+from utilitarios import log
+from vendas import ler_indice_vendas
+
+VARIAVEL_ATIVACAO = "LUBRIMAX_VENDAS_COMPACTAS"
+COLUNAS_COMPACTAS = [COLUNA_DATA, COLUNA_VALOR, "CLIENTE"] + COLUNAS_PLACA
+TAMANHO_BLOCO = 50_000
+MAX_CATEGORIAS = 0.5  # texto vira categoria se tiver no máximo 50% de valores distintos
+
+
+def leitura_compacta_ativada() -> bool:
+    """Indica se a leitura compacta foi ligada pela variável de ambiente"""
+    return os.environ.get(VARIAVEL_ATIVACAO, "").strip().lower() in ("1", "true", "sim")
+
+
+# ==================== BLOCOS ====================
+
+def blocos_excel(arquivo, colunas=COLUNAS_COMPACTAS, tamanho_bloco: int = TAMANHO_BLOCO):
+    """
+    Blocos de até `tamanho_bloco` linhas da planilha, só com as `colunas` pedidas, lidos
+    linha a linha pelo openpyxl em modo read-only. Linhas vazias nessas colunas são puladas.
+    """
+    from openpyxl import load_workbook
+
+    livro = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        linhas = livro[SHEET_VENDAS].iter_rows(values_only=True)
+        cabecalho = [str(nome).strip() if nome is not None else '' for nome in next(linhas, ())]
+        faltando = [coluna for coluna in colunas if coluna not in cabecalho]
+        if faltando:
+            raise ValueError(f"Colunas ausentes em {arquivo}: {', '.join(faltando)}")
+        posicoes = [cabecalho.index(coluna) for coluna in colunas]
+
+        bloco = []
+        for linha in linhas:
+            valores = tuple(linha[p] if p < len(linha) else None for p in posicoes)
+            if all(v is None or v == '' for v in valores):
+                continue
+            bloco.append(valores)
+            if len(bloco) == tamanho_bloco:
+                yield pd.DataFrame(bloco, columns=colunas, dtype=object)
+                bloco = []
+        if bloco:
+            yield pd.DataFrame(bloco, columns=colunas, dtype=object)
+    finally:
+        livro.close()
+
+
+def blocos_parquet(arquivos, colunas=COLUNAS_COMPACTAS, tamanho_bloco: int = TAMANHO_BLOCO):
+    """Blocos de até `tamanho_bloco` linhas dos arquivos Parquet, na ordem, só com as `colunas`"""
+    import pyarrow.parquet as pq
+
+    for arquivo in arquivos:
+        with pq.ParquetFile(arquivo) as parquet:
+            for lote in parquet.iter_batches(batch_size=tamanho_bloco, columns=colunas):
+                yield lote.to_pandas()
+
+
+def blocos_vendas(caminho, tamanho_bloco: int = TAMANHO_BLOCO, colunas=COLUNAS_COMPACTAS):
+    """
+    Blocos das vendas de uma loja, só com as `colunas`: da pasta base + deltas, do cache
+    Parquet válido ou, sem cache, direto da planilha.
+    """
+    caminho = Path(caminho)
+    if caminho.is_dir():
+        indice = ler_indice_vendas(caminho)
+        if indice['base'] is None:
+            return iter(())
+        return blocos_parquet([caminho / arquivo for arquivo in [indice['base']] + indice['deltas']],
+                              colunas, tamanho_bloco)
+    if PARQUET_DISPONIVEL and cache_valido(caminho):
+        caminho_parquet, _ = caminhos_cache(caminho)
+        return blocos_parquet([caminho_parquet], colunas, tamanho_bloco)
+    return blocos_excel(caminho, colunas, tamanho_bloco)
+
+
+def ultima_venda(caminho):
+    """
+    Emissão mais recente das vendas de uma loja, lendo só a coluna EMISSÃO: é o fim real do
+    período observado. None se não houver vendas (ou o arquivo não existir).
+    """
+    if not Path(caminho).exists():
+        return None
+    ultima = None
+    for bloco in blocos_vendas(caminho, colunas=[COLUNA_DATA]):
+        maior = normalizar_datas(bloco[COLUNA_DATA].reset_index(drop=True))[0].max()
+        if pd.notna(maior) and (ultima is None or maior > ultima):
+            ultima = maior
+    return ultima
+
+
+# ==================== TIPOS COMPACTOS ====================
+
+def _codificar_texto(serie: pd.Series, categorias: dict) -> np.ndarray:
+    """
+    Códigos (int32, -1 nos nulos) do bloco no dicionário `categorias` (texto -> código),
+    acrescentando ao dicionário os valores que ainda não apareceram
+    """
+    # Máscara dos nulos da série original: no pandas 2, astype('str') já troca None/NaN por 'None'/'nan'
+    codigos, distintos = pd.factorize(serie.astype('str').where(serie.notna()))
+    mapa = np.array([categorias.setdefault(valor, len(categorias)) for valor in distintos], dtype=np.int32)
+    return np.where(codigos >= 0, mapa[codigos], -1).astype(np.int32)
+
+
+def _texto_compacto(codigos: np.ndarray, categorias: dict) -> pd.Series:
+    """
+    Coluna de texto a partir dos códigos: categoria (se repete valores) ou texto do pandas.
+    Esvazia `categorias` assim que os nomes são copiados, para não manter os dois na memória.
+    """
+    nomes = np.array(list(categorias), dtype=object)
+    categorias.clear()
+    if len(nomes) > MAX_CATEGORIAS * max(len(codigos), 1):
+        # Máscara pelos códigos: no pandas 2, astype('str') troca None por 'None'
+        return pd.Series(nomes[codigos], dtype=object).astype('str').where(codigos >= 0)
+
+    ordem = np.argsort(nomes, kind='stable')  # categorias em ordem, como no astype('category')
+    posicao = np.empty(len(ordem), dtype=np.int32)
+    posicao[ordem] = np.arange(len(ordem), dtype=np.int32)
+    if len(nomes):
+        codigos = np.where(codigos >= 0, posicao[codigos], -1)
+    return pd.Series(pd.Categorical.from_codes(codigos, pd.Index(nomes[ordem], dtype='str')))
+
+
+def _valores_compactos(valores: np.ndarray) -> np.ndarray:
+    """float32 se todos os valores voltam exatos em centavos; senão mantém float64"""
+    compactos = valores.astype(np.float32)
+    exatos = np.array_equal(np.round(compactos.astype(np.float64), 2), valores, equal_nan=True)
+    return compactos if exatos else valores
+
+
+def compactar_vendas(blocos) -> pd.DataFrame:
+    """
+    Une os blocos convertendo cada um assim que é lido (datas e valores normalizados,
+    textos como códigos de um dicionário por coluna). As quantidades de datas e valores
+    rejeitados ficam em `attrs['rejeitados']`, somadas à contagem de normalizar_vendas.
+    """
+    datas, valores = [], []
+    textos = {coluna: ({}, []) for coluna in COLUNAS_COMPACTAS[2:]}
+    rejeitados = {'datas': 0, 'valores': 0}
+
+    for bloco in blocos:
+        bloco = bloco.reset_index(drop=True)
+        data_bloco, datas_rejeitadas = normalizar_datas(bloco[COLUNA_DATA])
+        valor_bloco, valores_rejeitados = normalizar_valores(bloco[COLUNA_VALOR])
+        datas.append(data_bloco.to_numpy(dtype='datetime64[ns]'))
+        valores.append(valor_bloco.to_numpy(dtype=np.float64))
+        rejeitados['datas'] += datas_rejeitadas
+        rejeitados['valores'] += valores_rejeitados
+        for coluna, (categorias, codigos) in textos.items():
+            codigos.append(_codificar_texto(bloco[coluna], categorias))
+
+    if not datas:
+        return pd.DataFrame(columns=COLUNAS_COMPACTAS)
+
+    # Cada lista de blocos é descartada assim que vira coluna, para não somar as duas cópias
+    df_vendas = pd.DataFrame({COLUNA_DATA: np.concatenate(datas)}, copy=False)
+    datas.clear()
+    df_vendas[COLUNA_VALOR] = _valores_compactos(np.concatenate(valores))
+    valores.clear()
+    for coluna, (categorias, codigos) in textos.items():
+        df_vendas[coluna] = _texto_compacto(np.concatenate(codigos), categorias)
+        codigos.clear()
+    df_vendas.attrs['rejeitados'] = rejeitados
+    return df_vendas
+
+
+def carregar_vendas_compactas(caminho, tamanho_bloco: int = TAMANHO_BLOCO) -> pd.DataFrame:
+    """Vendas de uma loja (planilha, cache ou base + deltas) só com as colunas da análise, compactas"""
+    return compactar_vendas(blocos_vendas(caminho, tamanho_bloco))
+
+
+def main():
+    """Lê a planilha nos dois modos e compara o tamanho em memória"""
+    parser = argparse.ArgumentParser(description="Leitura compacta das vendas (poucas colunas, tipos pequenos)")
+    parser.add_argument("arquivo", nargs="?", default="Vendas_Lubrimax.xlsx",
+                        help="planilha ou pasta de vendas em base + deltas")
+    parser.add_argument("--bloco", type=int, default=TAMANHO_BLOCO, help="linhas por bloco")
+    args = parser.parse_args()
+
+    if not Path(args.arquivo).exists():
+        log(f"❌ {args.arquivo} não encontrado")
+        raise SystemExit(1)
+
+    from vendas import carregar_vendas_loja
+
+    completo = carregar_vendas_loja(args.arquivo)
+    compacto = carregar_vendas_compactas(args.arquivo, args.bloco)
+    tamanho_completo = completo.memory_usage(deep=True).sum() / 1024**2
+    tamanho_compacto = compacto.memory_usage(deep=True).sum() / 1024**2
+    log(f"Leitura completa: {len(completo):,} linhas, {len(completo.columns)} colunas, {tamanho_completo:.1f} MB")
+    log(f"Leitura compacta: {len(compacto):,} linhas, {len(compacto.columns)} colunas, {tamanho_compacto:.1f} MB")
+    log("Tipos das colunas:\n" + compacto.dtypes.to_string())
+
+
+if __name__ == "__main__":
+    main()